@@ -1,58 +1,135 @@
 from pathlib import Path
+import os
 import boto3
-import json
-import pandas as pd
-from src.converter import DicomConverter
-from src.validator import ConfigValidator
+from src.header_index import open_index
+from src.export import (
+    MetadataExporter, add_partition_statements, athena_ddl, dashboard_queries,
+    drop_partition_statements
+)
+from src.athena_client import AthenaQueryClient
+from src.duckdb_client import DuckDBQueryClient
+from src.s3_sync import BidsSync, s3_client
 import streamlit as st
-import pydicom
 import logging
 
+EXPORT_PREFIX = 'processed_data'
+BIDS_PREFIX = 'bids'
+DATABASE = 'dicom_database'
+QUERY_CACHE_TTL = 600  # seconds
+
 class AWSDicomVisualizer:
-    def __init__(self, bucket_name, region='us-east-1'):
+    def __init__(self, bucket_name, region='us-east-1', query_backend='athena',
+                 export_root=None, s3_endpoint=None):
+        """
+        Args:
+            bucket_name (str): Bucket holding the exported metadata
+            region (str): AWS region
+            query_backend (str): 'athena', or 'duckdb' to query the exported
+                Parquet in-process
+            export_root (str): Local copy or s3:// URI of the export prefix
+                for DuckDB, defaults to s3://bucket_name/processed_data
+            s3_endpoint (str): S3-compatible endpoint (e.g. MinIO) for DuckDB
+        """
         self.bucket_name = bucket_name
-        self.s3 = boto3.client('s3')
-        self.athena = boto3.client('athena')
+        self.query_backend = query_backend
+        # Pooled client shared by the export and sync upload threads
+        self.s3 = s3_client()
+        if query_backend == 'athena':
+            self.athena = boto3.client('athena')
+            self.athena_output = f's3://{bucket_name}/athena_results/'
+            self.queries = AthenaQueryClient(
+                self.athena, self.athena_output, database=DATABASE, cache_ttl=QUERY_CACHE_TTL
+            )
+        elif query_backend == 'duckdb':
+            self.queries = DuckDBQueryClient(
+                export_root or f's3://{bucket_name}/{EXPORT_PREFIX}', database=DATABASE,
+                region=region, endpoint=s3_endpoint, cache_ttl=QUERY_CACHE_TTL
+            )
+        else:
+            raise ValueError(f"Unknown query backend: {query_backend}")
         self.logger = logging.getLogger(__name__)
         
-    def process_dicom_data(self, dicom_dir, config_path):
+    def run_statements(self, statements):
+        """Run Athena DDL statements in order, waiting for each to finish"""
+        if self.query_backend != 'athena':
+            # DuckDB views read the partition folders directly
+            return
+        for statement in statements:
+            self.queries.wait(self.queries.start(statement))
+        
+    def create_tables(self):
+        """Declare the partitioned metadata and aggregate tables in Athena"""
+        self.run_statements(athena_ddl(self.bucket_name, EXPORT_PREFIX, DATABASE))
+        
+    def sync_bids_output(self, output_dir='data/bids_output', max_concurrency=8, prune=False):
         """
-        Process DICOM data using your existing converter
-        and upload metadata to AWS
+        Mirror the converted NIfTI/JSON files to s3://bucket/bids
+        
+        Only files whose size or ETag differ from the existing objects are
+        uploaded; see BidsSync.sync for the returned throughput figures.
         """
-        # Use your existing converter
-        converter = DicomConverter(
-            config_path=config_path,
-            dicom_dir=dicom_dir,
-            output_dir='data/bids_output'
+        syncer = BidsSync(
+            self.s3, self.bucket_name, prefix=BIDS_PREFIX, max_concurrency=max_concurrency
         )
+        return syncer.sync(output_dir, prune=prune)
         
-        # Extract metadata for visualization
-        metadata = []
-        dicom_path = Path(dicom_dir)
+    def process_dicom_data(self, dicom_dir, config_path, index=None, max_workers=None,
+                           row_group_size=50000, part_size=8 * 1024 * 1024,
+                           max_concurrency=4):
+        """
+        Upload the header metadata of DICOM data to AWS as partitioned Parquet
         
-        for dcm_file in dicom_path.glob('**/*.dcm'):
-            ds = pydicom.dcmread(dcm_file, stop_before_pixels=True)
-            metadata.append({
-                'subject_id': ds.PatientID,
-                'study_date': ds.StudyDate,
-                'series_desc': ds.SeriesDescription,
-                'modality': ds.Modality,
-                'file_path': str(dcm_file)
-            })
+        Only partitions whose contents changed since the last export are
+        uploaded, together with their scan_counts and modality_counts
+        aggregates, and new partitions are registered with Athena; pruned
+        partitions are dropped.
         
-        # Convert to DataFrame
-        df = pd.DataFrame(metadata)
+        Args:
+            dicom_dir (str): Directory containing DICOM files
+            config_path (str): Unused, kept for existing callers
+            index (DicomHeaderIndex): Existing header index to query instead
+                of opening the one stored in dicom_dir
+            max_workers (int): Worker processes used to (re)index headers,
+                defaults to the number of CPUs
+            row_group_size (int): Rows per Parquet row group
+            part_size (int): Multipart upload part size in bytes
+            max_concurrency (int): Concurrent uploads
         
-        # Upload to S3
-        csv_buffer = df.to_csv(index=False).encode()
-        self.s3.put_object(
-            Bucket=self.bucket_name,
-            Key='processed_data/dicom_metadata.csv',
-            Body=csv_buffer
+        Returns:
+            dict: Rows, files and bytes uploaded plus the S3 keys written
+        """
+        # Stream metadata from the shared header index straight to S3
+        exporter = MetadataExporter(
+            self.s3,
+            self.bucket_name,
+            prefix=EXPORT_PREFIX,
+            row_group_size=row_group_size,
+            part_size=part_size,
+            max_concurrency=max_concurrency
         )
+        if index is None:
+            with open_index(dicom_dir, max_workers=max_workers) as index:
+                stats = exporter.export_index(index)
+        else:
+            stats = exporter.export_index(index)
         
-        return df
+        self.run_statements(add_partition_statements(
+            stats['partitions'], self.bucket_name, EXPORT_PREFIX, DATABASE
+        ))
+        self.run_statements(drop_partition_statements(stats['removed_partitions'], DATABASE))
+        return stats
+
+@st.cache_resource
+def get_visualizer(bucket_name, query_backend='athena', export_root=None, s3_endpoint=None):
+    return AWSDicomVisualizer(
+        bucket_name, query_backend=query_backend, export_root=export_root,
+        s3_endpoint=s3_endpoint
+    )
+
+@st.cache_data(ttl=QUERY_CACHE_TTL, show_spinner="Querying...")
+def run_query(_visualizer, query_backend, query):
+    """Run a query once per TTL; Streamlit reruns reuse the cached DataFrame"""
+    return _visualizer.queries.query(query, use_cache=False)
 
 def create_streamlit_app():
     """
@@ -60,33 +137,35 @@ def create_streamlit_app():
     """
     st.title("DICOM Data Visualization")
     
-    # Initialize AWS connection
-    visualizer = AWSDicomVisualizer('your-bucket-name')
-    
-    # Query Athena for data
-    query = """
-    SELECT 
-        subject_id,
-        series_desc,
-        COUNT(*) as scan_count
-    FROM dicom_database.dicom_metadata
-    GROUP BY subject_id, series_desc
-    """
-    
-    # Execute query and get results
-    response = visualizer.athena.start_query_execution(
-        QueryString=query,
-        ResultConfiguration={
-            'OutputLocation': 's3://your-bucket-name/athena_results/'
-        }
+    # DICOM_QUERY_BACKEND=duckdb queries the exported Parquet in-process,
+    # from DICOM_EXPORT_ROOT (a local copy) or the bucket itself
+    query_backend = os.environ.get('DICOM_QUERY_BACKEND', 'athena')
+    visualizer = get_visualizer(
+        os.environ.get('DICOM_BUCKET', 'your-bucket-name'), query_backend,
+        os.environ.get('DICOM_EXPORT_ROOT'), os.environ.get('DICOM_S3_ENDPOINT')
     )
+    queries = dashboard_queries(DATABASE)
+    
+    # Execute queries and get results
+    scan_counts = run_query(visualizer, query_backend, queries['scan_counts'])
+    sessions = run_query(visualizer, query_backend, queries['sessions'])
+    modalities = run_query(visualizer, query_backend, queries['modalities'])
     
     # Display visualizations
     st.header("Scan Distribution by Subject")
-    # Add visualization code here using st.bar_chart(), st.line_chart(), etc.
+    st.bar_chart(scan_counts.groupby('subject_id')['scan_count'].sum())
     
     st.header("Series Types Overview")
-    # Add more visualizations
+    st.bar_chart(scan_counts.pivot_table(
+        index='series_desc', columns='subject_id', values='scan_count',
+        aggfunc='sum', fill_value=0
+    ))
+    
+    st.header("Sessions")
+    st.dataframe(sessions)
+    
+    st.header("Files per Modality")
+    st.bar_chart(modalities.set_index('modality')['file_count'])
 
 if __name__ == "__main__":
     create_streamlit_app()
@@ -0,0 +1,315 @@
+from pathlib import Path
+import argparse
+import datetime
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DEFAULT_HISTORY = 'bench_history.json'
+# Throughput drop (relative to the previous run) reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+def lifetime_peak_rss_mb():
+    """Peak resident set size of this process and its reaped children, in MB"""
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return max(self_rss, child_rss) * scale / 1e6
+
+
+def _status_kb(pid, field):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _descendants(pid):
+    pids, stack = [], [pid]
+    while stack:
+        for task in Path(f'/proc/{stack.pop()}/task').glob('*/children'):
+            try:
+                children = [int(c) for c in task.read_text().split()]
+            except (OSError, ValueError):
+                continue
+            pids.extend(children)
+            stack.extend(children)
+    return pids
+
+
+class StagePeakRss:
+    """
+    Peak RSS of one stage, for this process and the processes it starts
+
+    ru_maxrss only ever grows over a process lifetime, so it cannot tell
+    stages apart. On Linux this process's high-water mark (VmHWM) is reset
+    through /proc/self/clear_refs when the stage starts, and descendants
+    (worker pools, dcm2bids) are sampled every interval seconds while it
+    runs. Elsewhere the lifetime peak is reported.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_kb = 0
+        self.per_stage = False
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def _sample(self):
+        peaks = [_status_kb('self', 'VmHWM')]
+        peaks += [_status_kb(pid, 'VmHWM') for pid in _descendants(os.getpid())]
+        self.peak_kb = max([self.peak_kb] + [p for p in peaks if p is not None])
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            self.per_stage = True
+        except OSError:
+            return self
+        self._sampler = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sample()
+
+    @property
+    def mb(self):
+        if not self.per_stage:
+            return lifetime_peak_rss_mb()
+        return self.peak_kb * 1024 / 1e6
+
+
+def tree_size(path, pattern='**/*'):
+    files = [p for p in Path(path).glob(pattern) if p.is_file()]
+    return len(files), sum(p.stat().st_size for p in files)
+
+
+def timed(name, func, files=0, size=0):
+    """
+    Run one benchmark stage
+
+    Args:
+        name (str): Stage name
+        func (callable): Stage body; may return (files, bytes) to override
+            the counts used for throughput
+        files (int): Files processed by the stage
+        size (int): Bytes processed by the stage
+
+    Returns:
+        dict: Stage timings, throughput and the stage's peak RSS
+    """
+    with StagePeakRss() as rss:
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+    if isinstance(result, tuple):
+        files, size = result
+    return {
+        'stage': name,
+        'seconds': round(seconds, 4),
+        'files': files,
+        'bytes': size,
+        'files_per_second': round(files / seconds, 2) if seconds > 0 else 0.0,
+        'mb_per_second': round(size / 1e6 / seconds, 2) if seconds > 0 else 0.0,
+        'peak_rss_mb': round(rss.mb, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(work_dir, config_path='config/config.json', subjects=4, sessions=1,
+                  matrix_size=128, slices=16, series_mix=None, max_workers=None,
+                  backend='native', export=False, compression='none'):
+    """
+    Build a synthetic corpus and time every pipeline stage on it
+
+    Stages: generate (DicomDataGenerator), index (DicomHeaderIndex),
+    match (BidsConfigValidator.analyze_dicom_directory plus per-file
+    matching), convert (DicomConverter) and optionally export
+    (MetadataExporter against a local moto S3). With compression the
+    corpus is written compressed, so convert measures decode throughput.
+
+    Returns:
+        list: One result dict per stage
+    """
+    from data_generator import COMPRESSION, DicomDataGenerator
+    from src.converter import DicomConverter
+    from src.header_index import DicomHeaderIndex
+    from src.matcher import SeriesMatcher
+    from src.test_dicom_converter import BidsConfigValidator
+
+    work_dir = Path(work_dir)
+    generator = DicomDataGenerator(work_dir)
+    generator.setup_directories()
+    stages = []
+
+    def generate():
+        stats = generator.generate_dataset(
+            subjects, num_sessions=sessions, series_mix=series_mix,
+            matrix_size=matrix_size, slices=slices, max_workers=max_workers,
+            transfer_syntax=COMPRESSION[compression]
+        )
+        return stats['files'], stats['bytes']
+    stages.append(timed('generate', generate))
+    files, size = tree_size(generator.raw_path, '**/*.dcm')
+
+    index = DicomHeaderIndex(generator.raw_path, index_path=work_dir / 'index.sqlite')
+    stages.append(timed('index', lambda: index.refresh(max_workers=max_workers), files, size))
+
+    def match():
+        BidsConfigValidator(config_path).analyze_dicom_directory(generator.raw_path, index=index)
+        matcher = SeriesMatcher.from_config_file(config_path)
+        for record in index.iter_records():
+            matcher.match(record['series_description'] or '')
+    stages.append(timed('match', match, files, 0))
+
+    converter = DicomConverter(
+        config_path, generator.raw_path, generator.bids_path,
+        incremental=False, backend=backend, index=index
+    )
+    subject_ids = sorted(p.name for p in generator.raw_path.glob('sub-*'))
+
+    def convert():
+        report = converter.convert_subjects(subject_ids, max_workers=max_workers)
+        if report.failed:
+            raise RuntimeError(f"Conversion failed: {report.failed[0].error}")
+    stages.append(timed('convert', convert, files, size))
+
+    if export:
+        stages.append(timed('export', lambda: _export(index), files, 0))
+
+    index.close()
+    return stages
+
+
+def _export(index):
+    import boto3
+    from moto import mock_aws
+    from src.export import MetadataExporter
+
+    with mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='bench')
+        stats = MetadataExporter(s3, 'bench').export_index(index)
+    return stats['rows'], stats['bytes']
+
+
+def load_history(path):
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def find_regressions(previous, current, threshold=REGRESSION_THRESHOLD):
+    """Return stages whose files/s dropped by more than threshold"""
+    before = {s['stage']: s for s in previous['stages']}
+    regressions = []
+    for stage in current['stages']:
+        old = before.get(stage['stage'])
+        if old and old['files_per_second'] > 0:
+            change = stage['files_per_second'] / old['files_per_second'] - 1
+            if change < -threshold:
+                regressions.append((stage['stage'], old['files_per_second'],
+                                    stage['files_per_second']))
+    return regressions
+
+
+def record_run(history_path, params, stages):
+    """Append a run to the JSON history file and return (run, regressions)"""
+    history = load_history(history_path)
+    run = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'params': params,
+        'stages': stages,
+    }
+    # Only compare runs made with the same corpus parameters
+    comparable = [r for r in history if r.get('params') == params]
+    regressions = find_regressions(comparable[-1], run) if comparable else []
+    history.append(run)
+    with open(history_path, 'w') as f:
+        json.dump(history, f, indent=2)
+    return run, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the DICOM to BIDS pipeline")
+    parser.add_argument('--config', default='config/config.json')
+    parser.add_argument('--subjects', type=int, default=4)
+    parser.add_argument('--sessions', type=int, default=1)
+    parser.add_argument('--matrix', type=int, default=128)
+    parser.add_argument('--slices', type=int, default=16)
+    parser.add_argument('--series', nargs='+', help="SeriesDescriptions per session")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--backend', choices=['native', 'dcm2bids'], default='native')
+    parser.add_argument('--compression', choices=['none', 'rle', 'jpegls', 'jpeg2000'],
+                        default='none', help="transfer syntax of the generated corpus")
+    parser.add_argument('--export', action='store_true',
+                        help="also time the S3 export against a local moto stand-in")
+    parser.add_argument('--work-dir', help="keep the corpus here instead of a temp dir")
+    parser.add_argument('--history', default=DEFAULT_HISTORY)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    params = {
+        'subjects': args.subjects, 'sessions': args.sessions, 'matrix': args.matrix,
+        'slices': args.slices, 'series': args.series, 'workers': args.workers,
+        'backend': args.backend, 'compression': args.compression,
+    }
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix='bench_'))
+    try:
+        stages = run_benchmark(
+            work_dir, config_path=args.config, subjects=args.subjects,
+            sessions=args.sessions, matrix_size=args.matrix, slices=args.slices,
+            series_mix=args.series, max_workers=args.workers, backend=args.backend,
+            export=args.export, compression=args.compression
+        )
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    run, regressions = record_run(args.history, params, stages)
+    print(f"{'stage':<10}{'seconds':>10}{'files/s':>12}{'MB/s':>10}{'peak RSS MB':>14}")
+    for stage in stages:
+        print(f"{stage['stage']:<10}{stage['seconds']:>10.2f}{stage['files_per_second']:>12.1f}"
+              f"{stage['mb_per_second']:>10.1f}{stage['peak_rss_mb']:>14.1f}")
+    for name, before, after in regressions:
+        print(f"REGRESSION: {name} dropped from {before:.1f} to {after:.1f} files/s")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,167 @@
 import os
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import functools
+import io
+import time
 import pydicom
 from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.encaps import encapsulate
+from pydicom.uid import (
+    ExplicitVRLittleEndian, JPEG2000Lossless, JPEGLSLossless, RLELossless, generate_uid
+)
 import datetime
 import numpy as np
 
+# Sample scan parameters
+SCAN_TYPES = [
+    ('T1_SAG', 'Sagittal T1-weighted'),
+    ('T1_AX', 'Axial T1-weighted'),
+    ('T2_SAG', 'Sagittal T2-weighted'),
+    ('T2_AX', 'Axial T2-weighted'),
+    ('PD_SAG', 'Sagittal PD-weighted'),
+    ('PD_AX', 'Axial PD-weighted')
+]
+
+# ImageOrientationPatient per acquisition plane
+ORIENTATIONS = {
+    'SAG': [0, 1, 0, 0, 0, -1],
+    'COR': [1, 0, 0, 0, 0, -1],
+    'AX': [1, 0, 0, 0, 1, 0],
+}
+
+MR_IMAGE_STORAGE = '1.2.840.10008.5.1.4.1.1.4'
+
+# Transfer syntax written for each --compression choice
+COMPRESSION = {
+    'none': ExplicitVRLittleEndian,
+    'rle': RLELossless,
+    'jpegls': JPEGLSLossless,
+    'jpeg2000': JPEG2000Lossless,
+}
+
+
+def encode_jpeg2000(pixels):
+    """Encode one frame as a lossless JPEG 2000 codestream with Pillow"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG2000', no_jp2=True, irreversible=False)
+    return buffer.getvalue()
+
+
+def set_pixel_data(ds, pixels, transfer_syntax=None):
+    """
+    Store one frame in ds, compressed with transfer_syntax if given
+    
+    pydicom encodes RLE itself, and JPEG-LS or JPEG 2000 when pyjpegls or
+    pylibjpeg-openjpeg is installed; lossless JPEG 2000 falls back to
+    Pillow's OpenJPEG encoder.
+    """
+    if 'PixelData' in ds:
+        # Templates are reused across slices; drop the previous encoding
+        del ds.PixelData
+    transfer_syntax = transfer_syntax or ExplicitVRLittleEndian
+    if transfer_syntax == ExplicitVRLittleEndian:
+        ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds.PixelData = pixels.tobytes()
+        return
+    try:
+        ds.compress(transfer_syntax, pixels, generate_instance_uid=False)
+    except RuntimeError:
+        if transfer_syntax != JPEG2000Lossless:
+            raise
+        ds.file_meta.TransferSyntaxUID = JPEG2000Lossless
+        ds.PixelData = encapsulate([encode_jpeg2000(pixels)])
+        ds['PixelData'].VR = 'OB'
+        ds['PixelData'].is_undefined_length = True
+
+
+@functools.lru_cache(maxsize=None)
+def series_template(rows, columns):
+    """
+    Build a dataset holding everything constant across slices of a given size
+    
+    Cached per process, so scale-mode workers mutate one template per matrix
+    size instead of rebuilding datasets for every slice.
+    """
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = MR_IMAGE_STORAGE
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    file_meta.ImplementationClassUID = '1.2.3.4'
+    
+    ds = FileDataset(None, {}, file_meta=file_meta, preamble=b"\0" * 128)
+    ds.SOPClassUID = MR_IMAGE_STORAGE
+    ds.Modality = 'MR'
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.Rows = rows
+    ds.Columns = columns
+    ds.BitsStored = 16
+    ds.BitsAllocated = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.PixelSpacing = [1.0, 1.0]
+    ds.SliceThickness = 1.0
+    return ds
+
+
+def phantom_volume(rows, columns, slices, seed):
+    """Vectorized ellipsoid phantom with noise, shaped (slices, rows, columns)"""
+    rng = np.random.default_rng(seed)
+    z, y, x = np.ogrid[-1:1:slices * 1j, -1:1:rows * 1j, -1:1:columns * 1j]
+    inside = (x / 0.8) ** 2 + (y / 0.9) ** 2 + (z / 0.95) ** 2 <= 1.0
+    volume = inside * rng.uniform(800, 1200) + rng.normal(100, 20, (slices, rows, columns))
+    return np.clip(volume, 0, 4095).astype(np.uint16)
+
+
+def write_series(task):
+    """
+    Write every slice of one synthetic series
+    
+    Args:
+        task (dict): Series parameters, see DicomDataGenerator.generate_dataset
+    
+    Returns:
+        tuple: (files written, bytes written)
+    """
+    rows, columns, slices = task['rows'], task['columns'], task['slices']
+    ds = series_template(rows, columns)
+    ds.PatientName = task['patient_name']
+    ds.PatientID = task['patient_id']
+    ds.StudyDate = task['study_date']
+    ds.StudyInstanceUID = task['study_uid']
+    ds.SeriesInstanceUID = generate_uid()
+    ds.SeriesDescription = task['series_desc']
+    ds.SeriesNumber = task['series_number']
+    
+    plane = next((p for p in ORIENTATIONS if p in task['series_desc'].upper()), 'AX')
+    orientation = np.array(ORIENTATIONS[plane], dtype=float)
+    normal = np.cross(orientation[:3], orientation[3:])
+    ds.ImageOrientationPatient = ORIENTATIONS[plane]
+    
+    volume = phantom_volume(rows, columns, slices, task['seed'])
+    series_dir = Path(task['series_dir'])
+    series_dir.mkdir(parents=True, exist_ok=True)
+    
+    written = 0
+    for idx in range(slices):
+        sop_uid = generate_uid()
+        ds.file_meta.MediaStorageSOPInstanceUID = sop_uid
+        ds.SOPInstanceUID = sop_uid
+        ds.InstanceNumber = idx + 1
+        position = normal * (idx - slices / 2)
+        ds.ImagePositionPatient = [round(float(v), 4) for v in position]
+        ds.SliceLocation = round(float(idx - slices / 2), 4)
+        set_pixel_data(ds, volume[idx], task.get('transfer_syntax'))
+        
+        path = series_dir / f'slice_{idx + 1:04d}.dcm'
+        ds.save_as(path, enforce_file_format=True)
+        written += path.stat().st_size
+    return slices, written
+
+
 class DicomDataGenerator:
     def __init__(self, base_path):
         """
@@ -23,7 +180,9 @@ class DicomDataGenerator:
         self.raw_path.mkdir(parents=True, exist_ok=True)
         self.bids_path.mkdir(parents=True, exist_ok=True)
         
-    def create_sample_dicom(self, path, series_desc, patient_name, study_date=None):
+    def create_sample_dicom(self, path, series_desc, patient_name, study_date=None,
+                            series_uid=None, instance_number=1, patient_id=None,
+                            transfer_syntax=None):
         """
         Create a sample DICOM file
         
@@ -32,11 +191,17 @@ class DicomDataGenerator:
             series_desc (str): Series description
             patient_name (str): Patient name
             study_date (str): Study date (YYYYMMDD)
+            series_uid (str): SeriesInstanceUID shared by the series' slices
+            instance_number (int): Position of the slice within its series
+            patient_id (str): PatientID, derived from patient_name if omitted
+            transfer_syntax (str): Transfer syntax UID to compress PixelData
+                with (see COMPRESSION), uncompressed if omitted
         """
         # File meta info dataset
+        sop_uid = generate_uid()
         file_meta = FileMetaDataset()
         file_meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
-        file_meta.MediaStorageSOPInstanceUID = '1.2.3'
+        file_meta.MediaStorageSOPInstanceUID = sop_uid
         file_meta.ImplementationClassUID = '1.2.3.4'
         
         # Main dataset
@@ -44,11 +209,16 @@ class DicomDataGenerator:
         
         # Add required DICOM fields
         ds.PatientName = patient_name
-        ds.PatientID = f"ID_{patient_name.split('^')[0]}"
+        ds.PatientID = patient_id or f"ID_{patient_name.split('^')[0]}"
         ds.StudyDate = study_date or datetime.datetime.now().strftime('%Y%m%d')
         ds.SeriesDescription = series_desc
         ds.Modality = 'MR'
         ds.SeriesNumber = '1'
+        ds.SOPInstanceUID = sop_uid
+        ds.SeriesInstanceUID = series_uid or generate_uid()
+        ds.InstanceNumber = instance_number
+        ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        ds.ImagePositionPatient = [0, 0, float(instance_number - 1)]
         
         # Create a small fake image
         ds.SamplesPerPixel = 1
@@ -59,10 +229,10 @@ class DicomDataGenerator:
         ds.BitsAllocated = 16
         ds.HighBit = 15
         ds.PixelRepresentation = 0
-        ds.PixelData = np.zeros((16, 16), dtype=np.uint16).tobytes()
+        set_pixel_data(ds, np.zeros((16, 16), dtype=np.uint16), transfer_syntax)
         
         # Save the file
-        ds.save_as(path, write_like_original=False)
+        ds.save_as(path, enforce_file_format=True)
         
     def generate_subject_data(self, subject_id, num_sessions=1):
         """
@@ -74,16 +244,6 @@ class DicomDataGenerator:
         """
         subject_dir = self.raw_path / f'sub-{subject_id}'
         
-        # Sample scan parameters
-        scan_types = [
-            ('T1_SAG', 'Sagittal T1-weighted'),
-            ('T1_AX', 'Axial T1-weighted'),
-            ('T2_SAG', 'Sagittal T2-weighted'),
-            ('T2_AX', 'Axial T2-weighted'),
-            ('PD_SAG', 'Sagittal PD-weighted'),
-            ('PD_AX', 'Axial PD-weighted')
-        ]
-        
         for session in range(1, num_sessions + 1):
             session_dir = subject_dir / f'ses-{session:02d}'
             session_dir.mkdir(parents=True, exist_ok=True)
@@ -93,9 +253,10 @@ class DicomDataGenerator:
                          datetime.timedelta(days=session)).strftime('%Y%m%d')
             
             # Create DICOM files for each scan type
-            for idx, (scan_type, desc) in enumerate(scan_types, 1):
+            for idx, (scan_type, desc) in enumerate(SCAN_TYPES, 1):
                 scan_dir = session_dir / f'scan_{idx:02d}'
                 scan_dir.mkdir(exist_ok=True)
+                series_uid = generate_uid()
                 
                 # Create multiple DICOM files per scan
                 for slice_idx in range(1, 4):  # 3 slices per scan
@@ -104,17 +265,111 @@ class DicomDataGenerator:
                         dicom_path,
                         series_desc=scan_type,
                         patient_name=f'TEST^Subject{subject_id}',
-                        study_date=study_date
+                        study_date=study_date,
+                        series_uid=series_uid,
+                        instance_number=slice_idx,
+                        patient_id=f'ID_{subject_id}'
                     )
+    
+    def generate_dataset(self, num_subjects, num_sessions=1, series_mix=None,
+                         matrix_size=256, slices=32, max_workers=None, seed=0,
+                         transfer_syntax=None):
+        """
+        Generate a large benchmark corpus in parallel
+        
+        Every series is written by a worker process from a cached template
+        dataset, with a vectorized phantom volume, unique UIDs and proper
+        ImagePositionPatient/InstanceNumber per slice.
+        
+        Args:
+            num_subjects (int): Number of subjects to generate
+            num_sessions (int): Sessions per subject
+            series_mix (list): SeriesDescriptions acquired in every session,
+                defaults to all SCAN_TYPES
+            matrix_size (int): Rows and columns of every slice
+            slices (int): Slices per series
+            max_workers (int): Worker processes, defaults to the number of CPUs
+            seed (int): Seed for reproducible pixel data
+            transfer_syntax (str): Transfer syntax UID to compress slices
+                with, e.g. to benchmark decoding; uncompressed if omitted
+        
+        Returns:
+            dict: Files and bytes written, elapsed seconds and throughput
+        """
+        series_mix = list(series_mix or [scan_type for scan_type, _ in SCAN_TYPES])
+        tasks = []
+        for subject in range(1, num_subjects + 1):
+            subject_id = f'{subject:04d}'
+            for session in range(1, num_sessions + 1):
+                study_date = (datetime.datetime.now() -
+                              datetime.timedelta(days=session)).strftime('%Y%m%d')
+                study_uid = generate_uid()
+                for idx, series_desc in enumerate(series_mix, 1):
+                    tasks.append({
+                        'series_dir': str(self.raw_path / f'sub-{subject_id}' /
+                                          f'ses-{session:02d}' / f'scan_{idx:02d}'),
+                        'patient_name': f'TEST^Subject{subject_id}',
+                        'patient_id': f'ID_{subject_id}',
+                        'study_date': study_date,
+                        'study_uid': study_uid,
+                        'series_desc': series_desc,
+                        'series_number': idx,
+                        'rows': matrix_size,
+                        'columns': matrix_size,
+                        'slices': slices,
+                        'seed': seed + len(tasks),
+                        'transfer_syntax': transfer_syntax,
+                    })
+        
+        start = time.monotonic()
+        files = total_bytes = 0
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for written, size in executor.map(write_series, tasks, chunksize=4):
+                files += written
+                total_bytes += size
+        seconds = time.monotonic() - start
+        
+        return {
+            'series': len(tasks),
+            'files': files,
+            'bytes': total_bytes,
+            'seconds': seconds,
+            'files_per_second': files / seconds if seconds > 0 else 0.0,
+            'mb_per_second': total_bytes / 1e6 / seconds if seconds > 0 else 0.0,
+        }
 
 def main():
     """Main function to generate sample data"""
+    parser = argparse.ArgumentParser(description="Generate synthetic DICOM data")
+    parser.add_argument('--scale', action='store_true',
+                        help="generate a large benchmark corpus in parallel")
+    parser.add_argument('--subjects', type=int, default=100)
+    parser.add_argument('--sessions', type=int, default=1)
+    parser.add_argument('--matrix', type=int, default=256)
+    parser.add_argument('--slices', type=int, default=32)
+    parser.add_argument('--series', nargs='+', help="SeriesDescriptions per session")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--compression', choices=sorted(COMPRESSION), default='none',
+                        help="transfer syntax of the generated pixel data")
+    args = parser.parse_args()
+    
     # Initialize generator
     generator = DicomDataGenerator('data')
     
     # Setup directory structure
     generator.setup_directories()
     
+    if args.scale:
+        stats = generator.generate_dataset(
+            args.subjects, num_sessions=args.sessions, series_mix=args.series,
+            matrix_size=args.matrix, slices=args.slices, max_workers=args.workers,
+            transfer_syntax=COMPRESSION[args.compression]
+        )
+        print(f"Wrote {stats['files']} files ({stats['bytes'] / 1e9:.2f} GB) in "
+              f"{stats['seconds']:.1f}s: {stats['files_per_second']:.0f} files/s, "
+              f"{stats['mb_per_second']:.0f} MB/s")
+        return
+    
     # Generate data for multiple subjects
     for subject_id in range(1, 4):  # 3 subjects
         print(f"Generating data for subject {subject_id}")
@@ -1,51 +1,15 @@
-from src.converter import DicomConverter
-from src.validator import ConfigValidator
-import logging
-import sys
+"""
+Convert the sample data with the default paths
+
+    python main.py                       # same as: python main.py convert
+    python main.py validate --config config/config.json
+    python main.py convert --workers 8 --date-from 20240101
+    python main.py export --bucket my-bucket --register
 
-def main():
-    # Setup logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('conversion.log'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    
-    logger = logging.getLogger(__name__)
-    
-    # Paths
-    config_path = 'config/config.json'
-    dicom_dir = 'data/raw_dicoms'
-    output_dir = 'data/bids_output'
-    
-    # Validate configuration
-    logger.info("Validating configuration")
-    validator = ConfigValidator(config_path)
-    issues = validator.validate()
-    
-    if issues:
-        logger.error("Configuration validation failed:")
-        for issue in issues:
-            logger.error(f"- {issue}")
-        return
-    
-    # Initialize converter
-    converter = DicomConverter(
-        config_path=config_path,
-        dicom_dir=dicom_dir,
-        output_dir=output_dir
-    )
-    
-    # Convert subjects
-    subjects = ['sub-01', 'sub-02', 'sub-03']  # Add more subjects as needed
-    for subject in subjects:
-        try:
-            converter.convert_subject(subject)
-        except Exception as e:
-            logger.error(f"Error processing subject {subject}: {str(e)}")
+See `python main.py --help` for every subcommand and option.
+"""
+from src.cli import main
+import sys
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main(sys.argv[1:] or ['convert']))
@@ -0,0 +1,169 @@
+from pathlib import Path
+from collections import defaultdict
+import fnmatch
+import functools
+import io
+import os
+import shutil
+import tarfile
+import zipfile
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Separates an archive from a member in virtual paths, e.g.
+# raw_dicoms/study.zip!/sub-01/ses-01/slice_0001.dcm
+MEMBER_SEPARATOR = '!/'
+
+
+def is_archive(path):
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def member_path(archive, member):
+    """Build the virtual path of an archive member"""
+    return f"{archive}{MEMBER_SEPARATOR}{member}"
+
+
+def split_member_path(path):
+    """
+    Split a virtual member path into (archive path, member name)
+
+    Returns:
+        tuple: (Path, str), or None for a plain file path
+    """
+    archive, sep, member = str(path).partition(MEMBER_SEPARATOR)
+    if not sep or not is_archive(archive):
+        return None
+    return Path(archive), member
+
+
+def is_member_path(path):
+    return split_member_path(path) is not None
+
+
+def _is_zip(archive):
+    return str(archive).lower().endswith('.zip')
+
+
+def iter_members(archive, pattern='*.dcm', members=None):
+    """
+    Stream regular members of an archive in archive order
+
+    Zip members are opened in place; tar members are read from a single
+    sequential pass (compressed tars cannot be seeked cheaply) into memory
+    one at a time. Nothing is written to disk.
+
+    Args:
+        archive (str): .zip or (compressed) .tar file
+        pattern (str): Filename pattern members must match
+        members (set): Only yield these member names
+
+    Yields:
+        tuple: (member name, size in bytes, readable binary file object)
+    """
+    def wanted(name):
+        if members is not None:
+            return name in members
+        return fnmatch.fnmatch(name.rsplit('/', 1)[-1], pattern)
+
+    if _is_zip(archive):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and wanted(info.filename):
+                    with zf.open(info) as f:
+                        yield info.filename, info.file_size, f
+        return
+
+    with tarfile.open(archive, mode='r|*') as tf:
+        for info in tf:
+            if info.isfile() and wanted(info.name):
+                f = tf.extractfile(info)
+                yield info.name, info.size, io.BytesIO(f.read())
+
+
+@functools.lru_cache(maxsize=64)
+def _member_sizes(archive, size, mtime_ns):
+    if _is_zip(archive):
+        with zipfile.ZipFile(archive) as zf:
+            return {i.filename: i.file_size for i in zf.infolist() if not i.is_dir()}
+    with tarfile.open(archive, mode='r|*') as tf:
+        return {i.name: i.size for i in tf if i.isfile()}
+
+
+def member_sizes(archive):
+    """Map member name -> size, cached until the archive changes"""
+    stat = os.stat(archive)
+    return _member_sizes(str(archive), stat.st_size, stat.st_mtime_ns)
+
+
+def source_stat(path):
+    """
+    Return (size, mtime_ns) of a file or archive member
+
+    Members report their own size and the modification time of their archive.
+    """
+    split = split_member_path(path)
+    if split is None:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    archive, member = split
+    return member_sizes(archive)[member], os.stat(archive).st_mtime_ns
+
+
+def read_archive_headers(archive, pattern='*.dcm', tags=None):
+    """
+    Read the indexed tags of every DICOM member without extracting the archive
+
+    Returns:
+        list: (member name, size, header values or None) per matching member
+    """
+    from src.header_index import read_header
+
+    return [
+        (name, size, read_header(f, tags))
+        for name, size, f in iter_members(archive, pattern)
+    ]
+
+
+def materialize(paths, dest_dir):
+    """
+    Make files available on disk, extracting only the archive members asked for
+
+    Plain files are returned unchanged. Members are extracted below
+    dest_dir, one pass per archive, keeping their paths inside the archive.
+
+    Args:
+        paths (list): Plain file paths and virtual member paths
+        dest_dir (str): Folder to extract members into
+
+    Returns:
+        list: Local paths, in the order of paths
+    """
+    dest_dir = Path(dest_dir)
+    wanted = defaultdict(set)
+    for path in paths:
+        split = split_member_path(path)
+        if split is not None:
+            wanted[split[0]].add(split[1])
+
+    extracted = {}
+    for n, (archive, members) in enumerate(sorted(wanted.items())):
+        # One folder per archive, so equal member names cannot collide
+        root = dest_dir / f'{n:03d}_{archive.name}'
+        for name, _, f in iter_members(archive, members=members):
+            target = root / name
+            if root.resolve() not in target.resolve().parents:
+                raise ValueError(f"Unsafe member path {name!r} in {archive}")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with open(target, 'wb') as out:
+                shutil.copyfileobj(f, out)
+            extracted[(archive, name)] = target
+        missing = sorted(m for m in members if (archive, m) not in extracted)
+        if missing:
+            raise FileNotFoundError(f"Not found in {archive}: {missing[0]}")
+
+    local = []
+    for path in paths:
+        split = split_member_path(path)
+        local.append(path if split is None else extracted[split])
+    return local
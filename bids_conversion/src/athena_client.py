@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+
+from src.query_client import CachedQueryClient
+
+# Athena result types converted to Python values; anything else stays a string
+TYPE_CONVERTERS = {
+    'tinyint': int,
+    'smallint': int,
+    'integer': int,
+    'bigint': int,
+    'float': float,
+    'real': float,
+    'double': float,
+    'decimal': float,
+    'boolean': lambda v: v.lower() == 'true',
+}
+
+
+class AthenaQueryError(RuntimeError):
+    """Raised when an Athena query fails, is cancelled or times out"""
+
+
+class AthenaQueryClient(CachedQueryClient):
+    """
+    Run Athena queries to completion and return their results as DataFrames
+
+    Queries are started, polled with exponential backoff until they finish,
+    and their results are paged through get_query_results. Results are
+    cached as in CachedQueryClient.
+    """
+
+    def __init__(self, athena_client, output_location, database=None, workgroup=None,
+                 poll_interval=0.25, max_poll_interval=5.0, timeout=300, cache_ttl=300,
+                 sleep=time.sleep, clock=time.monotonic):
+        """
+        Args:
+            athena_client: boto3 Athena client (or a compatible fake)
+            output_location (str): S3 location for query results
+            database (str): Default database for unqualified table names
+            workgroup (str): Athena workgroup to run queries in
+            poll_interval (float): First delay between status checks, seconds
+            max_poll_interval (float): Upper bound of the backoff delay
+            timeout (float): Seconds before a running query is cancelled
+            cache_ttl (float): Seconds results stay cached, 0 disables caching
+            sleep (callable): Blocking sleep, injectable for tests
+            clock (callable): Monotonic clock, injectable for tests
+        """
+        super().__init__(cache_ttl=cache_ttl, clock=clock)
+        self.athena = athena_client
+        self.output_location = output_location
+        self.database = database
+        self.workgroup = workgroup
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.sleep = sleep
+        self.logger = logging.getLogger(__name__)
+
+    def start(self, query):
+        """Submit a query and return its execution ID"""
+        kwargs = {
+            'QueryString': query,
+            'ResultConfiguration': {'OutputLocation': self.output_location},
+        }
+        if self.database:
+            kwargs['QueryExecutionContext'] = {'Database': self.database}
+        if self.workgroup:
+            kwargs['WorkGroup'] = self.workgroup
+        return self.athena.start_query_execution(**kwargs)['QueryExecutionId']
+
+    def _backoff(self):
+        delay = self.poll_interval
+        while True:
+            yield delay
+            delay = min(delay * 2, self.max_poll_interval)
+
+    def _is_done(self, execution_id):
+        status = self.athena.get_query_execution(
+            QueryExecutionId=execution_id
+        )['QueryExecution']['Status']
+        state = status['State']
+        if state == 'SUCCEEDED':
+            return True
+        if state in ('FAILED', 'CANCELLED'):
+            reason = status.get('StateChangeReason', 'no reason given')
+            raise AthenaQueryError(f"Query {execution_id} {state.lower()}: {reason}")
+        return False
+
+    def _timed_out(self, execution_id):
+        self.athena.stop_query_execution(QueryExecutionId=execution_id)
+        return AthenaQueryError(
+            f"Query {execution_id} did not finish within {self.timeout}s and was cancelled"
+        )
+
+    def wait(self, execution_id):
+        """Block until a query succeeds, raising AthenaQueryError otherwise"""
+        deadline = self.clock() + self.timeout
+        for delay in self._backoff():
+            if self._is_done(execution_id):
+                return
+            if self.clock() + delay > deadline:
+                raise self._timed_out(execution_id)
+            self.sleep(delay)
+
+    async def wait_async(self, execution_id):
+        """Await a query without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        deadline = self.clock() + self.timeout
+        for delay in self._backoff():
+            if await loop.run_in_executor(None, self._is_done, execution_id):
+                return
+            if self.clock() + delay > deadline:
+                raise await loop.run_in_executor(None, self._timed_out, execution_id)
+            await asyncio.sleep(delay)
+
+    def fetch(self, execution_id):
+        """Page through the results of a finished query into a DataFrame"""
+        import pandas as pd
+
+        columns, converters, rows = None, None, []
+        kwargs = {'QueryExecutionId': execution_id}
+        while True:
+            page = self.athena.get_query_results(**kwargs)
+            result_set = page['ResultSet']
+            page_rows = [
+                [datum.get('VarCharValue') for datum in row['Data']]
+                for row in result_set['Rows']
+            ]
+            if columns is None:
+                info = result_set['ResultSetMetadata']['ColumnInfo']
+                columns = [col['Name'] for col in info]
+                converters = [TYPE_CONVERTERS.get(col['Type'].lower()) for col in info]
+                # The first row of a SELECT result repeats the column names
+                if page_rows and page_rows[0] == columns:
+                    page_rows = page_rows[1:]
+            rows.extend(
+                [
+                    value if value is None or convert is None else convert(value)
+                    for value, convert in zip(row, converters)
+                ]
+                for row in page_rows
+            )
+            if not page.get('NextToken'):
+                break
+            kwargs['NextToken'] = page['NextToken']
+
+        return pd.DataFrame(rows, columns=columns)
+
+    def execute(self, query):
+        """Run a query to completion and return its results"""
+        execution_id = self.start(query)
+        self.logger.info(f"Started Athena query {execution_id}")
+        self.wait(execution_id)
+        return self.fetch(execution_id)
+
+    async def execute_async(self, query):
+        """Run a query without blocking the event loop while it is polled"""
+        loop = asyncio.get_running_loop()
+        execution_id = await loop.run_in_executor(None, self.start, query)
+        self.logger.info(f"Started Athena query {execution_id}")
+        await self.wait_async(execution_id)
+        return await loop.run_in_executor(None, self.fetch, execution_id)
@@ -0,0 +1,346 @@
+"""
+Command line entry point: bids-convert validate|index|convert|watch|export|sync
+
+Only argparse and logging are imported at module level. Every subcommand
+imports what it needs when it runs, so `validate` starts without loading
+pandas, numpy or pydicom and `--help` answers immediately.
+"""
+import argparse
+import logging
+import sys
+
+DEFAULT_CONFIG = 'config/config.json'
+DEFAULT_DICOM_DIR = 'data/raw_dicoms'
+DEFAULT_OUTPUT_DIR = 'data/bids_output'
+DEFAULT_LOG_FILE = 'conversion.log'
+
+logger = logging.getLogger(__name__)
+
+
+def setup_logging(log_file=DEFAULT_LOG_FILE, verbose=False):
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+
+def validate_config(config_path):
+    """Log configuration issues and return whether the config is usable"""
+    from src.validator import ConfigValidator
+
+    logger.info("Validating configuration")
+    issues = ConfigValidator(config_path).validate()
+    if issues:
+        logger.error("Configuration validation failed:")
+        for issue in issues:
+            logger.error(f"- {issue}")
+        return False
+    return True
+
+
+def cmd_validate(args):
+    if not validate_config(args.config):
+        return 1
+    logger.info(f"{args.config} is valid")
+    return 0
+
+
+def cmd_index(args):
+    from src.header_index import open_index
+
+    with open_index(args.dicom_dir, index_path=args.index_path,
+                    max_workers=args.workers) as index:
+        files = len(index.records())
+        subjects = len(index.distinct('patient_id'))
+    logger.info(f"Indexed {files} files of {subjects} subjects in {args.dicom_dir}")
+    return 0
+
+
+def log_dry_run(report):
+    logger.info(f"Dry run: {report.summary()}")
+    for label, count in report.label_counts.items():
+        logger.info(f"- {label}: {count} series")
+    for series in report.unmatched + report.ambiguous:
+        labels = ', '.join(m['modality'] for m in series['matches']) or 'no description'
+        logger.warning(
+            f"{series['patient_id']} {series['series_desc']!r} ({series['folder']}) "
+            f"matches {labels}"
+        )
+
+
+def cmd_convert(args):
+    if not validate_config(args.config):
+        return 1
+
+    if args.dry_run:
+        from src.dry_run import dry_run
+
+        report = dry_run(args.config, args.dicom_dir, max_workers=args.index_workers)
+        log_dry_run(report)
+        return 0 if report.ok else 1
+
+    from src.converter import DicomConverter
+    from src.discovery import discover_sessions
+
+    decoder = None
+    if args.backend == 'native':
+        from src.decoders import DEFAULT_PREFERENCE, FrameDecoder
+
+        preference = args.decoders.split(',') if args.decoders else DEFAULT_PREFERENCE
+        decoder = FrameDecoder(preference, max_workers=args.decode_workers)
+
+    converter = DicomConverter(
+        config_path=args.config,
+        dicom_dir=args.dicom_dir,
+        output_dir=args.output_dir,
+        incremental=not args.force,
+        backend=args.backend,
+        metrics_path=args.metrics,
+        subject_timeout=args.subject_timeout,
+        retries=args.retries,
+        decoder=decoder
+    )
+
+    # Find subjects/sessions from sub-*/ses-* folders, or PatientID/StudyDate
+    if args.no_dedup:
+        jobs = discover_sessions(
+            args.dicom_dir, method=args.discover,
+            date_from=args.date_from, date_to=args.date_to
+        )
+    else:
+        from src.dedup import deduplicate
+        from src.header_index import open_index
+
+        with open_index(args.dicom_dir, max_workers=args.index_workers) as index:
+            jobs = discover_sessions(
+                args.dicom_dir, index=index, method=args.discover,
+                date_from=args.date_from, date_to=args.date_to
+            )
+            # Convert one copy of instances resent into several folders
+            jobs, dedup = deduplicate(jobs, index)
+        if dedup.instances:
+            logger.info(f"Deduplication: {dedup.summary()}")
+    if not jobs:
+        logger.error(f"No subjects found in {args.dicom_dir}")
+        return 1
+
+    report = converter.convert_subjects(
+        jobs, max_workers=args.workers, force=args.force,
+        timeout=args.timeout, resume=not args.no_resume
+    )
+    if report.failed:
+        failed = ', '.join(r.subject_id for r in report.failed)
+        logger.error(f"Failed subjects: {failed}")
+        return 1
+    return 0
+
+
+def cmd_watch(args):
+    if not validate_config(args.config):
+        return 1
+
+    from src.converter import DicomConverter
+    from src.watcher import FolderWatcher
+
+    converter = DicomConverter(
+        config_path=args.config,
+        dicom_dir=args.dicom_dir,
+        output_dir=args.output_dir,
+        backend=args.backend,
+        metrics_path=args.metrics,
+        subject_timeout=args.subject_timeout
+    )
+    watcher = FolderWatcher(
+        converter, settle_seconds=args.settle, poll_interval=args.poll_interval,
+        max_pending=args.max_pending, max_workers=args.workers, method=args.discover,
+        use_inotify=not args.poll, dedup=not args.no_dedup
+    )
+    stats = watcher.run(catch_up=not args.skip_existing)
+    logger.info(
+        f"Watcher stopped: {stats['converted']} converted, {stats['unchanged']} unchanged, "
+        f"{stats['failed']} failed"
+    )
+    return 0
+
+
+def cmd_export(args):
+    import boto3
+
+    from src.export import (
+        MetadataExporter, add_partition_statements, athena_ddl, drop_partition_statements
+    )
+    from src.header_index import open_index
+
+    exporter = MetadataExporter(
+        boto3.client('s3', region_name=args.region),
+        args.bucket,
+        prefix=args.prefix,
+        max_concurrency=args.workers
+    )
+    with open_index(args.dicom_dir, max_workers=args.index_workers) as index:
+        stats = exporter.export_index(index)
+
+    if args.register:
+        from src.athena_client import AthenaQueryClient
+
+        queries = AthenaQueryClient(
+            boto3.client('athena', region_name=args.region),
+            f's3://{args.bucket}/athena_results/', database=args.database
+        )
+        statements = athena_ddl(args.bucket, args.prefix, args.database)
+        statements += add_partition_statements(
+            stats['partitions'], args.bucket, args.prefix, args.database
+        )
+        statements += drop_partition_statements(stats['removed_partitions'], args.database)
+        for statement in statements:
+            queries.wait(queries.start(statement))
+        logger.info(
+            f"Registered {len(stats['partitions'])} partition(s) in {args.database}, "
+            f"dropped {len(stats['removed_partitions'])}"
+        )
+    return 0
+
+
+def cmd_sync(args):
+    from src.s3_sync import BidsSync, s3_client
+
+    syncer = BidsSync(
+        s3_client(args.region, max_pool_connections=2 * args.workers), args.bucket,
+        prefix=args.prefix, part_size=args.part_size_mb * 1024 * 1024,
+        max_concurrency=args.workers
+    )
+    stats = syncer.sync(args.output_dir, prune=args.prune)
+    return 1 if stats['errors'] else 0
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='bids-convert', description='Convert DICOM studies to BIDS'
+    )
+    parser.add_argument('--log-file', default=DEFAULT_LOG_FILE,
+                        help='Also log to this file; pass "" to disable')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log debug messages')
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND', required=True)
+
+    validate = commands.add_parser('validate', help='Check the dcm2bids configuration')
+    validate.add_argument('--config', default=DEFAULT_CONFIG)
+    validate.set_defaults(func=cmd_validate)
+
+    index = commands.add_parser('index', help='Build or refresh the DICOM header index')
+    index.add_argument('--dicom-dir', default=DEFAULT_DICOM_DIR)
+    index.add_argument('--index-path', help='SQLite index file, defaults to one in dicom-dir')
+    index.add_argument('--workers', type=positive_int, default=None,
+                       help='Header reading processes, defaults to one per CPU')
+    index.set_defaults(func=cmd_index)
+
+    convert = commands.add_parser('convert', help='Convert every discovered subject/session')
+    convert.add_argument('--config', default=DEFAULT_CONFIG)
+    convert.add_argument('--dicom-dir', default=DEFAULT_DICOM_DIR)
+    convert.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    convert.add_argument('--workers', type=positive_int, default=None,
+                         help='Concurrent conversions, defaults to one per CPU')
+    convert.add_argument('--index-workers', type=positive_int, default=1,
+                         help='Header reading processes for indexing and --dry-run')
+    convert.add_argument('--backend', choices=('dcm2bids', 'native'), default='dcm2bids')
+    convert.add_argument('--decoders',
+                         help='Comma-separated pixel decoders to prefer with the native '
+                              'backend, e.g. pylibjpeg,gdcm,pillow')
+    convert.add_argument('--decode-workers', type=positive_int, default=None,
+                         help='Threads decoding compressed frames, defaults to one per CPU')
+    convert.add_argument('--discover', choices=('auto', 'directories', 'headers'),
+                         default='auto', help='Find sessions from folders or DICOM headers')
+    convert.add_argument('--date-from', help='Only studies on or after this date (YYYYMMDD)')
+    convert.add_argument('--date-to', help='Only studies on or before this date (YYYYMMDD)')
+    convert.add_argument('--no-dedup', action='store_true',
+                         help='Convert every copy of instances stored more than once')
+    convert.add_argument('--dry-run', action='store_true',
+                         help='Report how series match the config without converting')
+    convert.add_argument('--force', action='store_true',
+                         help='Reconvert subjects whose inputs did not change')
+    convert.add_argument('--no-resume', action='store_true',
+                         help='Ignore the journal of an interrupted run')
+    convert.add_argument('--retries', type=int, default=2,
+                         help='Retries of timeouts and killed dcm2bids runs')
+    convert.add_argument('--timeout', type=float, help='Seconds for the whole batch')
+    convert.add_argument('--subject-timeout', type=float, help='Seconds per subject')
+    convert.add_argument('--metrics', help='Prometheus text file kept up to date')
+    convert.set_defaults(func=cmd_convert)
+
+    watch = commands.add_parser('watch', help='Convert sessions as their DICOMs arrive')
+    watch.add_argument('--config', default=DEFAULT_CONFIG)
+    watch.add_argument('--dicom-dir', default=DEFAULT_DICOM_DIR)
+    watch.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    watch.add_argument('--workers', type=positive_int, default=2, help='Concurrent conversions')
+    watch.add_argument('--backend', choices=('dcm2bids', 'native'), default='dcm2bids')
+    watch.add_argument('--discover', choices=('auto', 'directories', 'headers'), default='auto')
+    watch.add_argument('--settle', type=float, default=30.0,
+                       help='Seconds a series folder must stay unchanged before converting')
+    watch.add_argument('--poll-interval', type=float, default=5.0)
+    watch.add_argument('--poll', action='store_true', help='Poll even if watchdog is installed')
+    watch.add_argument('--max-pending', type=positive_int, default=16,
+                       help='Queued sessions before the watcher pauses scanning')
+    watch.add_argument('--no-dedup', action='store_true',
+                       help='Convert every copy of instances stored more than once')
+    watch.add_argument('--skip-existing', action='store_true',
+                       help='Only convert files arriving after startup')
+    watch.add_argument('--subject-timeout', type=float, help='Seconds per subject')
+    watch.add_argument('--metrics', help='Prometheus text file kept up to date')
+    watch.set_defaults(func=cmd_watch)
+
+    export = commands.add_parser('export', help='Upload header metadata to S3 as Parquet')
+    export.add_argument('--bucket', required=True)
+    export.add_argument('--dicom-dir', default=DEFAULT_DICOM_DIR)
+    export.add_argument('--prefix', default='processed_data')
+    export.add_argument('--database', default='dicom_database')
+    export.add_argument('--region', default=None)
+    export.add_argument('--workers', type=positive_int, default=4,
+                        help='Concurrent partition uploads')
+    export.add_argument('--index-workers', type=positive_int, default=None,
+                        help='Header reading processes, defaults to one per CPU')
+    export.add_argument('--register', action='store_true',
+                        help='Create the Athena tables and add new partitions')
+    export.set_defaults(func=cmd_export)
+
+    sync = commands.add_parser('sync', help='Upload new and changed BIDS outputs to S3')
+    sync.add_argument('--bucket', required=True)
+    sync.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    sync.add_argument('--prefix', default='bids')
+    sync.add_argument('--region', default=None)
+    sync.add_argument('--workers', type=positive_int, default=8,
+                      help='Files hashed and uploaded at once')
+    sync.add_argument('--part-size-mb', type=positive_int, default=8,
+                      help='Multipart threshold and part size; keep it fixed between syncs')
+    sync.add_argument('--prune', action='store_true',
+                      help='Delete objects whose local file no longer exists')
+    sync.set_defaults(func=cmd_sync)
+    return parser
+
+
+def main(argv=None):
+    """
+    Run one subcommand
+
+    Args:
+        argv (list): Arguments without the program name, defaults to sys.argv
+
+    Returns:
+        int: Exit status
+    """
+    args = build_parser().parse_args(argv)
+    setup_logging(args.log_file, args.verbose)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
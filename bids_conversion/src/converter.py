@@ -1,17 +1,121 @@
 from pathlib import Path
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional
+import shutil
+import socket
+import tempfile
 import json
 import logging
+import time
+import uuid
+import os
+
+from src.archive_source import is_member_path, materialize, source_stat
+from src.discovery import SessionJob
+from src.instrumentation import MetricsRecorder, tree_stats
+from src.journal import RunJournal, is_transient
+from src.manifest import ConversionManifest
+from src.process import run_command
+
+
+@dataclass
+class ConversionResult:
+    """Outcome of converting a single subject/session"""
+    subject_id: str
+    session: Optional[str] = None
+    success: bool = False
+    skipped: bool = False
+    duration: float = 0.0
+    error: Optional[str] = None
+    attempts: int = 0
+    output_tail: Optional[str] = None
+    metrics: Optional[dict] = None
+
+
+@dataclass
+class ConversionReport:
+    """Aggregated outcome of a multi-subject conversion run"""
+    results: List[ConversionResult] = field(default_factory=list)
+    wall_time: float = 0.0
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.success]
+
+    @property
+    def skipped(self):
+        return [r for r in self.results if r.skipped]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.success]
+
+    def summary(self):
+        """Return a one-line human readable summary of the run"""
+        cpu_time = sum(r.duration for r in self.results)
+        return (
+            f"{len(self.succeeded)} succeeded ({len(self.skipped)} unchanged), "
+            f"{len(self.failed)} failed "
+            f"in {self.wall_time:.1f}s wall time ({cpu_time:.1f}s summed subject time)"
+        )
+
 
 class DicomConverter:
-    def __init__(self, config_path, dicom_dir, output_dir):
+    BACKENDS = ('dcm2bids', 'native')
+    # Conversions are written here first and renamed into output_dir when complete
+    STAGING_DIR = '.staging'
+    
+    def __init__(self, config_path, dicom_dir, output_dir, incremental=True,
+                 backend='dcm2bids', index=None, metrics_path=None, subject_timeout=None,
+                 retries=0, retry_backoff=5.0, decoder=None):
+        """
+        Args:
+            config_path (str): Path to the dcm2bids configuration file
+            dicom_dir (str): Root of the raw DICOM tree
+            output_dir (str): BIDS output directory
+            incremental (bool): Skip subjects whose inputs are unchanged
+            backend (str): 'dcm2bids' to shell out to dcm2bids, or 'native'
+                to convert in-process with NativeBackend
+            index (DicomHeaderIndex): Header index for the native backend
+            metrics_path (str): Prometheus text-format file updated after
+                every conversion
+            subject_timeout (float): Seconds a dcm2bids run may take before
+                it is killed, None for no limit
+            retries (int): Extra attempts for transient failures in batches
+            retry_backoff (float): Delay before the first retry, doubled for
+                every further attempt
+            decoder (FrameDecoder): Pixel decoder for compressed series in
+                the native backend
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown conversion backend: {backend}")
         self.config_path = Path(config_path)
         self.dicom_dir = Path(dicom_dir)
         self.output_dir = Path(output_dir)
+        self.incremental = incremental
+        self.backend = backend
+        self.subject_timeout = subject_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.sleep = time.sleep
         self.logger = logging.getLogger(__name__)
         
         self.setup_logging()
         self.validate_paths()
+        self.manifest = ConversionManifest(self.output_dir / ConversionManifest.FILENAME)
+        self.metrics = MetricsRecorder(metrics_path)
+        self.journal = RunJournal(self.output_dir / RunJournal.FILENAME)
+        self.clean_staging()
+        self.native = None
+        if backend == 'native':
+            # Imported here so dcm2bids-only runs never load numpy
+            from src.native_backend import NativeBackend
+
+            self.native = NativeBackend(
+                self.config_path, self.dicom_dir, self.output_dir, index=index,
+                decoder=decoder
+            )
         
     def setup_logging(self):
         logging.basicConfig(
@@ -26,21 +130,285 @@ class DicomConverter:
             raise FileNotFoundError(f"DICOM directory not found: {self.dicom_dir}")
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
-    def convert_subject(self, subject_id, session=None):
-        self.logger.info(f"Converting subject: {subject_id}")
-        cmd = [
-            'dcm2bids',
-            '-d', str(self.dicom_dir),
-            '-p', subject_id,
-            '-c', str(self.config_path),
-            '-o', str(self.output_dir)
-        ]
+    def subject_source_dir(self, subject_id, session=None):
+        """Return the narrowest raw directory holding a subject/session's DICOMs"""
+        subject_dir = self.dicom_dir / subject_id
+        if session and (subject_dir / session).is_dir():
+            return subject_dir / session
+        if subject_dir.is_dir():
+            return subject_dir
+        return self.dicom_dir
+
+    def subject_output_dir(self, subject_id, session=None):
+        label = subject_id if subject_id.startswith('sub-') else f'sub-{subject_id}'
+        output = self.output_dir / label
         if session:
-            cmd.extend(['-s', session])
+            output = output / (session if session.startswith('ses-') else f'ses-{session}')
+        return output
+
+    def clean_staging(self):
+        """Remove staging folders left behind by crashed runs on this host"""
+        staging_root = self.output_dir / self.STAGING_DIR
+        if not staging_root.is_dir():
+            return
+        host = socket.gethostname()
+        for path in staging_root.iterdir():
+            # Named <host>-<pid>-<random>; other hosts may share output_dir
+            owner, _, pid = path.name.rpartition('-')[0].rpartition('-')
+            if owner != host or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                self.logger.info(f"Removing stale staging folder {path}")
+                shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    def publish(self, staged, final):
+        """
+        Move a completed subject/session folder into place
+        
+        The new folder is renamed in and any previous version renamed out and
+        deleted afterwards, so output_dir never holds a half-written subject.
+        """
+        final.parent.mkdir(parents=True, exist_ok=True)
+        previous = None
+        if final.exists():
+            previous = staged.parent / f'{final.name}.previous'
+            os.replace(final, previous)
+        os.replace(staged, final)
+        if previous is not None:
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def convert_subject(self, subject_id, session=None, force=False, timeout=None,
+                        source_dir=None, files=None):
+        """
+        Convert one subject (and optionally one session) with the selected backend
         
+        Args:
+            subject_id (str): Participant label
+            session (str): Session label
+            force (bool): Convert even if the manifest says nothing changed
+            timeout (float): Seconds before dcm2bids is killed, defaults to
+                subject_timeout
+            source_dir (str): Folder holding the subject's DICOMs, defaults
+                to subject_source_dir()
+            files (list): Restrict the conversion to these files in source_dir;
+                archive members (e.g. 'study.zip!/x.dcm') are extracted on
+                demand
+        
+        Returns:
+            bool: True if the conversion ran, False if it was up to date
+        """
+        key = ConversionManifest.key(subject_id, session)
+        source_dir = Path(source_dir) if source_dir else self.subject_source_dir(subject_id, session)
+        fingerprint = None
+        if self.incremental:
+            fingerprint = ConversionManifest.fingerprint(source_dir, self.config_path, files=files)
+            if (not force and self.manifest.is_current(key, fingerprint)
+                    and self.subject_output_dir(subject_id, session).exists()):
+                self.logger.info(f"Skipping unchanged subject: {key}")
+                return False
+        
+        self.logger.info(f"Converting subject: {subject_id}")
+        if fingerprint:
+            bytes_read = fingerprint['total_bytes']
+        elif files:
+            bytes_read = sum(source_stat(f)[0] for f in files)
+        else:
+            bytes_read = tree_stats(source_dir)[0]
+        final = self.subject_output_dir(subject_id, session)
+        staging = (self.output_dir / self.STAGING_DIR
+                   / f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}')
+        staged = staging / final.relative_to(self.output_dir)
+        measurement = self.metrics.start(subject_id, session, self.backend)
+        child_usage = None
         try:
-            subprocess.run(cmd, check=True)
-            self.logger.info(f"Successfully converted data for subject {subject_id}")
-        except subprocess.CalledProcessError as e:
+            if self.native is not None:
+                self.native.convert(
+                    subject_id, session, source_dir=source_dir, files=files, output_dir=staging
+                )
+            else:
+                completed = self.run_dcm2bids(
+                    subject_id, session, timeout=timeout, source_dir=source_dir, files=files,
+                    output_dir=staging
+                )
+                child_usage = getattr(completed, 'rusage', None)
+            # Nothing produced (e.g. no series matched the config) must not
+            # replace earlier output with an empty folder
+            produced = staged.is_dir() and any(staged.iterdir())
+            if produced:
+                self.publish(staged, final)
+                self.logger.info(f"Successfully converted data for subject {subject_id}")
+            else:
+                self.logger.warning(
+                    f"Conversion of {key} produced no output, keeping any previous output"
+                )
+        except Exception as e:
             self.logger.error(f"Error converting subject {subject_id}: {str(e)}")
-            raise
\ No newline at end of file
+            self.manifest.invalidate(key)
+            self.metrics.finish(
+                measurement, success=False, bytes_read=bytes_read,
+                child_usage=getattr(e, 'rusage', None)
+            )
+            raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        
+        self.metrics.finish(
+            measurement, success=True, bytes_read=bytes_read, output_dir=final,
+            child_usage=child_usage
+        )
+        if fingerprint is not None and produced:
+            self.manifest.record(key, fingerprint)
+        return True
+
+    def run_dcm2bids(self, subject_id, session=None, timeout=None, source_dir=None, files=None,
+                     output_dir=None):
+        # Point dcm2bids at the subject's own folder; scanning the whole
+        # archive for every participant makes a batch quadratic in its size
+        source_dir = source_dir or self.subject_source_dir(subject_id, session)
+        
+        # Give every run its own scratch space so concurrent conversions
+        # never share dcm2niix intermediates
+        with tempfile.TemporaryDirectory(prefix=f'dcm2bids_{subject_id}_') as tmp_dir:
+            if files:
+                source_dir = self.stage_files(files, Path(tmp_dir) / 'dicoms')
+            cmd = [
+                'dcm2bids',
+                '-d', str(source_dir),
+                '-p', subject_id,
+                '-c', str(self.config_path),
+                '-o', str(output_dir or self.output_dir)
+            ]
+            if session:
+                cmd.extend(['-s', session])
+            env = dict(os.environ, TMPDIR=tmp_dir, TEMP=tmp_dir, TMP=tmp_dir)
+            return run_command(
+                cmd, logger=self.logger, env=env, name=f'dcm2bids {subject_id}',
+                timeout=timeout if timeout is not None else self.subject_timeout
+            )
+
+    @staticmethod
+    def stage_files(files, staging_dir):
+        """
+        Link a subset of a shared folder into staging_dir for dcm2bids
+        
+        Archive members are extracted next to the links, so only the
+        requested members of an archive ever reach the disk.
+        """
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        if any(is_member_path(f) for f in files):
+            files = materialize(files, staging_dir.parent / 'archive_members')
+        for i, path in enumerate(files):
+            target = staging_dir / f'{i:06d}_{Path(path).name}'
+            try:
+                os.symlink(os.path.abspath(path), target)
+            except OSError:
+                shutil.copy2(path, target)
+        return staging_dir
+
+    def convert_subjects(self, subjects, max_workers=None, force=False, timeout=None,
+                         resume=False):
+        """
+        Convert many subjects concurrently
+        
+        Args:
+            subjects (iterable): Subject IDs, (subject_id, session) tuples or
+                SessionJobs from discover_sessions()
+            max_workers (int): Maximum number of concurrent dcm2bids runs,
+                defaults to the number of CPUs
+            force (bool): Reconvert subjects the manifest reports as unchanged
+            timeout (float): Seconds for the whole batch; running dcm2bids
+                processes are killed at the deadline and subjects not yet
+                started are reported as failed
+            resume (bool): Continue an interrupted run: subjects its journal
+                records as done are still checked against the manifest, and
+                skipped outright only without incremental conversion
+        
+        Returns:
+            ConversionReport: Per-subject success, duration and error
+        """
+        jobs = [
+            s if isinstance(s, SessionJob)
+            else SessionJob(*s) if isinstance(s, (tuple, list))
+            else SessionJob(s)
+            for s in subjects
+        ]
+        max_workers = max_workers or os.cpu_count() or 1
+        self.logger.info(
+            f"Converting {len(jobs)} subject(s) with up to {max_workers} workers"
+        )
+        
+        keys = [ConversionManifest.key(job.subject_id, job.session) for job in jobs]
+        run_id = self.journal.start_run(keys)
+        self.logger.info(f"Run {run_id}: journal at {self.journal.path}")
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        # dcm2bids runs in a child process, so threads are enough to keep
+        # every core busy without pickling the converter
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(
+                lambda job: self._run_job(job, force=force, deadline=deadline, resume=resume),
+                jobs
+            ))
+        
+        # Done entries only matter to a resumed, interrupted run
+        self.journal.finish_run(keys)
+        report = ConversionReport(results=results, wall_time=time.monotonic() - start)
+        self.logger.info(f"Batch conversion finished: {report.summary()}")
+        return report
+
+    def _run_job(self, job, force=False, deadline=None, resume=False):
+        subject_id, session = job.subject_id, job.session
+        key = ConversionManifest.key(subject_id, session)
+        result = ConversionResult(subject_id=subject_id, session=session)
+        start = time.monotonic()
+        # With incremental conversion the manifest fingerprint decides, so
+        # subjects changed since the interrupted run are reconverted
+        if (resume and not force and not self.incremental
+                and self.journal.state(key) == 'done'):
+            result.success = result.skipped = True
+            return result
+        
+        while True:
+            timeout = self.subject_timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    result.error = "Batch timeout reached before the conversion started"
+                    self.journal.record(key, 'failed', error=result.error, attempts=result.attempts)
+                    return result
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            
+            result.attempts += 1
+            self.journal.record(key, 'running', attempt=result.attempts)
+            try:
+                converted = self.convert_subject(
+                    subject_id, session=session, force=force, timeout=timeout,
+                    source_dir=job.source_dir, files=job.files
+                )
+            except Exception as e:
+                result.error = str(e)
+                result.output_tail = getattr(e, 'output', None)
+                if result.attempts <= self.retries and is_transient(e):
+                    delay = self.retry_backoff * 2 ** (result.attempts - 1)
+                    self.logger.warning(
+                        f"Retrying {key} in {delay:.0f}s after transient error: {str(e)}"
+                    )
+                    self.sleep(delay)
+                    continue
+                self.journal.record(
+                    key, 'failed', error=result.error, attempts=result.attempts
+                )
+                break
+            result.success, result.skipped = True, not converted
+            result.error = result.output_tail = None
+            self.journal.record(key, 'done', skipped=result.skipped, attempts=result.attempts)
+            break
+        result.duration = time.monotonic() - start
+        if not result.skipped:
+            metrics = self.metrics.latest.get((subject_id, session))
+            result.metrics = metrics.as_dict() if metrics else None
+        return result
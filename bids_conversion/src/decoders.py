@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+
+# pydicom decoding plugins in order of preference. pylibjpeg and GDCM are
+# the fastest for JPEG-LS and JPEG 2000; Pillow handles baseline JPEG and
+# JPEG 2000; pydicom's own decoders cover native data and RLE.
+DEFAULT_PREFERENCE = ('pylibjpeg', 'gdcm', 'pillow', 'pyjpegls', 'pydicom')
+
+# Transfer syntaxes whose frames are worth decoding on several threads
+COMPRESSED_SYNTAXES = {
+    '1.2.840.10008.1.2.4.50': 'JPEG Baseline',
+    '1.2.840.10008.1.2.4.51': 'JPEG Extended',
+    '1.2.840.10008.1.2.4.57': 'JPEG Lossless',
+    '1.2.840.10008.1.2.4.70': 'JPEG Lossless SV1',
+    '1.2.840.10008.1.2.4.80': 'JPEG-LS Lossless',
+    '1.2.840.10008.1.2.4.81': 'JPEG-LS Near-lossless',
+    '1.2.840.10008.1.2.4.90': 'JPEG 2000 Lossless',
+    '1.2.840.10008.1.2.4.91': 'JPEG 2000',
+    '1.2.840.10008.1.2.5': 'RLE Lossless',
+}
+
+
+def transfer_syntax(ds):
+    file_meta = getattr(ds, 'file_meta', None)
+    return str(file_meta.get('TransferSyntaxUID', '')) if file_meta is not None else ''
+
+
+def available_plugins(syntax):
+    """Names of the installed pydicom plugins able to decode a transfer syntax"""
+    from pydicom.pixels import get_decoder
+
+    try:
+        decoder = get_decoder(syntax)
+    except NotImplementedError:
+        return []
+    return list(decoder.available_plugins)
+
+
+def choose_plugin(syntax, preference=DEFAULT_PREFERENCE):
+    """
+    Pick the preferred installed plugin for a transfer syntax
+
+    Returns:
+        str: Plugin name, or '' to let pydicom choose (e.g. when none of
+            the preferred plugins is installed)
+    """
+    available = available_plugins(syntax)
+    return next((name for name in preference if name in available), '')
+
+
+class FrameDecoder:
+    """
+    Decode DICOM pixel data with a configurable decoder, frame by frame
+
+    The plugin is chosen once per transfer syntax from a preference list,
+    so installing pylibjpeg or GDCM speeds up JPEG-LS/JPEG 2000 series
+    without code changes. Frames of compressed files are decoded in a
+    thread pool; the codecs release the GIL while decoding, so frames of a
+    series decode in parallel. Native data is read without the pool.
+    """
+
+    def __init__(self, preference=None, max_workers=None):
+        """
+        Args:
+            preference (list): Plugin names in order of preference,
+                defaults to DEFAULT_PREFERENCE
+            max_workers (int): Decode threads, defaults to the number of CPUs
+        """
+        self.preference = tuple(preference or DEFAULT_PREFERENCE)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.logger = logging.getLogger(__name__)
+        self._plugins = {}
+        self._lock = threading.Lock()
+
+    def plugin(self, syntax):
+        """Return the plugin used for a transfer syntax, cached per decoder"""
+        with self._lock:
+            if syntax not in self._plugins:
+                self._plugins[syntax] = choose_plugin(syntax, self.preference)
+                self.logger.debug(
+                    f"Decoding {COMPRESSED_SYNTAXES.get(syntax, syntax)} with "
+                    f"{self._plugins[syntax] or 'pydicom default'}"
+                )
+            return self._plugins[syntax]
+
+    def decode_frame(self, ds, index):
+        """Decode one frame of a dataset to a (rows, columns) array"""
+        from pydicom.pixels import pixel_array
+
+        return pixel_array(ds, index=index, decoding_plugin=self.plugin(transfer_syntax(ds)))
+
+    def decode_files(self, paths):
+        """
+        Decode every frame of several files
+
+        Args:
+            paths (list): DICOM files
+
+        Returns:
+            list: One array per file, shaped like Dataset.pixel_array:
+                (rows, columns) for single-frame and (frames, rows, columns)
+                for multi-frame files
+        """
+        import numpy as np
+        import pydicom
+
+        datasets = [pydicom.dcmread(path) for path in paths]
+        frames = [(ds, i) for ds in datasets for i in range(int(ds.get('NumberOfFrames') or 1))]
+        if any(transfer_syntax(ds) in COMPRESSED_SYNTAXES for ds in datasets) and len(frames) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(frames))) as executor:
+                decoded = list(executor.map(lambda frame: self.decode_frame(*frame), frames))
+        else:
+            decoded = [self.decode_frame(ds, i) for ds, i in frames]
+
+        arrays, start = [], 0
+        for ds in datasets:
+            count = int(ds.get('NumberOfFrames') or 1)
+            arrays.append(decoded[start] if count == 1 else np.stack(decoded[start:start + count]))
+            start += count
+        return arrays
+
+    def decode_file(self, path):
+        return self.decode_files([path])[0]
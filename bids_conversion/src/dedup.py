@@ -0,0 +1,140 @@
+from pathlib import Path
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from itertools import groupby
+from typing import Dict, List, Set
+import logging
+
+from src.archive_source import is_member_path
+
+
+@dataclass
+class DedupReport:
+    """Duplicate instances found in a DICOM tree and the copies skipped"""
+    # (SOPInstanceUID, SeriesInstanceUID) -> path of the copy that is converted
+    canonical: Dict[tuple, str] = field(default_factory=dict)
+    excluded: Set[str] = field(default_factory=set)
+    bytes_avoided: int = 0
+    dropped_jobs: List[str] = field(default_factory=list)
+
+    @property
+    def instances(self):
+        """Instances stored more than once"""
+        return len(self.canonical)
+
+    @property
+    def duplicate_files(self):
+        """Copies left out of the conversion"""
+        return len(self.excluded)
+
+    def summary(self):
+        return (
+            f"{self.instances} instance(s) stored more than once: "
+            f"{self.duplicate_files} duplicate file(s) skipped, "
+            f"{self.bytes_avoided / 1e6:.1f} MB not converted"
+            + (f", {len(self.dropped_jobs)} session(s) entirely duplicate"
+               if self.dropped_jobs else '')
+        )
+
+
+def _folder(file_path):
+    # Works for plain paths and archive members alike
+    return file_path.rsplit('/', 1)[0]
+
+
+def find_duplicates(index, paths=None):
+    """
+    Pick one copy of every instance that is stored more than once
+
+    Copies of an instance share SOPInstanceUID and SeriesInstanceUID. The
+    canonical copy is the one in the folder holding most of its series, so
+    a series stays together when a partial resend lands next to the
+    original; ties go to plain files over archive members, then to the
+    first path.
+
+    Args:
+        index (DicomHeaderIndex): Up-to-date header index of the tree
+        paths (list): Only look at instances with a copy at or below these
+            paths relative to dicom_dir, e.g. the sessions about to be
+            converted
+
+    Returns:
+        DedupReport: Canonical copies and the paths to skip
+    """
+    report = DedupReport()
+    groups = [
+        list(copies) for _, copies in groupby(
+            index.duplicate_instances(paths),
+            key=lambda r: (r['sop_instance_uid'], r['series_instance_uid'])
+        )
+    ]
+
+    folder_counts = {}
+    for copies in groups:
+        series_uid = copies[0]['series_instance_uid']
+        if series_uid not in folder_counts:
+            folder_counts[series_uid] = Counter(
+                _folder(r['file_path'])
+                for r in index.iter_records(series_instance_uid=series_uid)
+            ) if series_uid else Counter()
+
+        counts = folder_counts[series_uid]
+        copies.sort(key=lambda r: (
+            -counts[_folder(r['file_path'])], is_member_path(r['file_path']), r['file_path']
+        ))
+        keep, *rest = copies
+        report.canonical[(keep['sop_instance_uid'], keep['series_instance_uid'])] = keep['file_path']
+        for record in rest:
+            report.excluded.add(record['file_path'])
+            report.bytes_avoided += record['size']
+    return report
+
+
+def deduplicate(jobs, index, report=None):
+    """
+    Restrict conversion jobs to one copy of every instance
+
+    Jobs without duplicate copies are returned unchanged. Jobs with some get
+    an explicit file list, so the converter stages only the canonical
+    copies; jobs whose files are all copies of instances converted by
+    another job are dropped.
+
+    Args:
+        jobs (list): SessionJobs from discover_sessions
+        index (DicomHeaderIndex): Header index the jobs were discovered from
+        report (DedupReport): Result of find_duplicates, computed if omitted
+
+    Returns:
+        tuple: (list of SessionJobs, DedupReport)
+    """
+    logger = logging.getLogger(__name__)
+    if report is None:
+        report = find_duplicates(index)
+    if not report.excluded:
+        return list(jobs), report
+
+    dicom_dir = Path(index.dicom_dir).resolve()
+    deduplicated = []
+    for job in jobs:
+        if job.files is not None:
+            files = [str(f) for f in job.files]
+        else:
+            prefix = Path(job.source_dir).resolve().relative_to(dicom_dir).as_posix()
+            files = [
+                r['file_path'] for r in index.iter_records(
+                    path_prefix='' if prefix == '.' else prefix + '/'
+                )
+            ]
+        kept = [f for f in files if f not in report.excluded]
+        if len(kept) == len(files):
+            deduplicated.append(job)
+        elif kept:
+            logger.info(
+                f"{job.subject_id} {job.session or ''}: skipping "
+                f"{len(files) - len(kept)} duplicate file(s)"
+            )
+            deduplicated.append(replace(job, files=kept))
+        else:
+            logger.info(f"{job.subject_id} {job.session or ''}: only duplicates, skipped")
+            report.dropped_jobs.append(f"{job.subject_id}/{job.session or ''}")
+    return deduplicated, report
@@ -0,0 +1,292 @@
+from pathlib import Path
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import logging
+import os
+import re
+
+from src.archive_source import is_archive, is_member_path, member_path, member_sizes
+from src.header_index import open_index
+
+DISCOVERY_METHODS = ('auto', 'directories', 'headers')
+
+
+@dataclass
+class SessionJob:
+    """A subject/session to convert and the DICOMs that belong to it"""
+    subject_id: str
+    session: Optional[str] = None
+    source_dir: Optional[Path] = None
+    # Only set when source_dir also holds other subjects' files
+    files: Optional[List[str]] = None
+    patient_id: Optional[str] = None
+    study_dates: Tuple[str, ...] = ()
+
+
+def bids_label(value):
+    """Reduce a header value to a valid BIDS label (alphanumerics only)"""
+    if value is None:
+        return 'unknown'
+    return re.sub(r'[^A-Za-z0-9]', '', str(value)) or 'unknown'
+
+
+def normalize_date(value):
+    """Accept YYYYMMDD or YYYY-MM-DD, return YYYYMMDD"""
+    if value is None:
+        return None
+    value = str(value).replace('-', '')
+    if not re.fullmatch(r'\d{8}', value):
+        raise ValueError(f"Invalid date (expected YYYYMMDD or YYYY-MM-DD): {value}")
+    return value
+
+
+def in_date_range(job, date_from=None, date_to=None):
+    """Check whether any of a job's study dates falls within [date_from, date_to]"""
+    if date_from is None and date_to is None:
+        return True
+    return any(
+        (date_from is None or date >= date_from) and (date_to is None or date <= date_to)
+        for date in job.study_dates
+    )
+
+
+def archive_folder_files(folder):
+    """
+    List a folder's files with the members of its archives spelled out
+
+    Returns:
+        list: Plain file paths and virtual member paths, or None if the
+            folder holds no archives and can be converted as it is
+    """
+    plain, archives = [], []
+    for root, dirs, names in os.walk(folder):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            (archives if is_archive(name) else plain).append(path)
+    if not archives:
+        return None
+    members = [
+        member_path(archive, member)
+        for archive in archives for member in sorted(member_sizes(archive))
+    ]
+    return plain + members
+
+
+def relative_paths(dicom_dir, paths):
+    """Express paths (absolute or relative to dicom_dir) relative to dicom_dir"""
+    dicom_dir = Path(dicom_dir)
+    relative = []
+    for path in map(Path, paths):
+        if path.is_absolute():
+            try:
+                path = path.relative_to(dicom_dir)
+            except ValueError:
+                path = path.resolve().relative_to(dicom_dir.resolve())
+        relative.append('' if path.as_posix() == '.' else path.as_posix())
+    return relative
+
+
+def overlaps(folder, paths):
+    """Whether any relative path lies in folder, or folder lies in it"""
+    return any(
+        not path or path == folder or path.startswith(folder + '/')
+        or folder.startswith(path + '/')
+        for path in paths
+    )
+
+
+def discover_directories(dicom_dir, index=None, paths=None):
+    """
+    Enumerate sub-*/ses-* folders
+
+    A folder holding .zip/.tar archives gets a job listing its files and
+    archive members, so dcm2bids is given the extracted members rather than
+    a folder it would find no DICOMs in.
+
+    Args:
+        dicom_dir (str): Root of the raw DICOM tree
+        index (DicomHeaderIndex): If given, used to attach study dates
+        paths (list): Only return the folders holding or inside these paths
+
+    Returns:
+        list: One SessionJob per session folder (or per subject folder
+            without sessions)
+    """
+    dicom_dir = Path(dicom_dir)
+    if paths is None:
+        subject_dirs = dicom_dir.glob('sub-*')
+    else:
+        paths = relative_paths(dicom_dir, paths)
+        if '' in paths:
+            subject_dirs = dicom_dir.glob('sub-*')
+        else:
+            subject_dirs = {dicom_dir / path.split('/')[0] for path in paths}
+            subject_dirs = [p for p in subject_dirs if p.name.startswith('sub-')]
+    jobs = []
+    for subject_dir in sorted(p for p in subject_dirs if p.is_dir()):
+        sessions = sorted(p for p in subject_dir.glob('ses-*') if p.is_dir())
+        if sessions:
+            jobs.extend(SessionJob(subject_dir.name, s.name, s) for s in sessions)
+        else:
+            jobs.append(SessionJob(subject_dir.name, None, subject_dir))
+    if paths is not None:
+        jobs = [
+            job for job in jobs
+            if overlaps(job.source_dir.relative_to(dicom_dir).as_posix(), paths)
+        ]
+    for job in jobs:
+        job.files = archive_folder_files(job.source_dir)
+
+    if index is not None:
+        for job in jobs:
+            prefix = job.source_dir.relative_to(dicom_dir).as_posix() + '/'
+            job.study_dates = tuple(index.distinct('study_date', path_prefix=prefix))
+            patient_ids = index.distinct('patient_id', path_prefix=prefix)
+            job.patient_id = patient_ids[0] if len(patient_ids) == 1 else None
+    return jobs
+
+
+def session_records(index, paths):
+    """
+    Stream the records of every session with files at or below paths
+
+    Files without a PatientID are only streamed from below paths, since
+    they belong to no session.
+    """
+    sessions = set()
+    for record in index.iter_records(paths=paths):
+        patient_id = record['patient_id']
+        if patient_id and patient_id.strip():
+            sessions.add((patient_id, record['study_date']))
+        else:
+            yield record
+    for patient_id, study_date in sorted(sessions, key=lambda s: (s[0], s[1] or '')):
+        yield from index.iter_records(patient_id=patient_id, study_date=study_date)
+
+
+def discover_headers(index, paths=None):
+    """
+    Group indexed files into subjects by PatientID and sessions by StudyDate
+
+    Subjects are labelled sub-<PatientID> and sessions ses-<StudyDate>, both
+    reduced to alphanumerics, so labels stay stable as new studies arrive.
+    Files without a PatientID are skipped with a warning rather than merged
+    into one subject across unrelated studies.
+    Each job points at the deepest folder holding all of its files; if that
+    folder also holds other sessions' files, or lies inside an archive, the
+    job lists its files so the converter can stage just those.
+
+    Args:
+        index (DicomHeaderIndex): Refreshed header index
+        paths (list): Only return the sessions with files at or below these
+            paths, relative to dicom_dir or absolute
+
+    Returns:
+        list: One SessionJob per PatientID/StudyDate
+    """
+    dicom_dir = Path(index.dicom_dir)
+    if paths is None:
+        records = index.iter_records(order_by=('patient_id', 'study_date', 'path'))
+    else:
+        paths = relative_paths(dicom_dir, paths)
+        records = session_records(index, paths)
+    groups = defaultdict(list)
+    for record in records:
+        patient_id = record['patient_id']
+        # Files without a PatientID still own their folders, so a session
+        # sharing a folder with them lists its files instead of the folder
+        key = (patient_id, record['study_date']) if patient_id and patient_id.strip() else None
+        groups[key].append(record['file_path'])
+
+    # For every folder, the sessions with files below it (None once mixed);
+    # with paths, the index's file count of a folder tells instead
+    owners = {}
+    if paths is None:
+        for key, files in groups.items():
+            for folder in {Path(f).parent for f in files}:
+                while True:
+                    owner = owners.get(folder, key)
+                    owners[folder] = key if owner == key else None
+                    if folder == dicom_dir or folder == folder.parent:
+                        break
+                    folder = folder.parent
+
+    anonymous = groups.pop(None, [])
+    if anonymous:
+        logging.getLogger(__name__).warning(
+            f"Skipping {len(anonymous)} file(s) without a PatientID, e.g. {anonymous[0]}"
+        )
+
+    jobs = []
+    labels = {}
+    for (patient_id, study_date), files in groups.items():
+        subject_id = f'sub-{bids_label(patient_id)}'
+        if labels.setdefault(subject_id, patient_id) != patient_id:
+            logging.getLogger(__name__).warning(
+                f"PatientIDs {labels[subject_id]!r} and {patient_id!r} share label {subject_id}"
+            )
+        source_dir = Path(os.path.commonpath([str(Path(f).parent) for f in files]))
+        if paths is None:
+            shared = owners.get(source_dir) is None
+        else:
+            shared = index.count([index.relative_path(source_dir)]) != len(files)
+        list_files = shared or any(is_member_path(f) for f in files)
+        jobs.append(SessionJob(
+            subject_id=subject_id,
+            session=f'ses-{bids_label(study_date)}' if study_date else None,
+            source_dir=source_dir,
+            files=files if list_files else None,
+            patient_id=patient_id,
+            study_dates=(study_date,) if study_date else ()
+        ))
+    return jobs
+
+
+def discover_sessions(dicom_dir, index=None, method='auto', date_from=None, date_to=None,
+                      paths=None):
+    """
+    Find the subjects and sessions to convert
+
+    Args:
+        dicom_dir (str): Root of the raw DICOM tree
+        index (DicomHeaderIndex): Header index; opened on demand when headers
+            are needed (header discovery or date filtering)
+        method (str): 'directories' for sub-*/ses-* folders, 'headers' for
+            PatientID/StudyDate, or 'auto' to use folders when present
+        date_from (str): Earliest StudyDate to keep, YYYYMMDD or YYYY-MM-DD
+        date_to (str): Latest StudyDate to keep
+        paths (list): Only find the sessions with files at or below these
+            folders, files or archives, e.g. the ones that just changed
+
+    Returns:
+        list: SessionJobs sorted by subject and session
+    """
+    if method not in DISCOVERY_METHODS:
+        raise ValueError(f"Unknown discovery method: {method}")
+    dicom_dir = Path(dicom_dir)
+    date_from, date_to = normalize_date(date_from), normalize_date(date_to)
+    if method == 'auto':
+        has_subject_dirs = any(p.is_dir() for p in dicom_dir.glob('sub-*'))
+        method = 'directories' if has_subject_dirs else 'headers'
+
+    filtered = date_from is not None or date_to is not None
+    own_index = index is None and (method == 'headers' or filtered)
+    if own_index:
+        index = open_index(dicom_dir)
+    try:
+        if method == 'headers':
+            jobs = discover_headers(index, paths=paths)
+        else:
+            jobs = discover_directories(dicom_dir, index=index, paths=paths)
+    finally:
+        if own_index:
+            index.close()
+
+    kept = [job for job in jobs if in_date_range(job, date_from, date_to)]
+    logging.getLogger(__name__).info(
+        f"Discovered {len(jobs)} session(s) by {method}"
+        + (f", {len(kept)} within the date range" if filtered else '')
+    )
+    return sorted(kept, key=lambda job: (job.subject_id, job.session or ''))
@@ -0,0 +1,127 @@
+from pathlib import Path
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List
+
+from src.header_index import open_index
+from src.matcher import SeriesMatcher
+
+# Files dcm2bids writes per converted series: the NIfTI image and its sidecar
+FILES_PER_SERIES = 2
+
+
+@dataclass
+class DryRunReport:
+    """What a conversion would do with every series, without running it"""
+    series: List[dict] = field(default_factory=list)
+
+    @property
+    def matched(self):
+        return [s for s in self.series if len(s['matches']) == 1]
+
+    @property
+    def unmatched(self):
+        return [s for s in self.series if not s['matches']]
+
+    @property
+    def ambiguous(self):
+        """Series matching several descriptions; dcm2bids skips these"""
+        return [s for s in self.series if len(s['matches']) > 1]
+
+    @property
+    def label_counts(self):
+        """Matched series per dataType/modalityLabel"""
+        return dict(sorted(Counter(
+            f"{s['matches'][0]['dataType']}/{s['matches'][0]['modality']}" for s in self.matched
+        ).items()))
+
+    @property
+    def projected_files(self):
+        return FILES_PER_SERIES * len(self.matched)
+
+    @property
+    def ok(self):
+        return not self.unmatched and not self.ambiguous
+
+    def summary(self):
+        """Return a one-line human readable summary of the plan"""
+        return (
+            f"{len(self.series)} series: {len(self.matched)} matched, "
+            f"{len(self.unmatched)} unmatched, {len(self.ambiguous)} ambiguous; "
+            f"{self.projected_files} output files projected"
+        )
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        return pd.DataFrame([
+            dict(s, match_count=len(s['matches']),
+                 labels=[m['modality'] for m in s['matches']])
+            for s in self.series
+        ])
+
+
+def series_key(record):
+    """Identify a record's series, falling back to folder/number/description without a UID"""
+    return record['series_instance_uid'] or (
+        str(Path(record['file_path']).parent),
+        record['series_number'],
+        record['series_description']
+    )
+
+
+def plan_conversion(matcher, index):
+    """
+    Match every indexed series against the configuration
+
+    Records are streamed from the index, so memory grows with the number of
+    series rather than files, and each distinct SeriesDescription is matched
+    once, with the config's searchMethod as dcm2bids would.
+
+    Args:
+        matcher (SeriesMatcher): Compiled configuration
+        index (DicomHeaderIndex): Refreshed header index
+
+    Returns:
+        DryRunReport: One entry per series with its matches
+    """
+    series = {}
+    for record in index.iter_records():
+        key = series_key(record)
+        entry = series.get(key)
+        if entry is None:
+            entry = series[key] = {
+                'patient_id': record['patient_id'],
+                'study_date': record['study_date'],
+                'series_number': record['series_number'],
+                'series_desc': record['series_description'],
+                'folder': str(Path(record['file_path']).parent),
+                'files': 0,
+                'matches': matcher.match(record['series_description'] or ''),
+            }
+        entry['files'] += 1
+    return DryRunReport(series=sorted(
+        series.values(),
+        key=lambda s: (str(s['patient_id']), str(s['study_date']), str(s['series_number']))
+    ))
+
+
+def dry_run(config_path, dicom_dir, index=None, max_workers=1):
+    """
+    Report how a conversion would treat every series, without invoking dcm2bids
+
+    Args:
+        config_path (str): Path to the dcm2bids configuration file
+        dicom_dir (str): Root of the raw DICOM tree
+        index (DicomHeaderIndex): Existing header index, opened and
+            refreshed from dicom_dir when omitted
+        max_workers (int): Worker processes used to (re)index headers
+
+    Returns:
+        DryRunReport
+    """
+    matcher = SeriesMatcher.from_config_file(config_path)
+    if index is not None:
+        return plan_conversion(matcher, index)
+    with open_index(dicom_dir, max_workers=max_workers) as index:
+        return plan_conversion(matcher, index)
@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+
+from src.export import PARTITION_COLUMNS, TABLES, table_schema
+from src.query_client import CachedQueryClient
+
+# Arrow types of the exported tables -> DuckDB types
+DUCKDB_TYPES = {
+    'string': 'VARCHAR',
+    'int32': 'INTEGER',
+    'int64': 'BIGINT',
+}
+
+
+def empty_columns(table):
+    """SELECT list of typed NULLs matching an exported table's columns"""
+    columns = [(field.name, DUCKDB_TYPES[str(field.type)]) for field in table_schema(table)]
+    columns += [(col, 'VARCHAR') for col in PARTITION_COLUMNS]
+    return ', '.join(f'CAST(NULL AS {sql_type}) AS {name}' for name, sql_type in columns)
+
+
+class DuckDBQueryClient(CachedQueryClient):
+    """
+    Run dashboard queries in-process with DuckDB instead of Athena
+
+    The exported dicom_metadata, scan_counts and modality_counts tables are
+    exposed as views named <database>.<table> over their Hive-partitioned
+    Parquet files, so queries written for Athena run unchanged. root is either a local copy of the
+    export prefix (e.g. from `aws s3 sync s3://bucket/processed_data ...`)
+    or an s3:// URI, optionally on an S3-compatible endpoint such as MinIO.
+
+    The views glob the files on every query, so newly exported partitions
+    show up without reconnecting; a table with no files yet reads as empty
+    until its first export. Results are cached as in CachedQueryClient.
+    """
+
+    def __init__(self, root, database='dicom_database', region=None, endpoint=None,
+                 cache_ttl=300, clock=time.monotonic):
+        """
+        Args:
+            root (str): Directory or s3:// URI holding one folder per table
+            database (str): Schema the table views are created in
+            region (str): AWS region of an s3:// root
+            endpoint (str): [http://]host[:port] of an S3-compatible service
+            cache_ttl (float): Seconds results stay cached, 0 disables caching
+            clock (callable): Monotonic clock, injectable for tests
+        """
+        import duckdb
+
+        super().__init__(cache_ttl=cache_ttl, clock=clock)
+        self.root = str(root).rstrip('/')
+        self.database = database
+        self.logger = logging.getLogger(__name__)
+        self._views_lock = threading.Lock()
+        self._pending_views = set(TABLES)
+
+        self.conn = duckdb.connect()
+        if self.root.startswith('s3://'):
+            self._configure_s3(region, endpoint)
+        self.conn.execute(f'CREATE SCHEMA IF NOT EXISTS {database}')
+
+    def table_source(self, table):
+        """DuckDB table function reading every partition file of a table"""
+        # Partition values stay strings, as declared in the Athena DDL
+        hive_types = ', '.join(f"'{col}': 'VARCHAR'" for col in PARTITION_COLUMNS)
+        return (
+            f"read_parquet('{self.root}/{table}/**/*.parquet', "
+            f"hive_partitioning = true, hive_types = {{{hive_types}}})"
+        )
+
+    def _configure_s3(self, region, endpoint):
+        import boto3
+
+        self.conn.execute('INSTALL httpfs')
+        self.conn.execute('LOAD httpfs')
+        # Same credential chain as the boto3 clients used for the export
+        session = boto3.Session(region_name=region)
+        options = {'TYPE': 'S3', 'REGION': session.region_name or 'us-east-1'}
+        credentials = session.get_credentials()
+        if credentials is not None:
+            frozen = credentials.get_frozen_credentials()
+            options.update(KEY_ID=frozen.access_key, SECRET=frozen.secret_key)
+            if frozen.token:
+                options['SESSION_TOKEN'] = frozen.token
+        if endpoint:
+            scheme, _, host = endpoint.rpartition('://')
+            options.update(ENDPOINT=host, URL_STYLE='path')
+            if scheme == 'http':
+                options['USE_SSL'] = 'false'
+        spec = ', '.join(
+            f"{key} {value}" if key in ('TYPE', 'USE_SSL') else f"{key} '{value}'"
+            for key, value in options.items()
+        )
+        self.conn.execute(f'CREATE OR REPLACE SECRET export_s3 ({spec})')
+
+    def _create_views(self):
+        # A table without files yet gets an empty view of the exported
+        # schema, and is looked for again on the next query
+        import duckdb
+
+        for table in sorted(self._pending_views):
+            try:
+                self.conn.execute(
+                    f'CREATE OR REPLACE VIEW {self.database}.{table} AS '
+                    f'SELECT * FROM {self.table_source(table)}'
+                )
+            except duckdb.IOException as e:
+                self.logger.debug(f"No {table} files under {self.root} yet: {e}")
+                self.conn.execute(
+                    f'CREATE OR REPLACE VIEW {self.database}.{table} AS '
+                    f'SELECT {empty_columns(table)} WHERE false'
+                )
+            else:
+                self._pending_views.discard(table)
+
+    def execute(self, query):
+        """Run a query and return its results as a DataFrame"""
+        with self._views_lock:
+            if self._pending_views:
+                self._create_views()
+        # Cursors are separate connections to the same database, so
+        # concurrent queries from Streamlit or query_async do not interleave
+        cursor = self.conn.cursor()
+        try:
+            start = self.clock()
+            df = cursor.execute(query).fetchdf()
+        finally:
+            cursor.close()
+        self.logger.debug(f"DuckDB query returned {len(df)} rows in {self.clock() - start:.3f}s")
+        return df
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,490 @@
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import quote, unquote
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+
+# Columns written to the metadata dataset, mapped from header index columns
+EXPORT_COLUMNS = {
+    'subject_id': 'patient_id',
+    'study_date': 'study_date',
+    'series_desc': 'series_description',
+    'series_number': 'series_number',
+    'series_uid': 'series_instance_uid',
+    'modality': 'modality',
+    'file_path': 'file_path',
+    'file_size': 'size',
+}
+
+PARTITION_COLUMNS = ('subject_id', 'study_date')
+
+# Partition value Hive uses for NULL keys
+DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+METADATA_TABLE = 'dicom_metadata'
+SCAN_COUNTS_TABLE = 'scan_counts'
+MODALITY_COUNTS_TABLE = 'modality_counts'
+# Every table written per partition, in upload order
+TABLES = (METADATA_TABLE, SCAN_COUNTS_TABLE, MODALITY_COUNTS_TABLE)
+STATE_KEY = '_export_state.json'
+# Bumped when the tables change, so the next export rewrites every partition
+STATE_VERSION = 2
+
+# Partitions per ALTER TABLE statement, well below Athena's query length limit
+PARTITION_BATCH_SIZE = 100
+
+
+def partition_path(values):
+    """Render partition values as a Hive-style path, e.g. subject_id=X/study_date=Y"""
+    return '/'.join(
+        f"{col}={DEFAULT_PARTITION if value is None else quote(str(value), safe='')}"
+        for col, value in zip(PARTITION_COLUMNS, values)
+    )
+
+
+def parse_partition_path(path):
+    """Inverse of partition_path: return the partition values of a Hive-style path"""
+    values = []
+    for part in path.split('/'):
+        value = part.split('=', 1)[1]
+        values.append(None if value == DEFAULT_PARTITION else unquote(value))
+    return tuple(values)
+
+
+def metadata_schema():
+    """Arrow schema of the non-partition metadata columns"""
+    import pyarrow as pa
+
+    return pa.schema([
+        ('series_desc', pa.string()),
+        ('series_number', pa.int32()),
+        ('series_uid', pa.string()),
+        ('modality', pa.string()),
+        ('file_path', pa.string()),
+        ('file_size', pa.int64()),
+    ])
+
+
+def scan_counts_schema():
+    """Arrow schema of the non-partition scan count aggregate columns"""
+    import pyarrow as pa
+
+    return pa.schema([
+        ('series_desc', pa.string()),
+        ('scan_count', pa.int64()),
+        ('series_count', pa.int64()),
+        ('total_bytes', pa.int64()),
+    ])
+
+
+def modality_counts_schema():
+    """Arrow schema of the non-partition modality count aggregate columns"""
+    import pyarrow as pa
+
+    return pa.schema([
+        ('modality', pa.string()),
+        ('file_count', pa.int64()),
+        ('series_count', pa.int64()),
+    ])
+
+
+def table_schema(table):
+    """Arrow schema of the non-partition columns of an exported table"""
+    return {
+        METADATA_TABLE: metadata_schema,
+        SCAN_COUNTS_TABLE: scan_counts_schema,
+        MODALITY_COUNTS_TABLE: modality_counts_schema,
+    }[table]()
+
+
+def athena_ddl(bucket_name, prefix='processed_data', database='dicom_database'):
+    """
+    Athena statements declaring the exported tables
+
+    Returns:
+        list: CREATE DATABASE / CREATE EXTERNAL TABLE statements
+    """
+    location = f"s3://{bucket_name}/{prefix.rstrip('/')}"
+    partitions = "PARTITIONED BY (subject_id string, study_date string)"
+    return [
+        f"CREATE DATABASE IF NOT EXISTS {database}",
+        f"""CREATE EXTERNAL TABLE IF NOT EXISTS {database}.{METADATA_TABLE} (
+    series_desc string,
+    series_number int,
+    series_uid string,
+    modality string,
+    file_path string,
+    file_size bigint
+)
+{partitions}
+STORED AS PARQUET
+LOCATION '{location}/{METADATA_TABLE}/'""",
+        f"""CREATE EXTERNAL TABLE IF NOT EXISTS {database}.{SCAN_COUNTS_TABLE} (
+    series_desc string,
+    scan_count bigint,
+    series_count bigint,
+    total_bytes bigint
+)
+{partitions}
+STORED AS PARQUET
+LOCATION '{location}/{SCAN_COUNTS_TABLE}/'""",
+        f"""CREATE EXTERNAL TABLE IF NOT EXISTS {database}.{MODALITY_COUNTS_TABLE} (
+    modality string,
+    file_count bigint,
+    series_count bigint
+)
+{partitions}
+STORED AS PARQUET
+LOCATION '{location}/{MODALITY_COUNTS_TABLE}/'""",
+    ]
+
+
+def _partition_spec(values):
+    return "PARTITION (" + ', '.join(
+        f"{col} = '{sql_string(value)}'" for col, value in zip(PARTITION_COLUMNS, values)
+    ) + ")"
+
+
+def _batches(partitions, batch_size):
+    partitions = list(partitions)
+    return [partitions[i:i + batch_size] for i in range(0, len(partitions), batch_size)]
+
+
+def add_partition_statements(partitions, bucket_name, prefix='processed_data',
+                             database='dicom_database', batch_size=PARTITION_BATCH_SIZE):
+    """
+    ALTER TABLE statements registering newly exported partitions with Athena
+
+    Each statement adds at most batch_size partitions to one table.
+    """
+    location = f"s3://{bucket_name}/{prefix.rstrip('/')}"
+    statements = []
+    for table in TABLES:
+        for batch in _batches(partitions, batch_size):
+            specs = ' '.join(
+                f"{_partition_spec(values)} "
+                f"LOCATION '{location}/{table}/{partition_path(values)}/'"
+                for values in batch
+            )
+            statements.append(f"ALTER TABLE {database}.{table} ADD IF NOT EXISTS {specs}")
+    return statements
+
+
+def drop_partition_statements(partitions, database='dicom_database',
+                              batch_size=PARTITION_BATCH_SIZE):
+    """ALTER TABLE statements removing pruned partitions from Athena, batch_size at a time"""
+    statements = []
+    for table in TABLES:
+        for batch in _batches(partitions, batch_size):
+            specs = ', '.join(_partition_spec(values) for values in batch)
+            statements.append(f"ALTER TABLE {database}.{table} DROP IF EXISTS {specs}")
+    return statements
+
+
+def dashboard_queries(database='dicom_database'):
+    """
+    Queries behind the dashboard, valid in both Athena and DuckDB
+
+    Returns:
+        dict: Query name -> SQL text
+    """
+    return {
+        # The precomputed per-partition aggregate instead of every metadata row
+        'scan_counts': f"""SELECT subject_id, series_desc, SUM(scan_count) AS scan_count
+FROM {database}.{SCAN_COUNTS_TABLE}
+GROUP BY subject_id, series_desc
+ORDER BY subject_id, series_desc""",
+        'sessions': f"""SELECT subject_id, study_date, SUM(series_count) AS series_count,
+    SUM(total_bytes) AS total_bytes
+FROM {database}.{SCAN_COUNTS_TABLE}
+GROUP BY subject_id, study_date
+ORDER BY subject_id, study_date""",
+        'modalities': f"""SELECT modality, SUM(file_count) AS file_count,
+    SUM(series_count) AS series_count
+FROM {database}.{MODALITY_COUNTS_TABLE}
+GROUP BY modality
+ORDER BY modality""",
+    }
+
+
+def sql_string(value):
+    return DEFAULT_PARTITION if value is None else str(value).replace("'", "''")
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MetadataExporter:
+    """
+    Stream DICOM metadata to S3 as Hive-partitioned Parquet
+
+    Records are written partition by partition into bounded row groups in a
+    local spool file. Each finished partition file is uploaded with boto3's
+    managed multipart transfer while the next partition is being written, so
+    memory use is bounded by the row group size rather than the dataset.
+
+    Alongside the metadata table two small aggregates are written per
+    partition: scan_counts (files, series and bytes per series description)
+    and modality_counts (files and series per modality). A
+    digest of every partition is kept in S3, so re-exports only upload
+    partitions whose contents changed and drop partitions that disappeared.
+    """
+
+    def __init__(self, s3_client, bucket_name, prefix='processed_data',
+                 row_group_size=50000, part_size=8 * 1024 * 1024, max_concurrency=4,
+                 spool_dir=None):
+        """
+        Args:
+            s3_client: boto3 S3 client
+            bucket_name (str): Destination bucket
+            prefix (str): Key prefix holding the exported tables
+            row_group_size (int): Rows buffered per Parquet row group
+            part_size (int): Multipart upload part size (and threshold) in bytes
+            max_concurrency (int): Concurrent partition uploads, and parts
+                per upload
+            spool_dir (str): Directory for local spool files
+        """
+        self.s3 = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix.rstrip('/')
+        self.row_group_size = row_group_size
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.spool_dir = spool_dir
+        self.logger = logging.getLogger(__name__)
+        self._stats_lock = threading.Lock()
+
+    def transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=self.part_size,
+            multipart_chunksize=self.part_size,
+            max_concurrency=self.max_concurrency
+        )
+
+    def table_key(self, table, partition):
+        return f"{self.prefix}/{table}/{partition_path(partition)}/part-00000.parquet"
+
+    def load_state(self):
+        try:
+            body = self.s3.get_object(
+                Bucket=self.bucket_name, Key=f"{self.prefix}/{STATE_KEY}"
+            )['Body'].read()
+        except self.s3.exceptions.NoSuchKey:
+            return {}
+        state = json.loads(body)
+        if state.get('version') != STATE_VERSION:
+            # Written before a table was added: rewrite every partition
+            return {}
+        return state.get('partitions', {})
+
+    def save_state(self, state):
+        self.s3.put_object(
+            Bucket=self.bucket_name,
+            Key=f"{self.prefix}/{STATE_KEY}",
+            Body=json.dumps(
+                {'version': STATE_VERSION, 'partitions': state}, indent=2, sort_keys=True
+            ).encode()
+        )
+
+    def export_index(self, index):
+        """Export every record of a DicomHeaderIndex, streamed in partition order"""
+        return self.export(
+            index.iter_records(order_by=('patient_id', 'study_date', 'path')), prune=True
+        )
+
+    def export(self, records, prune=False):
+        """
+        Write records to S3 as Parquet partitioned by subject_id/study_date
+
+        Args:
+            records (iterable): Header index records (dicts), grouped by
+                partition (e.g. sorted by patient_id, study_date)
+            prune (bool): Records cover the whole dataset; delete previously
+                exported partitions that no longer appear
+
+        Returns:
+            dict: Rows, files and bytes written, the uploaded keys, the
+                unchanged/removed partition counts and the values of the
+                partitions that were uploaded and removed (for registering
+                with and dropping from Athena)
+        """
+        schema = metadata_schema()
+        state = self.load_state()
+        new_state = {}
+        stats = {
+            'rows': 0, 'files': 0, 'bytes': 0, 'keys': [],
+            'unchanged': 0, 'removed': 0, 'partitions': [], 'removed_partitions': []
+        }
+        pending = set()
+        spool = None
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            def finish(spool):
+                spool.close()
+                name = partition_path(spool.partition)
+                new_state[name] = spool.digest()
+                if state.get(name) == new_state[name]:
+                    os.remove(spool.path)
+                    stats['unchanged'] += 1
+                    return
+                stats['partitions'].append(spool.partition)
+                # Bound the number of spooled files waiting for upload
+                while len(pending) >= self.max_concurrency:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    pending.difference_update(done)
+                    for future in done:
+                        future.result()
+                pending.add(executor.submit(self._upload, spool, stats))
+
+            for record in records:
+                row = {col: record.get(src) for col, src in EXPORT_COLUMNS.items()}
+                row['series_number'] = to_int(row['series_number'])
+                partition = tuple(row.pop(col) for col in PARTITION_COLUMNS)
+                if spool is None or partition != spool.partition:
+                    if spool is not None:
+                        finish(spool)
+                    if partition_path(partition) in new_state:
+                        raise ValueError(
+                            f"Records are not grouped by partition: {partition} seen twice"
+                        )
+                    spool = _SpoolFile(partition, schema, self.row_group_size, self.spool_dir)
+                spool.append(row)
+                stats['rows'] += 1
+
+            if spool is not None:
+                finish(spool)
+            for future in pending:
+                future.result()
+
+        if prune:
+            for name in sorted(state.keys() - new_state.keys()):
+                for table in TABLES:
+                    self.s3.delete_object(
+                        Bucket=self.bucket_name,
+                        Key=f"{self.prefix}/{table}/{name}/part-00000.parquet"
+                    )
+                stats['removed'] += 1
+                stats['removed_partitions'].append(parse_partition_path(name))
+        else:
+            new_state = dict(state, **new_state)
+        self.save_state(new_state)
+
+        stats['keys'].sort()
+        self.logger.info(
+            f"Exported {stats['rows']} rows: {len(stats['partitions'])} partition(s) "
+            f"uploaded ({stats['bytes']} bytes), {stats['unchanged']} unchanged, "
+            f"{stats['removed']} removed"
+        )
+        return stats
+
+    def _upload(self, spool, stats):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        data_key = self.table_key(METADATA_TABLE, spool.partition)
+        try:
+            size = Path(spool.path).stat().st_size
+            self.s3.upload_file(
+                spool.path, self.bucket_name, data_key, Config=self.transfer_config()
+            )
+        finally:
+            os.remove(spool.path)
+        keys = [data_key]
+
+        aggregates = {
+            SCAN_COUNTS_TABLE: spool.scan_counts(),
+            MODALITY_COUNTS_TABLE: spool.modality_counts(),
+        }
+        for table, rows in aggregates.items():
+            buffer = io.BytesIO()
+            pq.write_table(
+                pa.Table.from_pylist(rows, schema=table_schema(table)), buffer,
+                compression='snappy'
+            )
+            key = self.table_key(table, spool.partition)
+            self.s3.put_object(Bucket=self.bucket_name, Key=key, Body=buffer.getvalue())
+            keys.append(key)
+            size += buffer.tell()
+
+        with self._stats_lock:
+            stats['keys'].extend(keys)
+            stats['files'] += len(keys)
+            stats['bytes'] += size
+
+
+class _SpoolFile:
+    """Local Parquet file for one partition, written in bounded row groups"""
+
+    def __init__(self, partition, schema, row_group_size, spool_dir=None):
+        import pyarrow.parquet as pq
+
+        self.partition = partition
+        self.schema = schema
+        self.row_group_size = row_group_size
+        fd, self.path = tempfile.mkstemp(suffix='.parquet', dir=spool_dir)
+        os.close(fd)
+        self.writer = pq.ParquetWriter(self.path, schema, compression='snappy')
+        self.buffer = []
+        self._digest = hashlib.sha256()
+        self._counts = defaultdict(lambda: {'scan_count': 0, 'series': set(), 'total_bytes': 0})
+        self._modalities = defaultdict(lambda: {'file_count': 0, 'series': set()})
+
+    def append(self, row):
+        self.buffer.append(row)
+        self._digest.update(json.dumps(row, sort_keys=True).encode())
+        counts = self._counts[row['series_desc']]
+        counts['scan_count'] += 1
+        counts['series'].add(row['series_uid'] or row['series_number'])
+        counts['total_bytes'] += row['file_size'] or 0
+        modality = self._modalities[row['modality']]
+        modality['file_count'] += 1
+        modality['series'].add(row['series_uid'] or row['series_number'])
+        if len(self.buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        import pyarrow as pa
+
+        if self.buffer:
+            self.writer.write_table(pa.Table.from_pylist(self.buffer, schema=self.schema))
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    def digest(self):
+        return self._digest.hexdigest()
+
+    def scan_counts(self):
+        return [
+            {
+                'series_desc': desc,
+                'scan_count': counts['scan_count'],
+                'series_count': len(counts['series']),
+                'total_bytes': counts['total_bytes'],
+            }
+            for desc, counts in sorted(self._counts.items(), key=lambda kv: str(kv[0]))
+        ]
+
+    def modality_counts(self):
+        return [
+            {
+                'modality': modality,
+                'file_count': counts['file_count'],
+                'series_count': len(counts['series']),
+            }
+            for modality, counts in sorted(self._modalities.items(), key=lambda kv: str(kv[0]))
+        ]
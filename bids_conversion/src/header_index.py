@@ -0,0 +1,562 @@
+from pathlib import Path
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+import fnmatch
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from src.archive_source import MEMBER_SEPARATOR, is_archive, read_archive_headers
+
+# DICOM keyword -> index column for every tag the pipeline needs
+INDEX_TAGS = {
+    'PatientID': 'patient_id',
+    'StudyDate': 'study_date',
+    'SeriesDescription': 'series_description',
+    'SeriesNumber': 'series_number',
+    'SeriesInstanceUID': 'series_instance_uid',
+    'Modality': 'modality',
+    'SOPInstanceUID': 'sop_instance_uid',
+    'Rows': 'image_rows',
+    'Columns': 'image_columns',
+    'SliceThickness': 'slice_thickness',
+    'EchoTime': 'echo_time',
+    'RepetitionTime': 'repetition_time',
+}
+
+# Numeric index columns, stored as INTEGER/REAL; all others are TEXT
+COLUMN_TYPES = {
+    'series_number': int,
+    'image_rows': int,
+    'image_columns': int,
+    'slice_thickness': float,
+    'echo_time': float,
+    'repetition_time': float,
+}
+
+SQL_TYPES = {int: 'INTEGER', float: 'REAL'}
+
+
+def under_paths(paths):
+    """
+    SQL condition selecting index rows at or below relative paths
+
+    A path may be a folder, a file or an archive (whose members are stored
+    as 'archive!/member'). The condition compares ranges of the primary
+    key, so SQLite only visits the matching rows.
+
+    Returns:
+        tuple: (SQL text, parameters)
+    """
+    clauses, params = [], []
+    for path in paths:
+        path = str(path).strip('/')
+        if not path or path == '.':
+            return '1', []
+        clauses.append('(path = ? OR (path >= ? AND path < ?) OR (path >= ? AND path < ?))')
+        # '0' and '!0' sort right after the '/' and '!/' separators
+        params.extend([path, path + '/', path + '0', path + MEMBER_SEPARATOR, path + '!0'])
+    return f"({' OR '.join(clauses) or '0'})", params
+
+SCHEMA_VERSION = 3
+
+
+def to_column_value(column, value):
+    """Convert a header value to its index column's type, None if it does not parse"""
+    if value is None or value == '':
+        return None
+    convert = COLUMN_TYPES.get(column)
+    if convert is None:
+        return str(value)
+    try:
+        # IS values such as '12' and DS values such as '2.5' alike
+        return convert(float(value)) if convert is int else convert(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_header(path, tags=None):
+    """
+    Read only the indexed tags from a DICOM file
+
+    Args:
+        path (str): Path to the DICOM file, or a readable binary file object
+        tags (list): DICOM keywords to read, defaults to INDEX_TAGS
+
+    Returns:
+        dict: Index column -> value (None for missing tags), numeric columns
+            as int/float, or None if the file could not be parsed as DICOM
+    """
+    import pydicom
+
+    tags = list(tags or INDEX_TAGS)
+    try:
+        ds = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=tags)
+    except Exception:
+        return None
+
+    values = {}
+    for keyword in tags:
+        column = INDEX_TAGS.get(keyword, keyword)
+        values[column] = to_column_value(column, ds.get(keyword))
+    return values
+
+
+def _read_chunk(paths):
+    """Read a shard of headers and return them column-wise"""
+    columns = {col: [] for col in INDEX_TAGS.values()}
+    readable = []
+    for path in paths:
+        values = read_header(path)
+        readable.append(values is not None)
+        for col in columns:
+            columns[col].append(values.get(col) if values else None)
+    columns['readable'] = readable
+    return columns
+
+
+def _ordered_map(executor, fn, items, window):
+    # Like executor.map, but with at most window tasks submitted at a time
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def extract_headers(paths, max_workers=None, chunk_size=256):
+    """
+    Read headers for many files, sharded across a process pool
+    
+    Chunks are yielded in input order as soon as they are ready, so callers
+    can stream them into storage without holding the whole tree in memory.
+    At most two shards per worker are in flight at a time.
+    
+    Args:
+        paths (list): DICOM file paths
+        max_workers (int): Worker processes, defaults to the number of CPUs;
+            1 reads in-process
+        chunk_size (int): Files per shard
+    
+    Yields:
+        tuple: (chunk of paths, dict of column name -> list of values)
+    """
+    paths = [str(p) for p in paths]
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    max_workers = min(max_workers or os.cpu_count() or 1, max(len(chunks), 1))
+    
+    if max_workers <= 1:
+        for chunk in chunks:
+            yield chunk, _read_chunk(chunk)
+        return
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from zip(chunks, _ordered_map(executor, _read_chunk, chunks, 2 * max_workers))
+
+
+def _read_archive(task):
+    path, pattern = task
+    return read_archive_headers(path, pattern)
+
+
+def extract_archive_headers(paths, pattern='*.dcm', max_workers=None):
+    """
+    Read member headers of several archives, one archive per worker process
+
+    Yields:
+        list: (member name, size, header values or None) per archive, in
+            the order of paths
+    """
+    tasks = [(str(p), pattern) for p in paths]
+    max_workers = min(max_workers or os.cpu_count() or 1, max(len(tasks), 1))
+    if max_workers <= 1:
+        yield from map(_read_archive, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from _ordered_map(executor, _read_archive, tasks, 2 * max_workers)
+
+
+class DicomHeaderIndex:
+    """
+    Persistent index of DICOM headers for a directory tree
+
+    The tree is walked once and only the tags in INDEX_TAGS are read from each
+    file. Results are stored in a SQLite database together with each file's
+    size and mtime, so later refreshes only re-read new or modified files.
+
+    DICOM files inside .zip/.tar(.gz) archives in the tree are indexed too,
+    under virtual paths like 'study.zip!/sub-01/slice_0001.dcm'. Their
+    headers are read from memory without extracting the archive, and an
+    archive is only read again when its mtime changes.
+    """
+
+    FILENAME = '.dicom_header_index.sqlite'
+
+    def __init__(self, dicom_dir, index_path=None, pattern='*.dcm', archives=True):
+        """
+        Open (or create) the header index for a DICOM tree
+
+        Args:
+            dicom_dir (str): Root of the DICOM tree
+            index_path (str): Location of the SQLite index, defaults to a
+                hidden file inside dicom_dir
+            pattern (str): Filename pattern of DICOM files to index
+            archives (bool): Also index DICOM members of archives
+        """
+        self.dicom_dir = Path(dicom_dir)
+        self.index_path = Path(index_path) if index_path else self.dicom_dir / self.FILENAME
+        self.pattern = pattern
+        self.archives = archives
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.index_path), check_same_thread=False)
+        self._create_schema()
+
+    @property
+    def columns(self):
+        return ['path', 'size', 'mtime_ns'] + list(INDEX_TAGS.values())
+
+    def relative_path(self, path):
+        """Return a path below dicom_dir as stored in the index ('' for the root)"""
+        path = Path(path)
+        if path.is_absolute():
+            try:
+                path = path.relative_to(self.dicom_dir)
+            except ValueError:
+                path = path.resolve().relative_to(self.dicom_dir.resolve())
+        path = path.as_posix()
+        return '' if path == '.' else path
+
+    def _create_schema(self):
+        with self._lock, self.conn:
+            # Check and upgrade in one write transaction, so another process
+            # opening the same index cannot drop the table being created
+            self.conn.execute('BEGIN IMMEDIATE')
+            version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self.conn.execute('DROP TABLE IF EXISTS headers')
+            tag_columns = ', '.join(
+                f"{col} {SQL_TYPES.get(COLUMN_TYPES.get(col), 'TEXT')}"
+                for col in INDEX_TAGS.values()
+            )
+            self.conn.execute(
+                f'CREATE TABLE IF NOT EXISTS headers ('
+                f'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+                f'readable INTEGER, {tag_columns})'
+            )
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS headers_series ON headers (series_instance_uid)'
+            )
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS headers_instance ON headers (sop_instance_uid)'
+            )
+            self.conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _walk(self, paths=None):
+        # Yields (relative path, stat, is_archive) for DICOM files and archives
+        if paths is not None:
+            for path in paths:
+                full = self.dicom_dir / path
+                if full.is_file() and is_archive(full.name):
+                    yield Path(path).as_posix(), full.stat(), True
+                elif full.is_dir():
+                    for rel_path, stat, archive in self._walk_tree(full):
+                        yield rel_path, stat, archive
+            return
+        yield from self._walk_tree(self.dicom_dir)
+
+    def _walk_tree(self, top):
+        for root, dirs, files in os.walk(top):
+            dirs.sort()
+            for name in sorted(files):
+                archive = self.archives and is_archive(name)
+                if not archive and not fnmatch.fnmatch(name, self.pattern):
+                    continue
+                path = Path(root) / name
+                yield path.relative_to(self.dicom_dir).as_posix(), path.stat(), archive
+
+    def iter_files(self):
+        """Yield (relative path, stat) for every DICOM file in the tree"""
+        for rel_path, stat, archive in self._walk():
+            if not archive:
+                yield rel_path, stat
+
+    def refresh(self, max_workers=1, chunk_size=256, paths=None):
+        """
+        Bring the index up to date with the DICOM tree
+
+        Args:
+            max_workers (int): Worker processes for header extraction, None
+                for one per CPU
+            chunk_size (int): Files per worker shard and per database write
+            paths (list): Only walk these folders, files or archives
+                (relative to dicom_dir or absolute) instead of the whole tree
+
+        Returns:
+            dict: Number of files seen, (re)read and removed, and read rate
+        """
+        start = time.monotonic()
+        where, params = '', []
+        if paths is not None:
+            paths = [self.relative_path(path) for path in paths]
+            condition, params = under_paths(paths)
+            where = f' WHERE {condition}'
+        with self._lock:
+            known = {
+                path: (size, mtime_ns)
+                for path, size, mtime_ns in self.conn.execute(
+                    f'SELECT path, size, mtime_ns FROM headers{where}', params
+                )
+            }
+
+        # Archive members are stored with their archive's mtime
+        known_members = defaultdict(set)
+        archive_mtimes = {}
+        for path, (_, mtime_ns) in known.items():
+            archive, sep, _ = path.partition(MEMBER_SEPARATOR)
+            if sep:
+                known_members[archive].add(path)
+                archive_mtimes[archive] = mtime_ns
+
+        seen = set()
+        stale = []
+        stale_archives = []
+        for rel_path, stat, archive in self._walk(paths):
+            if archive:
+                if archive_mtimes.get(rel_path) == stat.st_mtime_ns:
+                    seen.update(known_members[rel_path])
+                else:
+                    stale_archives.append((rel_path, stat.st_mtime_ns))
+                continue
+            seen.add(rel_path)
+            if known.get(rel_path) != (stat.st_size, stat.st_mtime_ns):
+                stale.append((rel_path, stat.st_size, stat.st_mtime_ns))
+
+        # Members of changed archives are replaced once the archive is read
+        rereading = {rel_path for rel_path, _ in stale_archives}
+        removed = [
+            (path,) for path in known.keys() - seen
+            if path.partition(MEMBER_SEPARATOR)[0] not in rereading
+        ]
+        self._write([], removed)
+
+        read_start = time.monotonic()
+        offset = 0
+        chunks = extract_headers(
+            [self.dicom_dir / rel_path for rel_path, _, _ in stale],
+            max_workers=max_workers,
+            chunk_size=chunk_size
+        )
+        for chunk, columns in chunks:
+            self._write(self._rows(stale[offset:offset + len(chunk)], columns), [])
+            offset += len(chunk)
+
+        read = len(stale)
+        members = extract_archive_headers(
+            [self.dicom_dir / rel_path for rel_path, _ in stale_archives],
+            pattern=self.pattern, max_workers=max_workers
+        )
+        for (archive, mtime_ns), entries in zip(stale_archives, members):
+            rows = [
+                (f"{archive}{MEMBER_SEPARATOR}{name}", size, mtime_ns, int(values is not None))
+                + tuple((values or {}).get(col) for col in INDEX_TAGS.values())
+                for name, size, values in entries
+            ]
+            paths = {row[0] for row in rows}
+            gone = [(path,) for path in known_members[archive] - paths]
+            self._write(rows, gone)
+            seen.update(paths)
+            read += len(rows)
+            removed.extend(gone)
+        read_seconds = time.monotonic() - read_start
+
+        stats = {
+            'files': len(seen),
+            'read': read,
+            'removed': len(removed),
+            'seconds': time.monotonic() - start,
+            'files_per_second': read / read_seconds if read_seconds > 0 else 0.0
+        }
+        self.logger.info(
+            f"Indexed {self.dicom_dir}: {stats['files']} files, "
+            f"{stats['read']} read ({stats['files_per_second']:.0f} files/s), "
+            f"{stats['removed']} removed"
+        )
+        return stats
+
+    @staticmethod
+    def _rows(stale, columns):
+        tag_columns = [columns[col] for col in INDEX_TAGS.values()]
+        return [
+            (rel_path, size, mtime_ns, int(readable)) + tuple(values)
+            for (rel_path, size, mtime_ns), readable, *values in zip(
+                stale, columns['readable'], *tag_columns
+            )
+        ]
+
+    def _write(self, rows, removed):
+        placeholders = ', '.join('?' * (4 + len(INDEX_TAGS)))
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f'INSERT OR REPLACE INTO headers VALUES ({placeholders})', rows
+            )
+            self.conn.executemany('DELETE FROM headers WHERE path = ?', removed)
+
+    def records(self, path_prefix=None, **filters):
+        """
+        Return indexed headers as dicts
+
+        Args:
+            path_prefix (str): Only return files whose path relative to
+                dicom_dir starts with this prefix, e.g. 'sub-01/'
+            **filters: Column equality filters, e.g. patient_id='ID_TEST'
+
+        Returns:
+            list: One dict per readable DICOM file, with an absolute file_path
+        """
+        return list(self.iter_records(path_prefix, **filters))
+
+    def iter_records(self, path_prefix=None, order_by=('path',), chunk_size=10000, paths=None,
+                     **filters):
+        """
+        Stream indexed headers as dicts without loading the whole index
+
+        Args:
+            path_prefix (str): Only return files under this relative prefix
+            order_by (tuple): Columns to sort by
+            chunk_size (int): Rows fetched from SQLite per round trip
+            paths (list): Only return files at or below these relative paths
+            **filters: Column equality filters; None matches missing values
+
+        Yields:
+            dict: One record per readable DICOM file, as in records()
+        """
+        columns = self.columns
+        for key in list(filters) + list(order_by):
+            if key not in columns:
+                raise ValueError(f"Unknown index column: {key}")
+        clauses = ['readable = 1'] + [
+            f'{key} IS NULL' if value is None else f'{key} = ?' for key, value in filters.items()
+        ]
+        params = [value for value in filters.values() if value is not None]
+        if path_prefix:
+            clauses.append('substr(path, 1, ?) = ?')
+            params.extend([len(path_prefix), path_prefix])
+        if paths is not None:
+            condition, condition_params = under_paths(paths)
+            clauses.append(condition)
+            params.extend(condition_params)
+        query = (
+            f"SELECT {', '.join(columns)} FROM headers "
+            f"WHERE {' AND '.join(clauses)} ORDER BY {', '.join(order_by)}"
+        )
+
+        with self._lock:
+            cursor = self.conn.execute(query, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                record = dict(zip(columns, row))
+                record['file_path'] = str(self.dicom_dir / record.pop('path'))
+                yield record
+
+    def duplicate_instances(self, paths=None):
+        """
+        Stream the records of instances stored more than once
+
+        An instance is identified by its SOPInstanceUID within its
+        SeriesInstanceUID. All copies of an instance are yielded together,
+        ordered by path.
+
+        Args:
+            paths (list): Only check instances with a copy at or below these
+                paths relative to dicom_dir; their copies elsewhere are
+                still yielded
+
+        Yields:
+            dict: One record per copy, as in records()
+        """
+        columns = self.columns
+        restrict, params = '', []
+        if paths is not None:
+            condition, params = under_paths(paths)
+            restrict = (
+                "AND sop_instance_uid IN "
+                f"(SELECT sop_instance_uid FROM headers WHERE {condition}) "
+            )
+        query = (
+            f"SELECT {', '.join('h.' + col for col in columns)} FROM headers h JOIN ("
+            "SELECT sop_instance_uid, series_instance_uid FROM headers "
+            f"WHERE readable = 1 AND sop_instance_uid IS NOT NULL {restrict}"
+            "GROUP BY sop_instance_uid, series_instance_uid HAVING COUNT(*) > 1"
+            ") d ON h.sop_instance_uid = d.sop_instance_uid "
+            "AND h.series_instance_uid IS d.series_instance_uid "
+            "WHERE h.readable = 1 "
+            "ORDER BY h.sop_instance_uid, h.series_instance_uid, h.path"
+        )
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        for row in rows:
+            record = dict(zip(columns, row))
+            record['file_path'] = str(self.dicom_dir / record.pop('path'))
+            yield record
+
+    def to_dataframe(self, path_prefix=None, **filters):
+        """Return indexed headers as a pandas DataFrame"""
+        import pandas as pd
+
+        columns = ['file_path', 'size', 'mtime_ns'] + list(INDEX_TAGS.values())
+        return pd.DataFrame(self.records(path_prefix, **filters), columns=columns)
+
+    def distinct(self, column, path_prefix=None):
+        """Return the sorted distinct non-null values of an index column"""
+        if column not in self.columns:
+            raise ValueError(f"Unknown index column: {column}")
+        clauses = ['readable = 1', f'{column} IS NOT NULL']
+        params = []
+        if path_prefix:
+            clauses.append('substr(path, 1, ?) = ?')
+            params.extend([len(path_prefix), path_prefix])
+        with self._lock:
+            rows = self.conn.execute(
+                f'SELECT DISTINCT {column} FROM headers '
+                f'WHERE {" AND ".join(clauses)} ORDER BY {column}', params
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self, paths=None):
+        """Return the number of readable files at or below paths (all if None)"""
+        condition, params = under_paths(paths) if paths is not None else ('1', [])
+        with self._lock:
+            return self.conn.execute(
+                f'SELECT COUNT(*) FROM headers WHERE readable = 1 AND {condition}', params
+            ).fetchone()[0]
+
+    def series_descriptions(self):
+        return self.distinct('series_description')
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_index(dicom_dir, index_path=None, max_workers=1):
+    """Open the header index for dicom_dir and bring it up to date"""
+    index = DicomHeaderIndex(dicom_dir, index_path=index_path)
+    index.refresh(max_workers=max_workers)
+    return index
@@ -0,0 +1,161 @@
+from pathlib import Path
+from dataclasses import dataclass, asdict, field
+from typing import Optional
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# ru_maxrss is in kilobytes on Linux and bytes on macOS
+MAXRSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+
+# Prometheus metric name -> (SubjectMetrics field, help text)
+PROMETHEUS_METRICS = {
+    'bids_conversion_wall_seconds': ('wall_seconds', 'Wall time of the conversion'),
+    'bids_conversion_cpu_seconds': (
+        'cpu_seconds', 'CPU time of the converting thread (native backend)'),
+    'bids_conversion_child_cpu_seconds': (
+        'child_cpu_seconds', 'User+system CPU time of child processes (dcm2bids/dcm2niix)'),
+    'bids_conversion_child_max_rss_bytes': (
+        'child_max_rss_bytes', 'Peak resident set size of the child processes'),
+    'bids_conversion_bytes_read': ('bytes_read', 'Bytes of raw DICOM input'),
+    'bids_conversion_bytes_written': ('bytes_written', 'Bytes added to the BIDS output'),
+    'bids_conversion_series': ('series_count', 'Series converted (JSON sidecars written)'),
+    'bids_conversion_nifti_files': ('nifti_count', 'NIfTI files produced'),
+    'bids_conversion_success': ('success', '1 if the conversion succeeded'),
+}
+
+
+@dataclass
+class SubjectMetrics:
+    """Resource usage and output of converting one subject/session"""
+    subject_id: str
+    session: Optional[str] = None
+    backend: str = 'dcm2bids'
+    success: bool = False
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    child_cpu_seconds: float = 0.0
+    child_max_rss_bytes: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    series_count: int = 0
+    nifti_count: int = 0
+    _start: dict = field(default_factory=dict, repr=False)
+
+    def as_dict(self):
+        return {k: v for k, v in asdict(self).items() if not k.startswith('_')}
+
+
+def tree_stats(path):
+    """Return (bytes, NIfTI files, JSON sidecars) below path"""
+    total = nifti = sidecars = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                continue
+            if name.endswith(('.nii', '.nii.gz')):
+                nifti += 1
+            elif name.endswith('.json'):
+                sidecars += 1
+    return total, nifti, sidecars
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRecorder:
+    """
+    Measure per-subject conversions and publish them
+
+    Every finished measurement is logged as one JSON line on the
+    'src.instrumentation' logger and, if prometheus_path is set, the latest
+    value per subject/session is written to a Prometheus text-format file
+    (suitable for the node_exporter textfile collector).
+
+    Child CPU time and max RSS are those of the subject's own dcm2bids
+    process and its descendants, as reaped by src.process.run_command, so
+    concurrent conversions do not see each other's children.
+    """
+
+    def __init__(self, prometheus_path=None):
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self.logger = logging.getLogger(__name__)
+        self.latest = {}
+        self._lock = threading.Lock()
+
+    def start(self, subject_id, session=None, backend='dcm2bids', output_dir=None):
+        """Begin measuring a conversion"""
+        metrics = SubjectMetrics(subject_id=subject_id, session=session, backend=backend)
+        metrics._start = {
+            'wall': time.perf_counter(),
+            'cpu': time.thread_time(),
+            'output_dir': output_dir,
+            'output_bytes': tree_stats(output_dir)[0] if output_dir else 0,
+        }
+        return metrics
+
+    def finish(self, metrics, success, bytes_read=0, output_dir=None, child_usage=None):
+        """
+        Complete a measurement, log it and update the metrics file
+
+        Args:
+            metrics (SubjectMetrics): Measurement returned by start()
+            success (bool): Whether the conversion succeeded
+            bytes_read (int): Bytes of input read
+            output_dir (str): Folder holding the outputs, if it was not
+                known (or differs from the one given) at start()
+            child_usage (resource.struct_rusage): Usage of the conversion's
+                child process, e.g. CompletedProcess.rusage from run_command
+        """
+        start = metrics._start
+        if output_dir is not None and output_dir != start['output_dir']:
+            start['output_dir'], start['output_bytes'] = output_dir, 0
+        metrics.success = success
+        metrics.wall_seconds = time.perf_counter() - start['wall']
+        metrics.cpu_seconds = time.thread_time() - start['cpu']
+        if child_usage is not None:
+            metrics.child_cpu_seconds = float(child_usage.ru_utime) + float(child_usage.ru_stime)
+            metrics.child_max_rss_bytes = int(child_usage.ru_maxrss) * MAXRSS_SCALE
+        metrics.bytes_read = bytes_read
+        if start['output_dir']:
+            written, nifti, sidecars = tree_stats(start['output_dir'])
+            metrics.bytes_written = max(written - start['output_bytes'], 0)
+            metrics.nifti_count = nifti
+            metrics.series_count = sidecars
+
+        self.logger.info(json.dumps(dict(event='subject_converted', **metrics.as_dict())))
+        with self._lock:
+            self.latest[(metrics.subject_id, metrics.session)] = metrics
+            if self.prometheus_path:
+                self.write_prometheus(self.prometheus_path)
+        return metrics
+
+    def render_prometheus(self):
+        """Render the latest metrics per subject/session in Prometheus text format"""
+        lines = []
+        for name, (attr, help_text) in PROMETHEUS_METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for (subject_id, session), metrics in sorted(
+                    self.latest.items(), key=lambda kv: (kv[0][0], kv[0][1] or '')):
+                labels = (
+                    f'subject="{escape_label(subject_id)}",'
+                    f'session="{escape_label(session or "")}",'
+                    f'backend="{escape_label(metrics.backend)}"'
+                )
+                lines.append(f"{name}{{{labels}}} {float(getattr(metrics, attr))}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        # Write then rename so scrapers never see a partial file
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(self.render_prometheus())
+        os.replace(tmp_path, path)
@@ -0,0 +1,134 @@
+from pathlib import Path
+import datetime
+import json
+import logging
+import os
+import subprocess
+import threading
+import uuid
+
+JOURNAL_STATES = ('pending', 'running', 'done', 'failed')
+
+
+def is_transient(error):
+    """
+    Decide whether a conversion error is worth retrying
+
+    Timeouts, children killed by a signal (e.g. the OOM killer) and I/O
+    errors on shared storage may succeed on a second try; a non-zero exit
+    or a missing executable will not.
+    """
+    if isinstance(error, subprocess.TimeoutExpired):
+        return True
+    if isinstance(error, subprocess.CalledProcessError):
+        return error.returncode < 0
+    if isinstance(error, (FileNotFoundError, PermissionError)):
+        return False
+    return isinstance(error, OSError)
+
+
+class RunJournal:
+    """
+    Durable per-subject state of batch conversions
+
+    Every state change is appended as one JSON line and fsynced, so after a
+    crash the journal still tells which subjects finished. The latest entry
+    per subject/session wins; a torn final line is ignored. A run that
+    returns normally clears its done entries with finish_run(), so only an
+    interrupted run leaves them behind for the next one to resume.
+    """
+
+    FILENAME = '.conversion_journal.jsonl'
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Journal file, created on first write
+        """
+        self.path = Path(path)
+        self.logger = logging.getLogger(__name__)
+        self.run_id = None
+        self.states = {}
+        self._lock = threading.Lock()
+        self._lines = 0
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    self.logger.warning(f"Ignoring corrupt journal line in {self.path}")
+                    continue
+                self.states[entry['key']] = entry
+                self._lines += 1
+
+    def start_run(self, keys):
+        """Begin a new run and mark its subjects that are not done as pending"""
+        self.run_id = uuid.uuid4().hex[:12]
+        # Keep the journal from growing without bound over many runs
+        if self._lines > 4 * max(len(self.states), 1) + 100:
+            self.compact()
+        for key in keys:
+            if self.state(key) != 'done':
+                self.record(key, 'pending')
+        return self.run_id
+
+    def finish_run(self, keys):
+        """End the current run, forgetting which of its subjects are done"""
+        with self._lock:
+            for key in keys:
+                entry = self.states.get(key)
+                if entry and entry['state'] == 'done':
+                    del self.states[key]
+        if self.path.exists():
+            self.compact()
+        self.run_id = None
+
+    def record(self, key, state, **info):
+        """Append a state change for key"""
+        if state not in JOURNAL_STATES:
+            raise ValueError(f"Unknown journal state: {state}")
+        entry = dict(
+            info, key=key, state=state, run_id=self.run_id,
+            at=datetime.datetime.now().isoformat(timespec='seconds')
+        )
+        line = json.dumps(entry, sort_keys=True) + '\n'
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.states[key] = entry
+            self._lines += 1
+        return entry
+
+    def state(self, key):
+        entry = self.states.get(key)
+        return entry['state'] if entry else None
+
+    def completed(self):
+        """Keys whose latest state is done"""
+        return {key for key, entry in self.states.items() if entry['state'] == 'done'}
+
+    def counts(self):
+        counts = dict.fromkeys(JOURNAL_STATES, 0)
+        for entry in self.states.values():
+            counts[entry['state']] += 1
+        return counts
+
+    def compact(self):
+        """Rewrite the journal keeping only the latest entry per key"""
+        with self._lock:
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                for entry in self.states.values():
+                    f.write(json.dumps(entry, sort_keys=True) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._lines = len(self.states)
@@ -0,0 +1,153 @@
+from pathlib import Path
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from src.archive_source import source_stat
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+
+class ConversionManifest:
+    """
+    Persistent record of the inputs behind every successful conversion
+
+    The manifest lives as a JSON file in the BIDS output directory and is keyed
+    by subject/session. Each entry stores a fingerprint of the raw DICOM files
+    (count, total size and a digest over their paths, sizes and mtimes) plus a
+    hash of the dcm2bids configuration, so unchanged work can be skipped.
+    """
+
+    FILENAME = '.conversion_manifest.json'
+
+    def __init__(self, path):
+        """
+        Load (or start) a manifest
+
+        Args:
+            path (str): Path to the manifest JSON file
+        """
+        self.path = Path(path)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f).get('entries', {})
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable manifest {self.path}: {str(e)}")
+            return {}
+
+    @contextmanager
+    def _file_lock(self):
+        # Other processes (e.g. queue workers on other nodes) may share this
+        # manifest, so updates re-read it under an exclusive lock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(self.path.name + '.lock'), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def key(subject_id, session=None):
+        return f"{subject_id}/{session}" if session else subject_id
+
+    @staticmethod
+    def hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @classmethod
+    def fingerprint(cls, source_dir, config_path, files=None):
+        """
+        Fingerprint the raw inputs of a conversion
+
+        Args:
+            source_dir (str): Directory holding the subject's DICOM files
+            config_path (str): Path to the dcm2bids configuration file
+            files (list): Only fingerprint these files (paths in source_dir,
+                or virtual archive member paths)
+
+        Returns:
+            dict: Config hash plus file count, total bytes and files digest
+        """
+        source_dir = Path(source_dir)
+        digest = hashlib.sha256()
+        file_count = 0
+        total_bytes = 0
+
+        for path in cls._source_files(source_dir, files):
+            size, mtime_ns = source_stat(path)
+            rel = path.relative_to(source_dir).as_posix()
+            digest.update(f"{rel}\0{size}\0{mtime_ns}\n".encode())
+            file_count += 1
+            total_bytes += size
+
+        return {
+            'config_hash': cls.hash_file(config_path),
+            'file_count': file_count,
+            'total_bytes': total_bytes,
+            'files_digest': digest.hexdigest()
+        }
+
+    @staticmethod
+    def _source_files(source_dir, files=None):
+        if files is not None:
+            yield from sorted(Path(f) for f in files)
+            return
+        for root, dirs, names in os.walk(source_dir):
+            # Hidden files hold pipeline state (e.g. the header index), not data
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(names):
+                if not name.startswith('.'):
+                    yield Path(root) / name
+
+    def is_current(self, key, fingerprint):
+        """Check whether the recorded inputs for key match fingerprint"""
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return False
+        return all(entry.get(k) == v for k, v in fingerprint.items())
+
+    def record(self, key, fingerprint):
+        """Record a successful conversion and persist the manifest"""
+        with self._lock, self._file_lock():
+            self.entries = self._load()
+            self.entries[key] = dict(
+                fingerprint,
+                converted_at=datetime.datetime.now().isoformat(timespec='seconds')
+            )
+            self._save()
+
+    def invalidate(self, key):
+        """Forget a conversion so the next run redoes it"""
+        with self._lock, self._file_lock():
+            self.entries = self._load()
+            if self.entries.pop(key, None) is not None:
+                self._save()
+
+    def _save(self):
+        # Write to a sibling file and rename so a crash never truncates the manifest
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'entries': self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,125 @@
+from pathlib import Path
+import fnmatch
+import json
+import logging
+import re
+import threading
+
+# searchMethod values of dcm2bids, plus 'search' for unanchored re.search
+SEARCH_METHODS = ('fnmatch', 're', 'search')
+
+# Leading global inline flags such as "(?i)", which cannot be embedded mid-pattern
+GLOBAL_FLAGS = re.compile(r'^\(\?([aiLmsux]+)\)')
+
+
+def scoped_pattern(pattern):
+    """Rewrite "(?i)body" as "(?i:body)" so it can be embedded in an alternation"""
+    m = GLOBAL_FLAGS.match(pattern)
+    if not m:
+        return f'(?:{pattern})'
+    return f'(?{m.group(1)}:{pattern[m.end():]})'
+
+
+class SeriesMatcher:
+    """
+    Match SeriesDescriptions against the descriptions of a dcm2bids config
+
+    Patterns are applied the way dcm2bids applies them: with re.match,
+    anchored at the start, when the config's searchMethod is "re", and as
+    shell-style wildcards (fnmatch) otherwise. Every criteria pattern is
+    compiled once, wildcards through fnmatch.translate. All patterns are also combined
+    into a single alternation used as a prefilter, so series that match no
+    description are rejected in one pass, and results are memoized per
+    distinct SeriesDescription.
+    """
+
+    def __init__(self, config, search_method=None):
+        """
+        Build the matcher from a parsed dcm2bids configuration
+
+        Args:
+            config (dict): Configuration with a 'descriptions' list
+            search_method (str): Override the config's searchMethod; 'search'
+                finds regular expressions anywhere in the description
+        """
+        self.logger = logging.getLogger(__name__)
+        self.search_method = search_method or config.get('searchMethod') or 'fnmatch'
+        if self.search_method not in SEARCH_METHODS:
+            raise ValueError(f"Unknown searchMethod: {self.search_method}")
+        self.descriptions = []
+        for idx, desc in enumerate(config.get('descriptions', [])):
+            pattern = desc.get('criteria', {}).get('SeriesDescription')
+            if pattern is None:
+                continue
+            self.descriptions.append({
+                'index': idx,
+                'pattern': pattern,
+                'regex': re.compile(self._regex(pattern)),
+                'modality': desc.get('modalityLabel'),
+                'dataType': desc.get('dataType')
+            })
+
+        self.prefilter = self._build_prefilter()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config_file(cls, config_path, search_method=None):
+        with open(Path(config_path)) as f:
+            return cls(json.load(f), search_method=search_method)
+
+    def _regex(self, pattern):
+        if self.search_method == 'fnmatch':
+            return fnmatch.translate(pattern)
+        return pattern
+
+    def _find(self, regex, text):
+        if self.search_method == 'search':
+            return regex.search(text)
+        return regex.match(text)
+
+    def _build_prefilter(self):
+        if not self.descriptions:
+            return None
+        # Combining shifts capture group numbers, which breaks backreferences
+        if any(re.search(r'\\[1-9]|\(\?P=', d['regex'].pattern) for d in self.descriptions):
+            return None
+        try:
+            return re.compile(
+                '|'.join(scoped_pattern(d['regex'].pattern) for d in self.descriptions)
+            )
+        except re.error as e:
+            self.logger.debug(f"Falling back to per-pattern matching: {str(e)}")
+            return None
+
+    def match(self, series_description):
+        """
+        Find every config description matching a SeriesDescription
+
+        Args:
+            series_description (str): SeriesDescription of a DICOM series
+
+        Returns:
+            list: Dicts with the 'pattern', 'modality' and 'dataType' of
+                each matching description, in config order
+        """
+        with self._lock:
+            cached = self._cache.get(series_description)
+        if cached is None:
+            cached = self._match_uncached(series_description)
+            with self._lock:
+                self._cache[series_description] = cached
+        return [dict(m) for m in cached]
+
+    def _match_uncached(self, series_description):
+        if self.prefilter is not None and not self._find(self.prefilter, series_description):
+            return ()
+        return tuple(
+            {'pattern': d['pattern'], 'modality': d['modality'], 'dataType': d['dataType']}
+            for d in self.descriptions
+            if self._find(d['regex'], series_description)
+        )
+
+    def match_many(self, series_descriptions):
+        """Return a mapping of each distinct SeriesDescription to its matches"""
+        return {desc: self.match(desc) for desc in dict.fromkeys(series_descriptions)}
@@ -0,0 +1,319 @@
+from pathlib import Path
+from collections import defaultdict
+import gzip
+import json
+import logging
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from src.archive_source import is_member_path, materialize
+from src.decoders import FrameDecoder
+from src.header_index import open_index
+from src.matcher import SeriesMatcher
+from src.volume import LazyVolume, read_pixel_layout, slice_position
+
+# NIfTI-1 datatype codes for the pixel types DICOM produces
+NIFTI_DATATYPES = {
+    np.dtype(np.uint8): 2,
+    np.dtype(np.int16): 4,
+    np.dtype(np.int32): 8,
+    np.dtype(np.float32): 16,
+    np.dtype(np.float64): 64,
+    np.dtype(np.int8): 256,
+    np.dtype(np.uint16): 512,
+    np.dtype(np.uint32): 768,
+}
+
+NIFTI_HEADER = np.dtype([
+    ('sizeof_hdr', '<i4'), ('data_type', 'S10'), ('db_name', 'S18'),
+    ('extents', '<i4'), ('session_error', '<i2'), ('regular', 'S1'),
+    ('dim_info', 'u1'), ('dim', '<i2', (8,)), ('intent_p1', '<f4'),
+    ('intent_p2', '<f4'), ('intent_p3', '<f4'), ('intent_code', '<i2'),
+    ('datatype', '<i2'), ('bitpix', '<i2'), ('slice_start', '<i2'),
+    ('pixdim', '<f4', (8,)), ('vox_offset', '<f4'), ('scl_slope', '<f4'),
+    ('scl_inter', '<f4'), ('slice_end', '<i2'), ('slice_code', 'u1'),
+    ('xyzt_units', 'u1'), ('cal_max', '<f4'), ('cal_min', '<f4'),
+    ('slice_duration', '<f4'), ('toffset', '<f4'), ('glmax', '<i4'),
+    ('glmin', '<i4'), ('descrip', 'S80'), ('aux_file', 'S24'),
+    ('qform_code', '<i2'), ('sform_code', '<i2'), ('quatern_b', '<f4'),
+    ('quatern_c', '<f4'), ('quatern_d', '<f4'), ('qoffset_x', '<f4'),
+    ('qoffset_y', '<f4'), ('qoffset_z', '<f4'), ('srow_x', '<f4', (4,)),
+    ('srow_y', '<f4', (4,)), ('srow_z', '<f4', (4,)), ('intent_name', 'S16'),
+    ('magic', 'S4'),
+])
+
+# Acquisition parameters copied into the JSON sidecar when present
+SIDECAR_TAGS = [
+    'Modality', 'Manufacturer', 'ManufacturersModelName', 'MagneticFieldStrength',
+    'SeriesDescription', 'ProtocolName', 'SeriesNumber', 'SeriesInstanceUID',
+    'StudyDate', 'SliceThickness', 'RepetitionTime', 'EchoTime', 'FlipAngle',
+]
+
+# Numeric sidecar fields and their scale; BIDS times are in seconds, DICOM's in ms
+NUMERIC_SIDECAR_TAGS = {
+    'MagneticFieldStrength': 1.0,
+    'SeriesNumber': 1.0,
+    'SliceThickness': 1.0,
+    'RepetitionTime': 0.001,
+    'EchoTime': 0.001,
+    'FlipAngle': 1.0,
+}
+
+
+def write_nifti(path, volume, affine, slope=1.0, inter=0.0, description=''):
+    """
+    Write a volume as a (optionally gzipped) single-file NIfTI-1 image
+
+    Args:
+        path (Path): Output path ending in .nii or .nii.gz
+        volume (ndarray): Array indexed as (i, j, k)
+        affine (ndarray): 4x4 voxel-to-RAS+ affine
+        slope (float): Scaling slope to store in the header
+        inter (float): Scaling intercept to store in the header
+        description (str): Free text stored in the header
+    """
+    volume = np.asarray(volume)
+    if volume.dtype not in NIFTI_DATATYPES:
+        volume = volume.astype(np.float32)
+    volume = volume.astype(volume.dtype.newbyteorder('<'), copy=False)
+
+    hdr = np.zeros((), dtype=NIFTI_HEADER)
+    hdr['sizeof_hdr'] = 348
+    hdr['dim'][0] = volume.ndim
+    hdr['dim'][1:1 + volume.ndim] = volume.shape
+    hdr['dim'][1 + volume.ndim:] = 1
+    hdr['datatype'] = NIFTI_DATATYPES[np.dtype(volume.dtype.newbyteorder('='))]
+    hdr['bitpix'] = volume.dtype.itemsize * 8
+    hdr['pixdim'][0] = 1.0
+    hdr['pixdim'][1:4] = np.sqrt((np.asarray(affine)[:3, :3] ** 2).sum(axis=0))
+    hdr['pixdim'][4:] = 1.0
+    hdr['vox_offset'] = 352
+    hdr['scl_slope'] = slope
+    hdr['scl_inter'] = inter
+    hdr['xyzt_units'] = 2  # millimetres
+    hdr['descrip'] = description.encode('ascii', 'replace')[:79]
+    hdr['sform_code'] = 1  # scanner anatomical coordinates
+    hdr['srow_x'], hdr['srow_y'], hdr['srow_z'] = np.asarray(affine, dtype=np.float32)[:3]
+    hdr['magic'] = b'n+1'
+
+    payload = hdr.tobytes() + b'\0' * 4 + volume.tobytes(order='F')
+    path = Path(path)
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'wb') as f:
+        f.write(payload)
+
+
+def slice_sort_key(ds):
+    position = slice_position(ds)
+    return (
+        position if position is not None else 0.0,
+        int(ds.get('InstanceNumber') or 0),
+        str(ds.filename)
+    )
+
+
+def volume_affine(slices):
+    """Build the voxel-to-RAS+ affine of a sorted list of slices"""
+    first = slices[0]
+    spacing = [float(v) for v in first.get('PixelSpacing') or (1.0, 1.0)]
+    thickness = float(first.get('SliceThickness') or 1.0)
+    orientation = first.get('ImageOrientationPatient')
+    position = first.get('ImagePositionPatient')
+
+    affine = np.eye(4)
+    if orientation is None or position is None:
+        affine[:3, :3] = np.diag([spacing[1], spacing[0], thickness])
+        return affine
+
+    row = np.asarray(orientation[:3], float)
+    col = np.asarray(orientation[3:], float)
+    origin = np.asarray(position, float)
+    if len(slices) > 1 and slices[-1].get('ImagePositionPatient') is not None:
+        step = (np.asarray(slices[-1].ImagePositionPatient, float) - origin) / (len(slices) - 1)
+    else:
+        step = np.cross(row, col) * thickness
+
+    # DICOM patient space is LPS; NIfTI expects RAS
+    lps = np.eye(4)
+    lps[:3, 0] = row * spacing[1]
+    lps[:3, 1] = col * spacing[0]
+    lps[:3, 2] = step
+    lps[:3, 3] = origin
+    return np.diag([-1.0, -1.0, 1.0, 1.0]) @ lps
+
+
+def bids_basename(subject_label, session_label, modality_label, run=None):
+    """Compose a BIDS filename stem, inserting run-XX before the suffix"""
+    parts = [subject_label] + ([session_label] if session_label else [])
+    entities, _, suffix = modality_label.rpartition('_')
+    if entities:
+        parts.append(entities)
+    if run is not None:
+        parts.append(f'run-{run:02d}')
+    parts.append(suffix)
+    return '_'.join(parts)
+
+
+class NativeBackend:
+    """
+    In-process DICOM to BIDS conversion
+
+    Series are found through the header index, matched against the dcm2bids
+    configuration with SeriesMatcher, stacked into NumPy volumes ordered by
+    ImagePositionPatient and written as NIfTI-1 plus JSON sidecars. Series
+    matching zero or several descriptions are skipped, like dcm2bids does.
+    """
+
+    def __init__(self, config_path, dicom_dir, output_dir, index=None, decoder=None):
+        self.config_path = Path(config_path)
+        self.dicom_dir = Path(dicom_dir)
+        self.output_dir = Path(output_dir)
+        self.index = index
+        # Decodes compressed (JPEG, JPEG-LS, JPEG 2000, RLE) series
+        self.decoder = decoder or FrameDecoder()
+        self.matcher = SeriesMatcher.from_config_file(self.config_path)
+        self.logger = logging.getLogger(__name__)
+        self._index_lock = threading.Lock()
+
+    def _records(self, source_dir, files=None):
+        with self._index_lock:
+            if self.index is None:
+                self.index = open_index(self.dicom_dir)
+        prefix = Path(source_dir).resolve().relative_to(self.dicom_dir.resolve()).as_posix()
+        records = self.index.records(path_prefix='' if prefix == '.' else prefix + '/')
+        if files is not None:
+            wanted = {str(Path(f).resolve()) for f in files}
+            records = [r for r in records if str(Path(r['file_path']).resolve()) in wanted]
+        return records
+
+    def group_series(self, records):
+        """Group index records into series, keyed by SeriesInstanceUID"""
+        series = defaultdict(list)
+        for record in records:
+            # Fall back to the folder when the UID is missing
+            key = record['series_instance_uid'] or (
+                str(Path(record['file_path']).parent),
+                record['series_number'],
+                record['series_description']
+            )
+            series[key].append(record)
+        return list(series.values())
+
+    def convert(self, subject_id, session=None, source_dir=None, files=None, output_dir=None):
+        """
+        Convert one subject/session
+
+        Args:
+            subject_id (str): Participant label, with or without 'sub-'
+            session (str): Session label, with or without 'ses-'
+            source_dir (str): Directory holding the subject's DICOMs,
+                defaults to dicom_dir
+            files (list): Only convert these files from source_dir
+            output_dir (str): BIDS root to write to, defaults to output_dir
+
+        Returns:
+            list: Paths of the NIfTI files written
+        """
+        subject_label = subject_id if subject_id.startswith('sub-') else f'sub-{subject_id}'
+        session_label = None
+        if session:
+            session_label = session if session.startswith('ses-') else f'ses-{session}'
+        subject_out = Path(output_dir or self.output_dir) / subject_label
+        if session_label:
+            subject_out = subject_out / session_label
+
+        planned = []
+        for records in self.group_series(self._records(source_dir or self.dicom_dir, files)):
+            desc = records[0]['series_description'] or ''
+            matches = self.matcher.match(desc)
+            if len(matches) != 1:
+                reason = 'no' if not matches else 'several'
+                self.logger.warning(f"Skipping series '{desc}': matches {reason} descriptions")
+                continue
+            planned.append((matches[0], records))
+
+        # Labels produced more than once get run-XX entities, as in dcm2bids
+        label_counts = defaultdict(int)
+        for match, _ in planned:
+            label_counts[(match['dataType'], match['modality'])] += 1
+        runs = defaultdict(int)
+
+        # Extract only the archive members of the series being converted
+        members = [r['file_path'] for _, records in planned for r in records
+                   if is_member_path(r['file_path'])]
+        scratch = None
+        if members:
+            scratch = tempfile.mkdtemp(prefix='native_members_')
+            local = dict(zip(members, materialize(members, scratch)))
+            for _, records in planned:
+                for record in records:
+                    record['file_path'] = str(local.get(record['file_path'], record['file_path']))
+
+        try:
+            written = []
+            planned.sort(key=lambda p: int(p[1][0]['series_number'] or 0))
+            for match, records in planned:
+                key = (match['dataType'], match['modality'])
+                run = None
+                if label_counts[key] > 1:
+                    runs[key] += 1
+                    run = runs[key]
+
+                headers = sorted(
+                    (read_pixel_layout(r['file_path']) for r in records),
+                    key=lambda header: slice_sort_key(header[0])
+                )
+                slices = [ds for ds, _ in headers]
+                layouts = [layout for _, layout in headers]
+                if all(layouts):
+                    # Uncompressed: copy straight from memory-mapped PixelData
+                    # instead of decoding every file with pydicom
+                    volume = LazyVolume(layouts).to_array().transpose(2, 1, 0)
+                else:
+                    pixels = self.decoder.decode_files([ds.filename for ds in slices])
+                    if len(pixels) == 1 and pixels[0].ndim == 3:
+                        # Multi-frame object: (frames, rows, cols) -> (cols, rows, frames)
+                        volume = pixels[0].transpose(2, 1, 0)
+                    else:
+                        volume = np.stack([p.T for p in pixels], axis=-1)
+
+                out_dir = subject_out / match['dataType']
+                out_dir.mkdir(parents=True, exist_ok=True)
+                stem = bids_basename(subject_label, session_label, match['modality'], run)
+                nifti_path = out_dir / f'{stem}.nii.gz'
+                write_nifti(
+                    nifti_path, volume, volume_affine(slices),
+                    slope=float(slices[0].get('RescaleSlope') or 1.0),
+                    inter=float(slices[0].get('RescaleIntercept') or 0.0),
+                    description=str(slices[0].get('SeriesDescription') or '')
+                )
+                with open(out_dir / f'{stem}.json', 'w') as f:
+                    json.dump(self.sidecar(slices[0]), f, indent=2)
+                written.append(nifti_path)
+        finally:
+            if scratch is not None:
+                shutil.rmtree(scratch, ignore_errors=True)
+
+        self.logger.info(f"Native backend wrote {len(written)} image(s) for {subject_label}")
+        return written
+
+    @staticmethod
+    def sidecar(ds):
+        """Build the BIDS JSON sidecar for a series from its first slice"""
+        sidecar = {}
+        for keyword in SIDECAR_TAGS:
+            value = ds.get(keyword)
+            if value is None or value == '':
+                continue
+            if keyword in NUMERIC_SIDECAR_TAGS:
+                value = float(value) * NUMERIC_SIDECAR_TAGS[keyword]
+                if keyword == 'SeriesNumber':
+                    value = int(value)
+            else:
+                value = str(value)
+            sidecar[keyword] = value
+        sidecar['ConversionSoftware'] = 'bids_conversion native backend'
+        return sidecar
@@ -0,0 +1,181 @@
+from collections import deque
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+# Lines of child output kept for error reports
+DEFAULT_TAIL_LINES = 200
+# Longer lines are split so a child writing without newlines cannot grow memory
+MAX_LINE_LENGTH = 8192
+# Seconds a timed-out child gets to exit after SIGTERM before SIGKILL
+KILL_GRACE = 5.0
+# Seconds to wait for the output pipe to close once the child has exited
+DRAIN_TIMEOUT = 2.0
+
+
+def reap(proc, timeout=None):
+    """
+    Wait for a child to exit and return its own resource usage
+
+    Where os.wait4 exists the child is reaped with it, so the returned
+    rusage covers exactly this child and the descendants it waited for
+    (e.g. dcm2niix under dcm2bids), unlike process-wide RUSAGE_CHILDREN.
+    On Linux its ru_maxrss also counts the memory the child shared with
+    this process before exec.
+
+    Args:
+        proc (Popen): Child process
+        timeout (float): Seconds to wait, None for no limit
+
+    Returns:
+        resource.struct_rusage: Usage of the child, None if unavailable
+            (no os.wait4, or the child was already reaped)
+
+    Raises:
+        subprocess.TimeoutExpired: The child is still running at the timeout
+    """
+    if not hasattr(os, 'wait4') or proc.returncode is not None:
+        proc.wait(timeout=timeout)
+        return None
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    delay = 0.0005
+    while True:
+        try:
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        except ChildProcessError:
+            # Reaped elsewhere (e.g. by Popen.poll on another thread)
+            proc.wait()
+            return None
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return usage
+        if deadline is not None and time.monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        # Same backoff as Popen.wait(timeout=...)
+        delay = min(delay * 2, 0.05)
+        if deadline is not None:
+            delay = max(min(delay, deadline - time.monotonic()), 0)
+        time.sleep(delay)
+
+
+def terminate(proc, grace=KILL_GRACE):
+    """
+    Stop a child and everything it spawned (e.g. dcm2niix under dcm2bids)
+
+    Returns:
+        resource.struct_rusage: Usage of the child as returned by reap()
+    """
+    if proc.returncode is not None:
+        return None
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+            return reap(proc, timeout=grace)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        proc.kill()
+    return reap(proc)
+
+
+def finish_output(reader, proc, logger, name, timeout=DRAIN_TIMEOUT):
+    """
+    Wait for the output reader of an exited child, without hanging forever
+
+    A grandchild that inherited the pipe (e.g. something left running in
+    the background) keeps it open after the child exits. Whatever is left
+    of the process group is then stopped; if the pipe still does not
+    close, the daemon reader thread is abandoned.
+    """
+    reader.join(timeout)
+    if not reader.is_alive():
+        return
+    logger.warning(f"[{name}] output still open after exit, stopping leftover processes")
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    reader.join(timeout)
+    if reader.is_alive():
+        logger.warning(f"[{name}] abandoning output reader")
+
+
+def run_command(cmd, logger=None, timeout=None, env=None, name=None,
+                tail_lines=DEFAULT_TAIL_LINES, level=logging.INFO):
+    """
+    Run a command, streaming its output line by line into a logger
+
+    stdout and stderr are merged and read on a background thread, so the
+    child never blocks on a full pipe. Only the last tail_lines lines are
+    kept; they are attached to the exception if the command fails. The
+    child's own resource usage (see reap()) is set as .rusage on the
+    result or the exception.
+
+    Args:
+        cmd (list): Command and arguments
+        logger (Logger): Receives every output line, defaults to this module's
+        timeout (float): Seconds before the child (and its process group) is
+            killed, None for no limit
+        env (dict): Environment for the child
+        name (str): Prefix for logged lines, defaults to the executable name
+        tail_lines (int): Output lines kept for the error report
+        level (int): Log level of the streamed lines
+
+    Returns:
+        CompletedProcess: Return code and the output tail as stdout
+
+    Raises:
+        subprocess.TimeoutExpired: The command ran longer than timeout
+        subprocess.CalledProcessError: The command exited non-zero
+    """
+    logger = logger or logging.getLogger(__name__)
+    name = name or os.path.basename(str(cmd[0]))
+    tail = deque(maxlen=tail_lines)
+
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+        env=env, text=True, errors='replace',
+        # Own process group, so a timeout also reaches grandchildren
+        start_new_session=hasattr(os, 'killpg')
+    )
+
+    def pump():
+        with proc.stdout:
+            while True:
+                line = proc.stdout.readline(MAX_LINE_LENGTH)
+                if not line:
+                    break
+                line = line.rstrip('\r\n')
+                tail.append(line)
+                logger.log(level, f"[{name}] {line}")
+
+    reader = threading.Thread(target=pump, name=f'{name}-output', daemon=True)
+    reader.start()
+    try:
+        usage = reap(proc, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.error(f"[{name}] timed out after {timeout}s, killing process group")
+        usage = terminate(proc)
+        finish_output(reader, proc, logger, name)
+        error = subprocess.TimeoutExpired(cmd, timeout, output='\n'.join(tail))
+        error.rusage = usage
+        raise error
+    except BaseException:
+        terminate(proc)
+        raise
+    finish_output(reader, proc, logger, name)
+
+    output = '\n'.join(tail)
+    if proc.returncode:
+        error = subprocess.CalledProcessError(proc.returncode, cmd, output=output)
+        error.rusage = usage
+        raise error
+    result = subprocess.CompletedProcess(cmd, proc.returncode, stdout=output)
+    result.rusage = usage
+    return result
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+
+
+class CachedQueryClient:
+    """
+    Base of the dashboard query backends
+
+    Results are cached per query text for cache_ttl seconds, so repeated
+    page views do not re-run the same query. Backends implement execute(),
+    and execute_async() when they can wait without blocking a thread.
+    """
+
+    def __init__(self, cache_ttl=300, clock=time.monotonic):
+        """
+        Args:
+            cache_ttl (float): Seconds results stay cached, 0 disables caching
+            clock (callable): Monotonic clock, injectable for tests
+        """
+        self.cache_ttl = cache_ttl
+        self.clock = clock
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def execute(self, query):
+        """Run a query to completion and return its results as a DataFrame"""
+        raise NotImplementedError
+
+    async def execute_async(self, query):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.execute, query)
+
+    def _cached(self, query):
+        with self._lock:
+            entry = self._cache.get(query)
+        if entry and entry[0] > self.clock():
+            return entry[1].copy()
+        return None
+
+    def _store(self, query, df):
+        if self.cache_ttl > 0:
+            with self._lock:
+                self._cache[query] = (self.clock() + self.cache_ttl, df.copy())
+        return df
+
+    def query(self, query, use_cache=True):
+        """
+        Run a query and return its results
+
+        Args:
+            query (str): SQL text
+            use_cache (bool): Return a cached result younger than cache_ttl
+
+        Returns:
+            DataFrame: Query results
+        """
+        cached = self._cached(query) if use_cache else None
+        if cached is not None:
+            return cached
+        return self._store(query, self.execute(query))
+
+    async def query_async(self, query, use_cache=True):
+        """Async variant of query(), for running several queries concurrently"""
+        cached = self._cached(query) if use_cache else None
+        if cached is not None:
+            return cached
+        return self._store(query, await self.execute_async(query))
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,210 @@
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import os
+import threading
+import time
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+
+def s3_client(region=None, max_pool_connections=32):
+    """
+    Create an S3 client whose connection pool fits a threaded sync
+
+    boto3 clients are thread-safe, so one client with enough pooled
+    connections is shared by every upload thread.
+    """
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        's3', region_name=region,
+        config=Config(max_pool_connections=max_pool_connections, retries={'mode': 'adaptive'})
+    )
+
+
+def file_etag(path, part_size=DEFAULT_PART_SIZE):
+    """
+    Compute the ETag S3 assigns to a file uploaded with part_size parts
+
+    Files smaller than part_size are single-part uploads whose ETag is the
+    MD5 of the body; larger ones are multipart uploads whose ETag is the
+    MD5 of the concatenated part MD5s followed by '-<number of parts>'.
+    """
+    multipart = os.path.getsize(path) >= part_size
+    digests = []
+    with open(path, 'rb') as f:
+        while True:
+            part, read = hashlib.md5(), 0
+            while read < part_size:
+                block = f.read(min(READ_SIZE, part_size - read))
+                if not block:
+                    break
+                part.update(block)
+                read += len(block)
+            if read == 0 and digests:
+                break
+            digests.append(part)
+    if not multipart:
+        return digests[0].hexdigest()
+    combined = hashlib.md5(b''.join(d.digest() for d in digests))
+    return f"{combined.hexdigest()}-{len(digests)}"
+
+
+class BidsSync:
+    """
+    Mirror a BIDS output tree to S3, uploading only new or changed files
+
+    The bucket prefix is listed once (paginated) and every local file is
+    compared by size, then by ETag, against it; only files that differ are
+    uploaded, on a thread pool sharing one client. Files of part_size or
+    more go up as multipart uploads with part_size parts, so their ETags can be
+    recomputed locally on the next sync. Concurrent files times concurrent
+    parts per file is kept within the client's connection pool.
+
+    Hidden files and folders (staging area, journal, manifest, queue
+    markers) are bookkeeping of the converter and are never uploaded.
+    """
+
+    def __init__(self, s3_client, bucket_name, prefix='bids', part_size=DEFAULT_PART_SIZE,
+                 max_concurrency=8):
+        """
+        Args:
+            s3_client: boto3 S3 client
+            bucket_name (str): Destination bucket
+            prefix (str): Key prefix the output tree is mirrored under
+            part_size (int): Multipart threshold and part size in bytes
+            max_concurrency (int): Files hashed and uploaded at once, capped
+                at the client's max_pool_connections; each multipart upload
+                gets an equal share of the remaining pool
+        """
+        self.s3 = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip('/')
+        self.part_size = part_size
+        pool_size = getattr(getattr(s3_client, 'meta', None), 'config', None)
+        pool_size = getattr(pool_size, 'max_pool_connections', None) or 10
+        self.max_concurrency = max(1, min(max_concurrency, pool_size))
+        self.part_concurrency = max(1, pool_size // self.max_concurrency)
+        self.logger = logging.getLogger(__name__)
+        self._stats_lock = threading.Lock()
+
+    def transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=self.part_size,
+            multipart_chunksize=self.part_size,
+            max_concurrency=self.part_concurrency
+        )
+
+    def key(self, relative_path):
+        return f"{self.prefix}/{relative_path}" if self.prefix else relative_path
+
+    def local_files(self, output_dir):
+        """Map relative POSIX path -> absolute path of every file to sync"""
+        output_dir = Path(output_dir)
+        files = {}
+        for root, dirs, names in os.walk(output_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in names:
+                if not name.startswith('.'):
+                    path = Path(root) / name
+                    files[path.relative_to(output_dir).as_posix()] = path
+        return files
+
+    def remote_objects(self):
+        """Map key -> (size, ETag) of every object under the prefix"""
+        objects = {}
+        paginator = self.s3.get_paginator('list_objects_v2')
+        prefix = f"{self.prefix}/" if self.prefix else ''
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                objects[obj['Key']] = (obj['Size'], obj['ETag'].strip('"'))
+        return objects
+
+    def is_current(self, path, remote):
+        """Whether the remote (size, ETag) already holds path's contents"""
+        if remote is None:
+            return False
+        size, etag = remote
+        if path.stat().st_size != size:
+            return False
+        return file_etag(path, self.part_size) == etag
+
+    def _upload(self, path, key, stats):
+        self.s3.upload_file(str(path), self.bucket_name, key, Config=self.transfer_config())
+        with self._stats_lock:
+            stats['uploaded'] += 1
+            stats['bytes'] += path.stat().st_size
+            stats['keys'].append(key)
+
+    def sync(self, output_dir, prune=False):
+        """
+        Upload new and changed files of output_dir
+
+        Args:
+            output_dir (str): BIDS root written by DicomConverter
+            prune (bool): Delete objects under the prefix that no longer
+                exist locally
+
+        Returns:
+            dict: Files seen, uploaded, skipped and removed, keys that
+                could not be deleted, bytes uploaded, elapsed seconds, MB/s
+                and the fraction of files skipped
+        """
+        start = time.monotonic()
+        local = self.local_files(output_dir)
+        remote = self.remote_objects()
+        stats = {'files': len(local), 'uploaded': 0, 'skipped': 0, 'removed': 0,
+                 'bytes': 0, 'keys': [], 'errors': []}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            def check(item):
+                relative, path = item
+                key = self.key(relative)
+                if self.is_current(path, remote.get(key)):
+                    with self._stats_lock:
+                        stats['skipped'] += 1
+                    return
+                self._upload(path, key, stats)
+
+            # Hashing and uploading both run on the pool
+            for _ in executor.map(check, sorted(local.items())):
+                pass
+
+        if prune:
+            stale = sorted(remote.keys() - {self.key(relative) for relative in local})
+            for start_at in range(0, len(stale), 1000):
+                batch = stale[start_at:start_at + 1000]
+                response = self.s3.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                )
+                # Quiet mode only reports the keys that could not be deleted
+                errors = response.get('Errors', [])
+                for error in errors:
+                    self.logger.error(
+                        f"Could not delete s3://{self.bucket_name}/{error['Key']}: "
+                        f"{error.get('Code')} {error.get('Message', '')}"
+                    )
+                stats['errors'].extend(error['Key'] for error in errors)
+                stats['removed'] += len(batch) - len(errors)
+
+        stats['keys'].sort()
+        stats['seconds'] = time.monotonic() - start
+        stats['mb_per_second'] = (
+            stats['bytes'] / 1e6 / stats['seconds'] if stats['seconds'] > 0 else 0.0
+        )
+        stats['skip_rate'] = stats['skipped'] / stats['files'] if stats['files'] else 0.0
+        self.logger.info(
+            f"Synced {stats['files']} files to s3://{self.bucket_name}/{self.prefix}: "
+            f"{stats['uploaded']} uploaded ({stats['bytes']} bytes, "
+            f"{stats['mb_per_second']:.1f} MB/s), {stats['skipped']} unchanged "
+            f"({stats['skip_rate']:.0%}), {stats['removed']} removed"
+            + (f", {len(stats['errors'])} could not be removed" if stats['errors'] else '')
+        )
+        return stats
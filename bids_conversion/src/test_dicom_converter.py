@@ -1,8 +1,10 @@
 import json
 import re
 from pathlib import Path
-import pydicom
-import pandas as pd
+
+from src.dry_run import dry_run
+from src.header_index import open_index
+from src.matcher import SeriesMatcher
 
 class BidsConfigValidator:
     def __init__(self, config_path):
@@ -29,47 +31,50 @@ class BidsConfigValidator:
                 issues.append(f"Missing SeriesDescription in description {idx}")
         return issues
     
-    def analyze_dicom_directory(self, dicom_dir):
+    def analyze_dicom_directory(self, dicom_dir, index=None, max_workers=1):
         """
         Analyze DICOM files to check if they match the configuration patterns
         
         Args:
             dicom_dir (str): Directory containing DICOM files
+            index (DicomHeaderIndex): Existing header index to query instead
+                of opening the one stored in dicom_dir
+            max_workers (int): Worker processes used to (re)index headers
         """
-        dicom_dir = Path(dicom_dir)
-        series_descriptions = []
-        
-        # Collect all unique SeriesDescriptions from DICOM files
-        for dcm_file in dicom_dir.glob('**/*.dcm'):
-            try:
-                ds = pydicom.dcmread(dcm_file, stop_before_pixels=True)
-                if hasattr(ds, 'SeriesDescription'):
-                    series_descriptions.append(ds.SeriesDescription)
-            except:
-                continue
-                
-        series_descriptions = list(set(series_descriptions))
+        import pandas as pd
+
+        # Collect all unique SeriesDescriptions from the header index
+        if index is None:
+            with open_index(dicom_dir, max_workers=max_workers) as index:
+                series_descriptions = index.series_descriptions()
+        else:
+            series_descriptions = index.series_descriptions()
         
         # Check which descriptions match our patterns
-        matches = []
-        for desc in series_descriptions:
-            matching_patterns = []
-            for config_desc in self.config['descriptions']:
-                pattern = config_desc['criteria']['SeriesDescription']
-                if re.search(pattern, desc):
-                    matching_patterns.append({
-                        'pattern': pattern,
-                        'modality': config_desc['modalityLabel'],
-                        'dataType': config_desc['dataType']
-                    })
-            
-            matches.append({
-                'series_desc': desc,
-                'matches': matching_patterns
-            })
-            
+        # Reports patterns found anywhere in a description, unlike dcm2bids
+        matcher = SeriesMatcher(self.config, search_method='search')
+        matches = [
+            {'series_desc': desc, 'matches': matching_patterns}
+            for desc, matching_patterns in matcher.match_many(series_descriptions).items()
+        ]
+        
         return pd.DataFrame(matches)
     
+    def dry_run(self, dicom_dir, index=None, max_workers=1):
+        """
+        Report per series whether it matches zero, one or several descriptions,
+        the series per modalityLabel and the projected output file count
+        
+        Args:
+            dicom_dir (str): Directory containing DICOM files
+            index (DicomHeaderIndex): Existing header index to query
+            max_workers (int): Worker processes used to (re)index headers
+        
+        Returns:
+            DryRunReport
+        """
+        return dry_run(self.config_path, dicom_dir, index=index, max_workers=max_workers)
+    
     def optimize_config(self):
         """Suggest optimizations for the configuration"""
         suggestions = []
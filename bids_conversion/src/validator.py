@@ -17,6 +17,7 @@ class ConfigValidator:
         issues = []
         issues.extend(self.validate_regex_patterns())
         issues.extend(self.validate_structure())
+        issues.extend(self.check_duplicates())
         return issues
     
     def validate_regex_patterns(self):
@@ -54,4 +55,20 @@ class ConfigValidator:
             if 'modalityLabel' not in desc:
                 issues.append(f"Missing 'modalityLabel' in description {idx}")
                 
-        return issues
\ No newline at end of file
+        return issues
+
+    def check_duplicates(self):
+        """Find descriptions sharing a SeriesDescription pattern, which dcm2bids treats as ambiguous"""
+        issues = []
+        seen = {}
+        for idx, desc in enumerate(self.config.get('descriptions', [])):
+            pattern = desc.get('criteria', {}).get('SeriesDescription')
+            if not pattern:
+                continue
+            if pattern in seen:
+                issues.append(
+                    f"Duplicate SeriesDescription pattern in descriptions {seen[pattern]} and {idx}: {pattern}"
+                )
+            else:
+                seen[pattern] = idx
+        return issues
@@ -0,0 +1,281 @@
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Optional
+import struct
+
+import numpy as np
+
+# Transfer syntaxes whose PixelData is stored as a plain native array
+NATIVE_SYNTAXES = {
+    '1.2.840.10008.1.2': '<',  # Implicit VR Little Endian
+    '1.2.840.10008.1.2.1': '<',  # Explicit VR Little Endian
+    '1.2.840.10008.1.2.2': '>',  # Explicit VR Big Endian
+}
+
+PIXEL_DATA_TAG = (0x7FE0, 0x0010)
+UNDEFINED_LENGTH = 0xFFFFFFFF
+
+# Upper bound on the pixels converted to float at a time by stats()
+DEFAULT_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+@dataclass
+class PixelLayout:
+    """Where a file's PixelData lives and how to interpret it"""
+    path: str
+    offset: int
+    frames: int
+    rows: int
+    columns: int
+    dtype: str
+    slope: float = 1.0
+    intercept: float = 0.0
+    position: Optional[float] = None
+    instance_number: int = 0
+
+    @property
+    def shape(self):
+        return (self.frames, self.rows, self.columns)
+
+    def memmap(self):
+        """Read-only (frames, rows, columns) view of the file's pixels"""
+        return np.memmap(self.path, dtype=self.dtype, mode='r',
+                         offset=self.offset, shape=self.shape)
+
+
+def slice_position(ds):
+    """Distance of a slice along its normal, for ordering slices"""
+    position = ds.get('ImagePositionPatient')
+    orientation = ds.get('ImageOrientationPatient')
+    if position is None or orientation is None:
+        return None
+    row, col = np.asarray(orientation[:3], float), np.asarray(orientation[3:], float)
+    return float(np.dot(np.cross(row, col), np.asarray(position, float)))
+
+
+def read_pixel_layout(path):
+    """
+    Read a file's header and locate its PixelData without loading it
+
+    The header is parsed up to (not including) PixelData, which leaves the
+    file positioned on the PixelData element; its length field gives the
+    byte range of the pixels.
+
+    Args:
+        path (str): DICOM file
+
+    Returns:
+        tuple: (header Dataset, PixelLayout), with PixelLayout None when the
+            pixels cannot be mapped (compressed, 1-bit, colour or missing)
+    """
+    import pydicom
+
+    with open(path, 'rb') as f:
+        ds = pydicom.dcmread(f, stop_before_pixels=True)
+        element_start = f.tell()
+        header = f.read(12)
+
+    file_meta = getattr(ds, 'file_meta', None)
+    syntax = str(file_meta.get('TransferSyntaxUID', '')) if file_meta is not None else ''
+    byteorder = NATIVE_SYNTAXES.get(syntax)
+    bits = ds.get('BitsAllocated')
+    if (byteorder is None or len(header) < 8 or bits not in (8, 16, 32)
+            or int(ds.get('SamplesPerPixel') or 1) != 1):
+        return ds, None
+
+    group, element = struct.unpack(byteorder + 'HH', header[:4])
+    if (group, element) != PIXEL_DATA_TAG:
+        return ds, None
+    if syntax == '1.2.840.10008.1.2':
+        length, = struct.unpack('<I', header[4:8])
+        data_offset = element_start + 8
+    else:
+        # Explicit VR OB/OW: VR, two reserved bytes, then a 4-byte length
+        length, = struct.unpack(byteorder + 'I', header[8:12])
+        data_offset = element_start + 12
+
+    frames = int(ds.get('NumberOfFrames') or 1)
+    rows, columns = int(ds.Rows), int(ds.Columns)
+    itemsize = bits // 8
+    if length == UNDEFINED_LENGTH or length < frames * rows * columns * itemsize:
+        return ds, None
+
+    kind = 'i' if ds.get('PixelRepresentation') == 1 else 'u'
+    layout = PixelLayout(
+        path=str(path),
+        offset=data_offset,
+        frames=frames,
+        rows=rows,
+        columns=columns,
+        dtype=f'{byteorder}{kind}{itemsize}',
+        slope=float(ds.get('RescaleSlope') or 1.0),
+        intercept=float(ds.get('RescaleIntercept') or 0.0),
+        position=slice_position(ds),
+        instance_number=int(ds.get('InstanceNumber') or 0),
+    )
+    return ds, layout
+
+
+class LazyVolume:
+    """
+    A series as a lazily assembled (slices, rows, columns) volume
+
+    Every file's PixelData is memory-mapped on access, so only the pages
+    actually touched are read and a slice costs no more memory than the
+    caller keeps of it. Statistics are computed a chunk of slices at a time,
+    which keeps QC of multi-gigabyte series within a few MB of RAM.
+    """
+
+    def __init__(self, layouts):
+        """
+        Args:
+            layouts (list): PixelLayouts in slice order, all of one shape
+        """
+        if not layouts:
+            raise ValueError("A volume needs at least one slice")
+        if len({(l.rows, l.columns) for l in layouts}) > 1:
+            raise ValueError("Slices of a volume must share rows and columns")
+        self.layouts = list(layouts)
+        # (layout, frame) for every slice; multi-frame files hold several
+        self._frames = [(l, i) for l in self.layouts for i in range(l.frames)]
+
+    @classmethod
+    def from_files(cls, paths):
+        """Build a volume from uncompressed files, ordered by slice position"""
+        layouts = []
+        for path in paths:
+            _, layout = read_pixel_layout(path)
+            if layout is None:
+                raise ValueError(f"PixelData of {path} cannot be memory-mapped")
+            layouts.append(layout)
+        layouts.sort(key=lambda l: (
+            l.position if l.position is not None else 0.0, l.instance_number, l.path
+        ))
+        return cls(layouts)
+
+    @classmethod
+    def from_index(cls, index, series_instance_uid):
+        """Build the volume of one series from a DicomHeaderIndex"""
+        records = index.records(series_instance_uid=series_instance_uid)
+        if not records:
+            raise ValueError(f"Series not in index: {series_instance_uid}")
+        return cls.from_files(r['file_path'] for r in records)
+
+    @property
+    def shape(self):
+        first = self.layouts[0]
+        return (len(self._frames), first.rows, first.columns)
+
+    @property
+    def dtype(self):
+        return np.dtype(self.layouts[0].dtype).newbyteorder('=')
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def __len__(self):
+        return len(self._frames)
+
+    def slice(self, index, rescale=False):
+        """
+        Return one slice as a memory-mapped view
+
+        Args:
+            index (int): Slice number
+            rescale (bool): Apply RescaleSlope/Intercept (returns a float copy)
+        """
+        layout, frame = self._frames[index]
+        pixels = layout.memmap()[frame]
+        if rescale:
+            return pixels * np.float32(layout.slope) + np.float32(layout.intercept)
+        return pixels
+
+    def __getitem__(self, key):
+        """NumPy-style indexing that only reads the slices it selects"""
+        key = key if isinstance(key, tuple) else (key,)
+        selected, rest = key[0], key[1:]
+        if isinstance(selected, (int, np.integer)):
+            return np.asarray(self.slice(selected)[rest])
+        indices = range(len(self))[selected] if isinstance(selected, slice) else selected
+        return np.stack([np.asarray(self.slice(i)[rest]) for i in indices])
+
+    def to_array(self):
+        """Materialize the whole volume in memory in native byte order"""
+        out = np.empty(self.shape, dtype=self.dtype)
+        for i in range(len(self)):
+            out[i] = self.slice(i)
+        return out
+
+    def iter_chunks(self, chunk_bytes=DEFAULT_CHUNK_BYTES, rescale=True):
+        """Yield float32 blocks of consecutive slices, each about chunk_bytes"""
+        _, rows, columns = self.shape
+        per_chunk = max(1, chunk_bytes // (rows * columns * 4))
+        for start in range(0, len(self), per_chunk):
+            stop = min(start + per_chunk, len(self))
+            chunk = np.empty((stop - start, rows, columns), dtype=np.float32)
+            for i in range(start, stop):
+                chunk[i - start] = self.slice(i, rescale=rescale)
+            yield chunk
+
+    def stats(self, bins=64, chunk_bytes=DEFAULT_CHUNK_BYTES, rescale=True):
+        """
+        Compute intensity statistics in two streaming passes
+
+        Args:
+            bins (int): Histogram bins between min and max
+            chunk_bytes (int): Working memory per chunk
+            rescale (bool): Use rescaled (e.g. Hounsfield) values
+
+        Returns:
+            dict: min, max, mean, std, voxel count, histogram and bin edges
+        """
+        lo, hi = np.inf, -np.inf
+        total = total_sq = 0.0
+        count = 0
+        for chunk in self.iter_chunks(chunk_bytes, rescale):
+            lo = min(lo, float(chunk.min()))
+            hi = max(hi, float(chunk.max()))
+            total += float(chunk.sum(dtype=np.float64))
+            total_sq += float(np.square(chunk, dtype=np.float64).sum())
+            count += chunk.size
+
+        edges = np.linspace(lo, hi if hi > lo else lo + 1.0, bins + 1)
+        histogram = np.zeros(bins, dtype=np.int64)
+        for chunk in self.iter_chunks(chunk_bytes, rescale):
+            histogram += np.histogram(chunk, bins=edges)[0]
+
+        mean = total / count
+        return {
+            'min': lo,
+            'max': hi,
+            'mean': mean,
+            'std': float(np.sqrt(max(total_sq / count - mean * mean, 0.0))),
+            'voxels': count,
+            'histogram': histogram,
+            'bin_edges': edges,
+        }
+
+    def thumbnail(self, size=128, index=None, path=None):
+        """
+        Downsample one slice (the middle one by default) to an 8-bit image
+
+        Intensities are windowed to the slice's 1st-99th percentile. If path
+        is given the thumbnail is also saved as an image (needs pillow).
+
+        Returns:
+            ndarray: uint8 array of at most size x size pixels
+        """
+        index = len(self) // 2 if index is None else index
+        pixels = self.slice(index)
+        step = max(1, -(-max(pixels.shape) // size))
+        small = np.asarray(pixels[::step, ::step], dtype=np.float32)
+        low, high = np.percentile(small, [1, 99])
+        scaled = np.clip((small - low) / max(high - low, 1e-6), 0, 1)
+        image = (scaled * 255).astype(np.uint8)
+        if path is not None:
+            from PIL import Image
+
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            Image.fromarray(image).save(path)
+        return image
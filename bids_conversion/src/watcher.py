@@ -0,0 +1,300 @@
+from pathlib import Path
+import fnmatch
+import logging
+import os
+import queue
+import threading
+import time
+
+from src.archive_source import MEMBER_SEPARATOR, is_archive
+from src.dedup import deduplicate, find_duplicates
+from src.discovery import discover_sessions
+from src.header_index import open_index
+from src.manifest import ConversionManifest
+
+
+class FolderWatcher:
+    """
+    Convert sessions shortly after their DICOMs arrive in dicom_dir
+
+    Changes are picked up from inotify through watchdog when it is
+    installed, or by polling the tree otherwise. A series folder (or an
+    archive) is considered complete once it has not changed for
+    settle_seconds; the index entries below it are then refreshed, and only
+    the sessions holding the settled files are rediscovered and converted,
+    so the work per arrival does not grow with the size of the tree.
+
+    Jobs pass through a bounded queue to max_workers conversion threads.
+    While the queue is full the watcher stops scanning, so a burst of
+    arrivals waits on disk instead of in memory and is picked up by the
+    next scan once conversions catch up.
+    """
+
+    def __init__(self, converter, index=None, settle_seconds=30.0, poll_interval=5.0,
+                 max_pending=16, max_workers=2, method='auto', use_inotify=True,
+                 dedup=True, clock=time.monotonic):
+        """
+        Args:
+            converter (DicomConverter): Converter for dicom_dir/output_dir
+            index (DicomHeaderIndex): Header index of dicom_dir, opened on
+                start when omitted
+            settle_seconds (float): Quiet period after which a series
+                folder or archive counts as complete
+            poll_interval (float): Seconds between scans (or event checks)
+            max_pending (int): Jobs queued before the watcher waits
+            max_workers (int): Concurrent conversions
+            method (str): Session discovery method, see discover_sessions
+            use_inotify (bool): Use watchdog's inotify observer if installed
+            dedup (bool): Convert only one copy of instances stored more
+                than once, see deduplicate
+            clock (callable): Monotonic clock, injectable for tests
+        """
+        self.converter = converter
+        self.dicom_dir = Path(converter.dicom_dir)
+        self.index = index
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.max_workers = max_workers
+        self.method = method
+        self.use_inotify = use_inotify
+        self.dedup = dedup
+        self.clock = clock
+        self.pattern = index.pattern if index is not None else '*.dcm'
+        self.logger = logging.getLogger(__name__)
+
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.stats = {'queued': 0, 'converted': 0, 'unchanged': 0, 'failed': 0}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._snapshot = {}
+        self._pending = {}  # folder or archive -> time of its last change
+        self._in_flight = set()
+        self._rerun = {}
+        self._requeue = []
+        self._workers = []
+        self._observer = None
+
+    def _wanted(self, name):
+        return fnmatch.fnmatch(name, self.pattern) or is_archive(name)
+
+    def scan(self):
+        """Return relative path -> (size, mtime_ns) of DICOM files and archives"""
+        files = {}
+        for root, dirs, names in os.walk(self.dicom_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in names:
+                if name.startswith('.') or not self._wanted(name):
+                    continue
+                path = Path(root) / name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files[path.relative_to(self.dicom_dir).as_posix()] = (
+                    stat.st_size, stat.st_mtime_ns
+                )
+        return files
+
+    def note(self, path):
+        """Record a change to a file; its series folder (or archive) restarts settling"""
+        path = Path(path)
+        if not path.is_absolute():
+            path = self.dicom_dir / path
+        group = path if is_archive(path.name) else path.parent
+        with self._lock:
+            self._pending[group] = self.clock()
+
+    def poll(self):
+        """Compare the tree with the previous scan and note every change"""
+        snapshot = self.scan()
+        for rel_path, state in snapshot.items():
+            if self._snapshot.get(rel_path) != state:
+                self.note(rel_path)
+        self._snapshot = snapshot
+
+    def settled(self):
+        """Pop the folders and archives that stopped changing"""
+        now = self.clock()
+        with self._lock:
+            ready = [g for g, t in self._pending.items() if now - t >= self.settle_seconds]
+            for group in ready:
+                del self._pending[group]
+        return sorted(ready)
+
+    @staticmethod
+    def covers(job, group):
+        """Whether a settled folder or archive holds files of a job"""
+        group = str(group)
+        if job.files is not None:
+            return any(
+                str(f).startswith(group + os.sep) or str(f).startswith(group + MEMBER_SEPARATOR)
+                for f in job.files
+            )
+        source_dir = str(job.source_dir)
+        return group == source_dir or group.startswith(source_dir + os.sep)
+
+    def jobs_for(self, groups):
+        """Refresh the index below groups and return the sessions with files in them"""
+        if self.index is None:
+            self.index = open_index(self.dicom_dir)
+        else:
+            self.index.refresh(paths=groups)
+        jobs = discover_sessions(
+            self.dicom_dir, index=self.index, method=self.method, paths=groups
+        )
+        if self.dedup and jobs:
+            # Only the instances of these sessions are checked for copies
+            report = find_duplicates(
+                self.index, paths=[self.index.relative_path(job.source_dir) for job in jobs]
+            )
+            jobs, report = deduplicate(jobs, self.index, report=report)
+            if report.instances:
+                self.logger.info(f"Deduplication: {report.summary()}")
+        return [job for job in jobs if any(self.covers(job, g) for g in groups)]
+
+    def enqueue(self, job):
+        """
+        Queue a job, blocking while the queue is full
+
+        A job that is already queued or running is marked for one more run
+        instead, so files arriving mid-conversion are not missed.
+
+        Returns:
+            bool: False if the watcher was stopped while waiting
+        """
+        key = ConversionManifest.key(job.subject_id, job.session)
+        with self._lock:
+            if key in self._in_flight:
+                self._rerun[key] = job
+                return True
+            self._in_flight.add(key)
+        while not self._stop.is_set():
+            try:
+                self.jobs.put(job, timeout=self.poll_interval)
+            except queue.Full:
+                self.logger.info(f"Conversion queue full, holding {key}")
+                continue
+            self.stats['queued'] += 1
+            return True
+        with self._lock:
+            self._in_flight.discard(key)
+        return False
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            key = ConversionManifest.key(job.subject_id, job.session)
+            try:
+                converted = self.converter.convert_subject(
+                    job.subject_id, session=job.session,
+                    source_dir=job.source_dir, files=job.files
+                )
+                outcome = 'converted' if converted else 'unchanged'
+            except Exception as e:
+                self.logger.error(f"Conversion of {key} failed: {str(e)}")
+                outcome = 'failed'
+            with self._lock:
+                self.stats[outcome] += 1
+                self._in_flight.discard(key)
+                rerun = self._rerun.pop(key, None)
+                if rerun is not None:
+                    self._requeue.append(rerun)
+            self.jobs.task_done()
+
+    def step(self):
+        """Run one cycle: detect changes, then queue the sessions that settled"""
+        if self._observer is None:
+            self.poll()
+        with self._lock:
+            jobs, self._requeue = self._requeue, []
+        groups = self.settled()
+        if groups:
+            self.logger.info(f"{len(groups)} folder(s) settled, refreshing the index")
+            jobs.extend(self.jobs_for(groups))
+        for job in jobs:
+            if not self.enqueue(job):
+                break
+        return len(jobs)
+
+    def _start_observer(self):
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            self.logger.info("watchdog not installed, polling for changes")
+            return
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                for path in (event.src_path, getattr(event, 'dest_path', '')):
+                    if path and watcher._wanted(os.path.basename(path)):
+                        watcher.note(path)
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), str(self.dicom_dir), recursive=True)
+        self._observer.start()
+        self.logger.info(f"Watching {self.dicom_dir} with inotify")
+
+    def start(self, catch_up=True):
+        """
+        Start the conversion threads and change detection
+
+        Args:
+            catch_up (bool): Treat files already present as new arrivals;
+                unchanged sessions are skipped by the converter's manifest
+        """
+        self._stop.clear()
+        self._workers = [
+            threading.Thread(target=self._work, name=f'watch-convert-{i}', daemon=True)
+            for i in range(self.max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        if not catch_up:
+            self._snapshot = self.scan()
+        if self.use_inotify:
+            self._start_observer()
+            if self._observer is not None and catch_up:
+                for rel_path in self.scan():
+                    self.note(rel_path)
+
+    def stop(self):
+        """Ask run() to return; safe to call from any thread or signal handler"""
+        self._stop.set()
+
+    def close(self, wait=True):
+        """Stop watching and the conversion threads, finishing queued jobs if wait"""
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if wait:
+            self.jobs.join()
+        for _ in self._workers:
+            self.jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def run(self, catch_up=True):
+        """Watch until stop() is called from another thread or Ctrl-C"""
+        self.start(catch_up=catch_up)
+        self.logger.info(
+            f"Watching {self.dicom_dir}: series settle after {self.settle_seconds:.0f}s"
+        )
+        try:
+            while not self._stop.is_set():
+                self.step()
+                self._stop.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            self.logger.info("Stopping, waiting for running conversions")
+        finally:
+            self.close()
+        return self.stats
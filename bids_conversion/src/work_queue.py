@@ -0,0 +1,326 @@
+from pathlib import Path
+from dataclasses import dataclass
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from src.discovery import SessionJob
+from src.manifest import ConversionManifest
+
+# Folder in output_dir holding one completion marker per converted job
+MARKER_DIR = '.queue_done'
+
+JOB_STATES = ('pending', 'leased', 'done', 'failed')
+
+
+@dataclass
+class LeasedJob:
+    """A job handed to one worker until its lease expires"""
+    key: str
+    job: SessionJob
+    attempt: int
+    worker_id: str
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+
+
+class WorkQueue:
+    """
+    SQLite work queue for spreading conversions over several nodes
+
+    Jobs are subject/session units keyed like the conversion manifest.
+    Workers lease one job at a time; a lease that is not renewed before
+    lease_seconds (e.g. because its node died) makes the job available
+    again. Failed jobs are retried until max_attempts, then marked failed.
+
+    The database is a plain SQLite file, so it can live on local disk for a
+    single node or on shared storage with working POSIX locks for several.
+    """
+
+    FILENAME = '.work_queue.sqlite'
+
+    def __init__(self, path, lease_seconds=3600, max_attempts=3, clock=time.time):
+        """
+        Args:
+            path (str): SQLite database file (created if missing)
+            lease_seconds (float): How long a job stays leased without renewal
+            max_attempts (int): Leases per job before it is marked failed
+            clock (callable): Wall clock, injectable for tests
+        """
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(
+            str(self.path), timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'key TEXT PRIMARY KEY, subject_id TEXT NOT NULL, session TEXT, '
+                'source_dir TEXT, files TEXT, state TEXT NOT NULL DEFAULT \'pending\', '
+                'attempts INTEGER NOT NULL DEFAULT 0, worker_id TEXT, '
+                'lease_expires REAL, error TEXT, updated_at REAL)'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)')
+
+    def _transaction(self, func):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can
+        # never lease the same job
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(self.conn)
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+        return result
+
+    def publish(self, jobs):
+        """
+        Add jobs to the queue
+
+        Jobs already done or failed are queued again with a fresh attempt
+        count, so new data for a processed session and failed jobs are picked
+        up on the next pass; workers skip jobs whose inputs did not change
+        since their completion marker. Pending and leased jobs are left
+        untouched.
+
+        Args:
+            jobs (iterable): SessionJobs, subject IDs or (subject_id, session) tuples
+
+        Returns:
+            int: Number of newly queued or re-queued jobs
+        """
+        now = self.clock()
+        rows = []
+        for job in jobs:
+            if not isinstance(job, SessionJob):
+                job = SessionJob(*job) if isinstance(job, (tuple, list)) else SessionJob(job)
+            rows.append((
+                ConversionManifest.key(job.subject_id, job.session), job.subject_id,
+                job.session, str(job.source_dir) if job.source_dir else None,
+                json.dumps(job.files) if job.files is not None else None, now
+            ))
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT INTO jobs (key, subject_id, session, source_dir, files, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                "state = 'pending', attempts = 0, worker_id = NULL, lease_expires = NULL, "
+                'error = NULL, source_dir = excluded.source_dir, files = excluded.files, '
+                "updated_at = excluded.updated_at WHERE state IN ('done', 'failed')", rows
+            )
+            return conn.total_changes - before
+
+        added = self._transaction(insert)
+        self.logger.info(f"Queued {added} job(s) of {len(rows)} published")
+        return added
+
+    def lease(self, worker_id):
+        """Claim the next available job, or return None if there is none"""
+        def claim(conn):
+            now = self.clock()
+            while True:
+                row = conn.execute(
+                    "SELECT key, subject_id, session, source_dir, files, attempts FROM jobs "
+                    "WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) "
+                    "ORDER BY rowid LIMIT 1", (now,)
+                ).fetchone()
+                if row is None:
+                    return None
+                key, subject_id, session, source_dir, files, attempts = row
+                if attempts < self.max_attempts:
+                    break
+                # The last lease expired without the job finishing
+                conn.execute(
+                    "UPDATE jobs SET state = 'failed', error = ?, updated_at = ? WHERE key = ?",
+                    ('Lease expired on the final attempt', now, key)
+                )
+            conn.execute(
+                "UPDATE jobs SET state = 'leased', attempts = attempts + 1, worker_id = ?, "
+                "lease_expires = ?, updated_at = ? WHERE key = ?",
+                (worker_id, now + self.lease_seconds, now, key)
+            )
+            job = SessionJob(
+                subject_id, session, Path(source_dir) if source_dir else None,
+                json.loads(files) if files else None
+            )
+            return LeasedJob(key=key, job=job, attempt=attempts + 1, worker_id=worker_id)
+
+        return self._transaction(claim)
+
+    def _update_leased(self, leased, assignments, params):
+        def update(conn):
+            cursor = conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? "
+                "WHERE key = ? AND worker_id = ? AND state = 'leased'",
+                (*params, self.clock(), leased.key, leased.worker_id)
+            )
+            return cursor.rowcount == 1
+        return self._transaction(update)
+
+    def renew(self, leased):
+        """Extend a lease; False if the job was meanwhile given to another worker"""
+        return self._update_leased(
+            leased, 'lease_expires = ?', (self.clock() + self.lease_seconds,)
+        )
+
+    def complete(self, leased):
+        return self._update_leased(leased, "state = 'done', error = NULL", ())
+
+    def fail(self, leased, error):
+        """Record a failure; the job is retried until max_attempts"""
+        state = 'failed' if leased.attempt >= self.max_attempts else 'pending'
+        return self._update_leased(leased, 'state = ?, error = ?', (state, str(error)))
+
+    def progress(self):
+        """Return the number of jobs in each state"""
+        with self._lock:
+            rows = self.conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall()
+        counts = dict.fromkeys(JOB_STATES, 0)
+        counts.update(rows)
+        counts['total'] = sum(counts[state] for state in JOB_STATES)
+        return counts
+
+    def failures(self):
+        """Return (key, error) for every job that ran out of attempts"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT key, error FROM jobs WHERE state = 'failed' ORDER BY key"
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class QueueWorker:
+    """
+    Consume a WorkQueue with a DicomConverter
+
+    Every job runs through converter.convert_subject, exactly as a
+    single-node batch would. A completion marker holding the input
+    fingerprint is written to output_dir/.queue_done, so a job that is
+    delivered twice (e.g. after a lease expired on a slow node) is
+    recognised as done without converting it again.
+    """
+
+    def __init__(self, converter, queue, worker_id=None):
+        """
+        Args:
+            converter (DicomConverter): Converter whose output_dir all
+                workers share
+            queue (WorkQueue): Queue to consume
+            worker_id (str): Name used for leases, defaults to host-pid-thread
+        """
+        self.converter = converter
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self.marker_dir = converter.output_dir / MARKER_DIR
+        self.logger = logging.getLogger(__name__)
+
+    def marker_path(self, key):
+        return self.marker_dir / (key.replace('/', '__') + '.json')
+
+    def fingerprint(self, job):
+        converter = self.converter
+        source_dir = job.source_dir or converter.subject_source_dir(job.subject_id, job.session)
+        return ConversionManifest.fingerprint(source_dir, converter.config_path, files=job.files)
+
+    def is_done(self, key, fingerprint):
+        try:
+            with open(self.marker_path(key)) as f:
+                return json.load(f).get('fingerprint') == fingerprint
+        except (OSError, ValueError):
+            return False
+
+    def write_marker(self, leased, fingerprint):
+        path = self.marker_path(leased.key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{self.worker_id}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'key': leased.key, 'worker_id': self.worker_id,
+                'fingerprint': fingerprint, 'completed_at': time.time()
+            }, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _keep_alive(self, leased, stop):
+        interval = max(self.queue.lease_seconds / 3, 0.01)
+        while not stop.wait(interval):
+            if not self.queue.renew(leased):
+                self.logger.warning(f"Lost the lease on {leased.key}")
+                return
+
+    def process(self, leased):
+        """Convert one leased job and report the outcome to the queue"""
+        job = leased.job
+        fingerprint = self.fingerprint(job)
+        if self.is_done(leased.key, fingerprint):
+            self.logger.info(f"{leased.key} already converted, marking done")
+            return self.queue.complete(leased)
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_alive, args=(leased, stop), daemon=True)
+        heartbeat.start()
+        try:
+            self.converter.convert_subject(
+                job.subject_id, session=job.session,
+                source_dir=job.source_dir, files=job.files
+            )
+        except Exception as e:
+            self.logger.error(f"{leased.key} failed on attempt {leased.attempt}: {str(e)}")
+            return self.queue.fail(leased, e)
+        finally:
+            stop.set()
+            heartbeat.join()
+        self.write_marker(leased, fingerprint)
+        return self.queue.complete(leased)
+
+    def run(self, max_jobs=None, wait=False, poll_interval=5.0):
+        """
+        Process jobs until the queue is drained
+
+        Args:
+            max_jobs (int): Stop after this many jobs
+            wait (bool): Keep polling while other workers hold leases, so
+                jobs whose lease expires are picked up
+            poll_interval (float): Seconds between polls when idle
+
+        Returns:
+            int: Number of jobs processed by this worker
+        """
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            leased = self.queue.lease(self.worker_id)
+            if leased is None:
+                if wait and self.queue.progress()['leased']:
+                    time.sleep(poll_interval)
+                    continue
+                break
+            self.process(leased)
+            processed += 1
+            progress = self.queue.progress()
+            self.logger.info(
+                f"Progress: {progress['done']}/{progress['total']} done, "
+                f"{progress['failed']} failed, {progress['leased']} running"
+            )
+        return processed
@@ -61,4 +61,28 @@ def dicom_directory(tmp_path, sample_dicom):
     
     # Copy sample DICOM to subject directory
     shutil.copy(sample_dicom, sub_dir / "sample.dcm")
-    return dicom_dir
\ No newline at end of file
+    return dicom_dir
+
+@pytest.fixture
+def generated_dicoms(tmp_path):
+    """Generate a small multi-subject DICOM tree"""
+    from data_generator import DicomDataGenerator
+    
+    generator = DicomDataGenerator(tmp_path / "data")
+    generator.setup_directories()
+    for subject_id in ('01', '02'):
+        generator.generate_subject_data(subject_id, num_sessions=1)
+    return generator.raw_path
+
+@pytest.fixture
+def s3(monkeypatch):
+    """A moto S3 client with an empty test-bucket"""
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket="test-bucket")
+        yield client
@@ -0,0 +1,111 @@
+import pytest
+import os
+import tarfile
+import zipfile
+from pathlib import Path
+from unittest.mock import patch
+from src.archive_source import materialize, member_path, source_stat, split_member_path
+from src.converter import DicomConverter
+from src.discovery import discover_sessions
+from src.header_index import open_index
+
+@pytest.fixture
+def archived_dicoms(generated_dicoms, tmp_path):
+    """sub-01 bundled as a zip and sub-02 as a tar.gz, nothing loose"""
+    archive_dir = tmp_path / "archives"
+    archive_dir.mkdir()
+    with zipfile.ZipFile(archive_dir / "study_01.zip", "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted((generated_dicoms / "sub-01").rglob("*.dcm")):
+            zf.write(path, path.relative_to(generated_dicoms).as_posix())
+    with tarfile.open(archive_dir / "study_02.tar.gz", "w:gz") as tf:
+        tf.add(generated_dicoms / "sub-02", arcname="sub-02")
+    return archive_dir
+
+def test_split_member_path():
+    """Test virtual member paths round-trip and plain paths are left alone"""
+    path = member_path("/data/study.zip", "sub-01/a.dcm")
+    assert path == "/data/study.zip!/sub-01/a.dcm"
+    assert split_member_path(path) == (Path("/data/study.zip"), "sub-01/a.dcm")
+    assert split_member_path("/data/sub-01/a.dcm") is None
+
+def test_index_reads_archive_members(archived_dicoms):
+    """Test members are indexed in place and re-read only when the archive changes"""
+    with open_index(archived_dicoms) as index:
+        records = index.records()
+        assert len(records) == 36
+        assert index.distinct('patient_id') == ['ID_01', 'ID_02']
+        assert all('!/' in r['file_path'] for r in records)
+        # Nothing was extracted next to the archives
+        assert sorted(p.name for p in archived_dicoms.iterdir() if not p.name.startswith('.')) == [
+            'study_01.zip', 'study_02.tar.gz'
+        ]
+
+        assert index.refresh()['read'] == 0
+        stat = os.stat(archived_dicoms / "study_02.tar.gz")
+        os.utime(archived_dicoms / "study_02.tar.gz", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        stats = index.refresh()
+        assert stats['read'] == 18
+        assert stats['files'] == 36
+
+        (archived_dicoms / "study_01.zip").unlink()
+        assert index.refresh()['removed'] == 18
+        assert index.distinct('patient_id') == ['ID_02']
+
+def test_materialize_extracts_only_requested(archived_dicoms, tmp_path):
+    """Test only the requested members reach the disk"""
+    with open_index(archived_dicoms) as index:
+        wanted = [r['file_path'] for r in index.records(series_description='T1_SAG')]
+    assert len(wanted) == 6
+    assert source_stat(wanted[0])[0] > 0
+
+    local = materialize(wanted, tmp_path / "extracted")
+    assert all(Path(p).exists() for p in local)
+    assert len(list((tmp_path / "extracted").rglob("*.dcm"))) == 6
+
+def test_convert_from_archives(archived_dicoms, config_file, tmp_path):
+    """Test header discovery and both backends convert straight from archives"""
+    jobs = discover_sessions(archived_dicoms)
+    assert [job.subject_id for job in jobs] == ['sub-ID01', 'sub-ID02']
+    assert all(len(job.files) == 18 for job in jobs)
+
+    converter = DicomConverter(
+        config_file, archived_dicoms, tmp_path / "native", backend='native'
+    )
+    report = converter.convert_subjects(jobs, max_workers=1)
+    assert not report.failed
+    assert list((tmp_path / "native" / "sub-ID01").rglob("*.nii.gz"))
+
+    staged = []
+    def fake_dcm2bids(cmd, **kwargs):
+        source = Path(cmd[cmd.index('-d') + 1])
+        staged.append(sorted(p.resolve().name for p in source.iterdir()))
+
+    converter = DicomConverter(config_file, archived_dicoms, tmp_path / "dcm2bids")
+    with patch('src.converter.run_command', side_effect=fake_dcm2bids):
+        converter.convert_subject(jobs[0].subject_id, jobs[0].session,
+                                  source_dir=jobs[0].source_dir, files=jobs[0].files)
+    assert len(staged[0]) == 18
+
+def test_session_folders_with_archives(generated_dicoms, config_file, tmp_path):
+    """Test sub-*/ses-* folders holding archives list their members for dcm2bids"""
+    session_dir = generated_dicoms / "sub-01" / "ses-01"
+    with zipfile.ZipFile(session_dir / "resend.zip", "w") as zf:
+        for path in sorted((session_dir / "scan_01").glob("*.dcm")):
+            zf.write(path, f"resend/{path.name}")
+
+    jobs = discover_sessions(generated_dicoms)
+    assert jobs[1].files is None
+    files = jobs[0].files
+    assert len(files) == 21
+    assert sum('!/' in f for f in files) == 3
+    assert not any(f.endswith('.zip') for f in files)
+
+    staged = []
+    def fake_dcm2bids(cmd, **kwargs):
+        source = Path(cmd[cmd.index('-d') + 1])
+        staged.extend(p for p in source.iterdir() if p.resolve().exists())
+
+    converter = DicomConverter(config_file, generated_dicoms, tmp_path / "dcm2bids")
+    with patch('src.converter.run_command', side_effect=fake_dcm2bids):
+        assert converter.convert_subjects(jobs[:1]).results[0].success
+    assert len(staged) == 21
@@ -0,0 +1,132 @@
+import pytest
+import asyncio
+from src.athena_client import AthenaQueryClient, AthenaQueryError
+
+class FakeAthena:
+    """Minimal in-memory stand-in for the boto3 Athena client"""
+    
+    def __init__(self, rows, states=('RUNNING', 'SUCCEEDED'), page_size=2):
+        self.rows = rows
+        self.states = list(states)
+        self.page_size = page_size
+        self.started = []
+        self.stopped = []
+        self.polls = 0
+    
+    def start_query_execution(self, **kwargs):
+        self.started.append(kwargs)
+        return {'QueryExecutionId': f'q{len(self.started)}'}
+    
+    def get_query_execution(self, QueryExecutionId):
+        self.polls += 1
+        state = self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        status = {'State': state}
+        if state == 'FAILED':
+            status['StateChangeReason'] = 'SYNTAX_ERROR'
+        return {'QueryExecution': {'Status': status}}
+    
+    def stop_query_execution(self, QueryExecutionId):
+        self.stopped.append(QueryExecutionId)
+    
+    def get_query_results(self, QueryExecutionId, NextToken=None):
+        header = ['subject_id', 'scan_count']
+        all_rows = [header] + [[s, str(c)] for s, c in self.rows]
+        start = int(NextToken or 0)
+        page = {
+            'ResultSet': {
+                'Rows': [
+                    {'Data': [{'VarCharValue': v} for v in row]}
+                    for row in all_rows[start:start + self.page_size]
+                ],
+                'ResultSetMetadata': {'ColumnInfo': [
+                    {'Name': 'subject_id', 'Type': 'varchar'},
+                    {'Name': 'scan_count', 'Type': 'bigint'},
+                ]},
+            }
+        }
+        if start + self.page_size < len(all_rows):
+            page['NextToken'] = str(start + self.page_size)
+        return page
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+    
+    def __call__(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def make_client(athena, clock, **kwargs):
+    return AthenaQueryClient(
+        athena, 's3://bucket/results/', database='dicom_database',
+        sleep=clock.sleep, clock=clock, **kwargs
+    )
+
+def test_query_polls_and_paginates():
+    """Test a query is polled with backoff and all pages are fetched"""
+    athena = FakeAthena(
+        [('ID_01', 3), ('ID_02', 5), ('ID_03', 7)],
+        states=('QUEUED', 'RUNNING', 'RUNNING', 'SUCCEEDED')
+    )
+    clock = FakeClock()
+    client = make_client(athena, clock, poll_interval=0.5)
+    
+    df = client.query('SELECT 1')
+    
+    assert list(df.columns) == ['subject_id', 'scan_count']
+    assert df['subject_id'].tolist() == ['ID_01', 'ID_02', 'ID_03']
+    assert df['scan_count'].tolist() == [3, 5, 7]
+    assert clock.sleeps == [0.5, 1.0, 2.0]
+    assert athena.started[0]['QueryExecutionContext'] == {'Database': 'dicom_database'}
+
+def test_query_results_are_cached_with_ttl():
+    """Test repeated queries reuse results until the TTL expires"""
+    athena = FakeAthena([('ID_01', 3)], states=('SUCCEEDED',))
+    clock = FakeClock()
+    client = make_client(athena, clock, cache_ttl=60)
+    
+    client.query('SELECT 1')
+    client.query('SELECT 1')
+    assert len(athena.started) == 1
+    
+    client.query('SELECT 2')
+    assert len(athena.started) == 2
+    
+    clock.now += 61
+    client.query('SELECT 1')
+    assert len(athena.started) == 3
+    
+    client.query('SELECT 1', use_cache=False)
+    assert len(athena.started) == 4
+
+def test_query_failure():
+    """Test failed queries raise with Athena's reason"""
+    athena = FakeAthena([], states=('RUNNING', 'FAILED'))
+    client = make_client(athena, FakeClock())
+    with pytest.raises(AthenaQueryError, match='SYNTAX_ERROR'):
+        client.query('SELEC 1')
+
+def test_query_timeout_cancels():
+    """Test queries running past the timeout are stopped"""
+    athena = FakeAthena([], states=('RUNNING',))
+    client = make_client(athena, FakeClock(), timeout=3)
+    with pytest.raises(AthenaQueryError, match='cancelled'):
+        client.query('SELECT 1')
+    assert athena.stopped == ['q1']
+
+def test_query_async():
+    """Test several queries can be awaited concurrently"""
+    athena = FakeAthena([('ID_01', 3)], states=('RUNNING', 'SUCCEEDED'))
+    client = AthenaQueryClient(athena, 's3://bucket/results/', poll_interval=0.001)
+    
+    async def run():
+        return await asyncio.gather(client.query_async('SELECT 1'), client.query_async('SELECT 2'))
+    
+    first, second = asyncio.run(run())
+    assert first['scan_count'].tolist() == [3]
+    assert second['scan_count'].tolist() == [3]
+    assert len(athena.started) == 2
@@ -0,0 +1,44 @@
+import pytest
+import json
+import bench
+
+def test_benchmark_records_history(tmp_path, monkeypatch):
+    """Test a tiny benchmark run times every stage and appends to the history"""
+    history = tmp_path / "history.json"
+    argv = [
+        '--subjects', '1', '--matrix', '8', '--slices', '2', '--series', 'T1_SAG',
+        '--workers', '1', '--history', str(history), '--work-dir', str(tmp_path / "work")
+    ]
+    
+    assert bench.main(argv) == 0
+    runs = json.loads(history.read_text())
+    assert len(runs) == 1
+    stages = {s['stage']: s for s in runs[0]['stages']}
+    assert list(stages) == ['generate', 'index', 'match', 'convert']
+    assert stages['generate']['files'] == 2
+    assert stages['index']['files_per_second'] > 0
+    assert stages['convert']['peak_rss_mb'] > 0
+    assert list((tmp_path / "work" / "bids_output").glob('**/*.nii.gz'))
+    
+    bench.main(argv)
+    assert len(json.loads(history.read_text())) == 2
+
+def test_find_regressions():
+    """Test throughput drops beyond the threshold are reported"""
+    previous = {'stages': [{'stage': 'index', 'files_per_second': 100.0},
+                           {'stage': 'match', 'files_per_second': 100.0}]}
+    current = {'stages': [{'stage': 'index', 'files_per_second': 50.0},
+                          {'stage': 'match', 'files_per_second': 95.0}]}
+    assert bench.find_regressions(previous, current) == [('index', 100.0, 50.0)]
+
+def test_peak_rss_is_per_stage():
+    """Test a light stage after a memory-hungry one reports its own peak"""
+    np = pytest.importorskip("numpy")
+    heavy = bench.timed('heavy', lambda: np.ones(40_000_000).sum())
+    light = bench.timed('light', lambda: sum(range(1000)))
+    with bench.StagePeakRss() as probe:
+        pass
+    if not probe.per_stage:
+        pytest.skip("per-stage RSS needs /proc/self/clear_refs")
+    assert heavy['peak_rss_mb'] > 300
+    assert light['peak_rss_mb'] < heavy['peak_rss_mb'] - 200
@@ -0,0 +1,74 @@
+import pytest
+import json
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+from src.cli import build_parser, main
+from src.header_index import DicomHeaderIndex
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+def test_validate_command(config_file, tmp_path):
+    """Test validate exits 0 for a good config and 1 for a broken one"""
+    assert main(['--log-file', '', 'validate', '--config', str(config_file)]) == 0
+
+    broken = tmp_path / "broken.json"
+    broken.write_text(json.dumps({"descriptions": [{"criteria": {}}]}))
+    assert main(['--log-file', '', 'validate', '--config', str(broken)]) == 1
+
+def test_validate_skips_heavy_imports(config_file):
+    """Test validate runs without importing pandas, numpy, pydicom or boto3"""
+    code = (
+        "import sys; from src.cli import main; "
+        f"status = main(['--log-file', '', 'validate', '--config', {str(config_file)!r}]); "
+        "heavy = [m for m in ('pandas', 'numpy', 'pydicom', 'boto3') if m in sys.modules]; "
+        "print(status, heavy)"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=PROJECT_DIR,
+        capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip().splitlines()[-1] == "0 []"
+
+def test_parser_rejects_bad_worker_count():
+    """Test worker counts must be positive"""
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(['convert', '--workers', '0'])
+
+def test_index_command(generated_dicoms):
+    """Test index builds the header index of dicom-dir"""
+    assert main(['--log-file', '', 'index', '--dicom-dir', str(generated_dicoms),
+                 '--workers', '1']) == 0
+    assert (Path(generated_dicoms) / DicomHeaderIndex.FILENAME).exists()
+
+def test_convert_dry_run(generated_dicoms):
+    """Test convert --dry-run reports without running dcm2bids"""
+    with patch('src.converter.run_command') as mock_run:
+        status = main(['--log-file', '', 'convert', '--dicom-dir', str(generated_dicoms),
+                       '--dry-run'])
+
+    assert status == 0
+    mock_run.assert_not_called()
+
+@patch('src.converter.run_command')
+def test_convert_command(mock_run, config_file, dicom_directory, tmp_path):
+    """Test convert passes options through to the converter"""
+    output_dir = tmp_path / "bids_output"
+    status = main([
+        '--log-file', '', 'convert', '--config', str(config_file),
+        '--dicom-dir', str(dicom_directory), '--output-dir', str(output_dir),
+        '--workers', '2', '--retries', '0'
+    ])
+
+    assert status == 0
+    mock_run.assert_called_once()
+    assert 'sub-01' in mock_run.call_args[0][0]
+
+    # A failing subject makes the command fail
+    mock_run.side_effect = subprocess.CalledProcessError(1, 'dcm2bids')
+    status = main([
+        '--log-file', '', 'convert', '--config', str(config_file),
+        '--dicom-dir', str(dicom_directory), '--output-dir', str(output_dir), '--force'
+    ])
+    assert status == 1
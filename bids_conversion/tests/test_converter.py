@@ -0,0 +1,208 @@
+import pytest
+from src.validator import ConfigValidator
+from src.converter import DicomConverter
+import subprocess
+from pathlib import Path
+from unittest.mock import patch
+
+def test_converter_initialization(config_file, dicom_directory, tmp_path):
+    """Test converter initialization"""
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    assert converter.config_path.exists()
+    assert converter.dicom_dir.exists()
+    assert converter.output_dir.exists()
+
+def test_converter_invalid_paths(tmp_path):
+    """Test converter with invalid paths"""
+    with pytest.raises(FileNotFoundError):
+        DicomConverter(
+            tmp_path / "nonexistent_config.json",
+            tmp_path / "nonexistent_dicoms",
+            tmp_path / "output"
+        )
+
+@patch('src.converter.run_command')
+def test_convert_subject(mock_run, config_file, dicom_directory, tmp_path):
+    """Test subject conversion"""
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    # Test successful conversion
+    converter.convert_subject('sub-01')
+    mock_run.assert_called_once()
+    
+    # Verify correct command construction
+    args = mock_run.call_args[0][0]
+    assert 'dcm2bids' in args
+    assert '-p' in args
+    assert 'sub-01' in args
+
+@patch('src.converter.run_command')
+def test_convert_subject_with_session(mock_run, config_file, dicom_directory, tmp_path):
+    """Test subject conversion with session"""
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    converter.convert_subject('sub-01', session='ses-01')
+    mock_run.assert_called_once()
+    
+    args = mock_run.call_args[0][0]
+    assert '-s' in args
+    assert 'ses-01' in args
+
+@patch('src.converter.run_command')
+def test_convert_subject_error(mock_run, config_file, dicom_directory, tmp_path):
+    """Test conversion error handling"""
+    mock_run.side_effect = subprocess.CalledProcessError(1, 'dcm2bids')
+    
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    with pytest.raises(subprocess.CalledProcessError):
+        converter.convert_subject('sub-01')
+
+def test_integration(config_file, dicom_directory, tmp_path):
+    """Integration test for the complete conversion process"""
+    output_dir = tmp_path / "bids_output"
+    
+    # First validate configuration
+    validator = ConfigValidator(config_file)
+    issues = validator.validate()
+    assert len(issues) == 0
+    
+    # Then test conversion
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    with patch('src.converter.run_command') as mock_run:
+        converter.convert_subject('sub-01')
+        assert mock_run.called
+
+@patch('src.converter.run_command')
+def test_convert_subjects(mock_run, config_file, dicom_directory, tmp_path):
+    """Test concurrent conversion of several subjects"""
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    report = converter.convert_subjects(
+        ['sub-01', ('sub-02', 'ses-01'), 'sub-03'], max_workers=2
+    )
+    
+    assert mock_run.call_count == 3
+    assert [r.subject_id for r in report.results] == ['sub-01', 'sub-02', 'sub-03']
+    assert report.results[1].session == 'ses-01'
+    assert len(report.succeeded) == 3
+    assert not report.failed
+
+@patch('src.converter.run_command')
+def test_convert_subjects_isolates_tmp_dirs(mock_run, config_file, dicom_directory, tmp_path):
+    """Test each subject gets its own scratch directory"""
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    converter.convert_subjects(['sub-01', 'sub-02'], max_workers=2)
+    
+    tmp_dirs = {c.kwargs['env']['TMPDIR'] for c in mock_run.call_args_list}
+    assert len(tmp_dirs) == 2
+
+@patch('src.converter.run_command')
+def test_convert_subjects_reports_failures(mock_run, config_file, dicom_directory, tmp_path):
+    """Test a failing subject does not stop the batch"""
+    def run(cmd, **kwargs):
+        if 'sub-02' in cmd:
+            raise subprocess.CalledProcessError(1, 'dcm2bids')
+    mock_run.side_effect = run
+    
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    report = converter.convert_subjects(['sub-01', 'sub-02', 'sub-03'])
+    
+    assert [r.subject_id for r in report.failed] == ['sub-02']
+    assert report.failed[0].error
+    assert len(report.succeeded) == 2
+
+def test_convert_subject_skips_unchanged(config_file, dicom_directory, tmp_path):
+    """Test re-runs skip subjects whose DICOMs and config are unchanged"""
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    def run(cmd, **kwargs):
+        anat = Path(cmd[cmd.index('-o') + 1]) / "sub-01" / "anat"
+        anat.mkdir(parents=True, exist_ok=True)
+        (anat / "sub-01_T1w.json").write_text("{}")
+    
+    with patch('src.converter.run_command', side_effect=run) as mock_run:
+        assert converter.convert_subject('sub-01') is True
+        assert converter.convert_subject('sub-01') is False
+        assert mock_run.call_count == 1
+        
+        # A new file under the subject invalidates the manifest entry
+        (dicom_directory / "sub-01" / "ses-01" / "extra.dcm").write_bytes(b"new")
+        assert converter.convert_subject('sub-01') is True
+        
+        # Forcing always reconverts
+        assert converter.convert_subject('sub-01', force=True) is True
+        assert mock_run.call_count == 3
+    
+    # The manifest survives across converter instances
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    with patch('src.converter.run_command') as mock_run:
+        report = converter.convert_subjects(['sub-01'])
+        assert not mock_run.called
+        assert len(report.skipped) == 1
+
+def test_convert_subject_without_output_keeps_previous(config_file, dicom_directory, tmp_path):
+    """Test a run that converts nothing does not replace the existing output"""
+    output_dir = tmp_path / "bids_output"
+    previous = output_dir / "sub-01" / "anat" / "sub-01_T1w.nii.gz"
+    previous.parent.mkdir(parents=True)
+    previous.write_bytes(b"converted earlier")
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    with patch('src.converter.run_command') as mock_run:
+        assert converter.convert_subject('sub-01', force=True) is True
+        assert previous.read_bytes() == b"converted earlier"
+        # Not recorded as current, so the next run tries again
+        assert converter.convert_subject('sub-01') is True
+        assert mock_run.call_count == 2
+
+@patch('src.converter.run_command')
+def test_convert_subjects_passes_timeouts(mock_run, config_file, dicom_directory, tmp_path):
+    """Test per-subject timeouts are capped by the batch deadline"""
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir, subject_timeout=600)
+    
+    converter.convert_subjects(['sub-01'], max_workers=1)
+    assert mock_run.call_args.kwargs['timeout'] == 600
+    
+    converter.convert_subjects(['sub-02'], max_workers=1, timeout=30)
+    assert 0 < mock_run.call_args.kwargs['timeout'] <= 30
+
+@patch('src.converter.run_command')
+def test_convert_subjects_reports_output_tail(mock_run, config_file, dicom_directory, tmp_path):
+    """Test timed-out subjects fail with the tail of their output"""
+    mock_run.side_effect = subprocess.TimeoutExpired('dcm2bids', 5, output='last line')
+    
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    report = converter.convert_subjects(['sub-01'])
+    
+    assert report.failed[0].output_tail == 'last line'
+    assert 'timed out' in report.failed[0].error
+
+@patch('src.converter.run_command')
+def test_convert_subjects_stops_at_deadline(mock_run, config_file, dicom_directory, tmp_path):
+    """Test subjects not started by the batch deadline are failed"""
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    
+    report = converter.convert_subjects(['sub-01', 'sub-02'], max_workers=1, timeout=0)
+    
+    assert not mock_run.called
+    assert len(report.failed) == 2
+    assert 'Batch timeout' in report.failed[0].error
+
+# Run tests with:
+# pytest tests/ -v --cov=src --cov-report=term-missing
\ No newline at end of file
@@ -0,0 +1,49 @@
+import pytest
+import numpy as np
+import pydicom
+from data_generator import DicomDataGenerator, phantom_volume
+
+def test_generate_subject_data_uids(generated_dicoms):
+    """Test every slice has its own SOPInstanceUID and series share a UID"""
+    files = sorted(generated_dicoms.glob('sub-01/ses-01/scan_01/*.dcm'))
+    datasets = [pydicom.dcmread(f) for f in files]
+    
+    assert len({ds.SOPInstanceUID for ds in datasets}) == 3
+    assert len({ds.SeriesInstanceUID for ds in datasets}) == 1
+    assert [ds.InstanceNumber for ds in datasets] == [1, 2, 3]
+    assert datasets[0].file_meta.MediaStorageSOPInstanceUID == datasets[0].SOPInstanceUID
+
+def test_generate_dataset(tmp_path):
+    """Test scale mode writes realistic, unique and ordered series in parallel"""
+    generator = DicomDataGenerator(tmp_path)
+    stats = generator.generate_dataset(
+        3, num_sessions=2, series_mix=['T1_SAG', 'T2_AX'],
+        matrix_size=32, slices=5, max_workers=2
+    )
+    
+    assert stats['series'] == 3 * 2 * 2
+    assert stats['files'] == 3 * 2 * 2 * 5
+    assert stats['bytes'] > stats['files'] * 32 * 32 * 2
+    
+    files = sorted(generator.raw_path.glob('**/*.dcm'))
+    assert len(files) == stats['files']
+    datasets = [pydicom.dcmread(f) for f in files]
+    assert len({ds.SOPInstanceUID for ds in datasets}) == len(files)
+    assert len({ds.SeriesInstanceUID for ds in datasets}) == stats['series']
+    assert {ds.PatientID for ds in datasets} == {'ID_0001', 'ID_0002', 'ID_0003'}
+    
+    series = sorted(generator.raw_path.glob('sub-0001/ses-01/scan_01/*.dcm'))
+    slices = [pydicom.dcmread(f) for f in series]
+    assert slices[0].SeriesDescription == 'T1_SAG'
+    assert [ds.InstanceNumber for ds in slices] == [1, 2, 3, 4, 5]
+    # Sagittal slices step along the slice normal, here the patient -x axis
+    assert [float(ds.ImagePositionPatient[0]) for ds in slices] == [2.5, 1.5, 0.5, -0.5, -1.5]
+    assert slices[0].pixel_array.shape == (32, 32)
+
+def test_phantom_volume():
+    """Test the phantom is reproducible and brighter inside the ellipsoid"""
+    volume = phantom_volume(16, 16, 8, seed=1)
+    assert volume.shape == (8, 16, 16)
+    assert volume.dtype == np.uint16
+    np.testing.assert_array_equal(volume, phantom_volume(16, 16, 8, seed=1))
+    assert volume[4, 8, 8] > volume[0, 0, 0]
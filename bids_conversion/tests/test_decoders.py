@@ -0,0 +1,58 @@
+import pytest
+import numpy as np
+import pydicom
+from pydicom.uid import ExplicitVRLittleEndian, JPEG2000Lossless, RLELossless
+from data_generator import DicomDataGenerator, series_template, set_pixel_data
+from src.decoders import FrameDecoder, choose_plugin
+from src.native_backend import NativeBackend
+
+def test_choose_plugin_follows_preference():
+    """Test the first installed plugin of the preference list is used"""
+    assert choose_plugin(RLELossless, ('not-installed', 'pydicom')) == 'pydicom'
+    assert choose_plugin(RLELossless, ('not-installed',)) == ''
+    # Native data has no plugins; pydicom reads it directly
+    assert FrameDecoder(['pydicom']).plugin(ExplicitVRLittleEndian) == ''
+
+@pytest.mark.parametrize('syntax', [RLELossless, JPEG2000Lossless])
+def test_decode_compressed_series(tmp_path, syntax):
+    """Test generated compressed slices decode losslessly on several threads"""
+    pytest.importorskip("PIL")
+    pixels = (np.arange(256, dtype=np.uint16).reshape(16, 16) * 13) % 4096
+    paths = []
+    for i in range(4):
+        ds = series_template(16, 16)
+        ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID = f'1.2.3.{i + 1}'
+        set_pixel_data(ds, pixels + i, syntax)
+        path = tmp_path / f'slice_{i}.dcm'
+        ds.save_as(path, enforce_file_format=True)
+        paths.append(path)
+
+    assert pydicom.dcmread(paths[0]).file_meta.TransferSyntaxUID == syntax
+    arrays = FrameDecoder(max_workers=3).decode_files(paths)
+    for i, array in enumerate(arrays):
+        np.testing.assert_array_equal(array, pixels + i)
+
+def test_decode_multiframe(tmp_path):
+    """Test a multi-frame file decodes to (frames, rows, columns)"""
+    frames = np.arange(3 * 4 * 5, dtype=np.uint16).reshape(3, 4, 5)
+    ds = series_template(4, 5).copy()
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID = '1.2.3.9'
+    ds.NumberOfFrames = 3
+    set_pixel_data(ds, frames, RLELossless)
+    ds.save_as(tmp_path / 'multi.dcm', enforce_file_format=True)
+
+    np.testing.assert_array_equal(FrameDecoder().decode_file(tmp_path / 'multi.dcm'), frames)
+
+def test_native_backend_converts_compressed(tmp_path, config_file):
+    """Test the native backend decodes compressed series through its decoder"""
+    generator = DicomDataGenerator(tmp_path)
+    generator.generate_dataset(
+        1, series_mix=['T1_SAG'], matrix_size=8, slices=3, max_workers=1,
+        transfer_syntax=RLELossless
+    )
+    decoder = FrameDecoder(['pydicom'], max_workers=2)
+    backend = NativeBackend(config_file, generator.raw_path, tmp_path / "out", decoder=decoder)
+
+    written = backend.convert('sub-0001', source_dir=generator.raw_path / 'sub-0001')
+    assert len(written) == 1
+    assert decoder.plugin(RLELossless) == 'pydicom'
@@ -0,0 +1,79 @@
+import pytest
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+from src.cli import main
+from src.dedup import deduplicate, find_duplicates
+from src.discovery import discover_sessions
+from src.header_index import open_index
+
+@pytest.fixture
+def resent_dicoms(generated_dicoms):
+    """Two slices of a sub-01 series resent into a second folder of the same session"""
+    session = generated_dicoms / "sub-01" / "ses-01"
+    original = session / "scan_01"
+    resend = session / "resend_01"
+    resend.mkdir()
+    for path in sorted(original.glob("*.dcm"))[:2]:
+        shutil.copy2(path, resend / path.name)
+    return generated_dicoms, original, resend
+
+def test_find_duplicates(resent_dicoms):
+    """Test the copies in the complete series folder are kept"""
+    dicom_dir, original, resend = resent_dicoms
+    with open_index(dicom_dir) as index:
+        report = find_duplicates(index)
+
+    assert report.instances == 2
+    assert report.duplicate_files == 2
+    assert all(Path(p).parent == original for p in report.canonical.values())
+    assert all(Path(p).parent == resend for p in report.excluded)
+    assert report.bytes_avoided == sum(p.stat().st_size for p in resend.glob("*.dcm"))
+    assert "2 duplicate file(s)" in report.summary()
+
+def test_find_duplicates_below_paths(resent_dicoms):
+    """Test restricting to some paths still finds every copy of their instances"""
+    dicom_dir, original, resend = resent_dicoms
+    with open_index(dicom_dir) as index:
+        assert find_duplicates(index, paths=['sub-02']).instances == 0
+        report = find_duplicates(index, paths=['sub-01/ses-01/resend_01'])
+    assert report.instances == 2
+    assert all(Path(p).parent == resend for p in report.excluded)
+
+def test_deduplicate_jobs(resent_dicoms):
+    """Test only the affected session gets an explicit, duplicate-free file list"""
+    dicom_dir, _, resend = resent_dicoms
+    with open_index(dicom_dir) as index:
+        jobs = discover_sessions(dicom_dir, index=index)
+        deduplicated, report = deduplicate(jobs, index)
+
+    assert [job.subject_id for job in deduplicated] == ['sub-01', 'sub-02']
+    assert len(deduplicated[0].files) == 18
+    assert not any(str(resend) in f for f in deduplicated[0].files)
+    assert deduplicated[1].files is None
+
+    # A session holding nothing but copies is dropped
+    sub_03 = dicom_dir / "sub-03" / "ses-01"
+    shutil.copytree(resend, sub_03 / "resend_01")
+    with open_index(dicom_dir) as index:
+        jobs = discover_sessions(dicom_dir, index=index)
+        deduplicated, report = deduplicate(jobs, index)
+    assert [job.subject_id for job in deduplicated] == ['sub-01', 'sub-02']
+    assert report.dropped_jobs == ['sub-03/ses-01']
+
+def test_convert_skips_duplicates(resent_dicoms, config_file, tmp_path):
+    """Test convert stages only canonical copies unless --no-dedup is given"""
+    dicom_dir, _, _ = resent_dicoms
+    staged = []
+    def fake_dcm2bids(cmd, **kwargs):
+        source = Path(cmd[cmd.index('-d') + 1])
+        staged.append(len(list(source.rglob("*.dcm"))))
+
+    argv = ['--log-file', '', 'convert', '--config', str(config_file),
+            '--dicom-dir', str(dicom_dir), '--output-dir', str(tmp_path / "out"),
+            '--workers', '1', '--force']
+    with patch('src.converter.run_command', side_effect=fake_dcm2bids):
+        assert main(argv) == 0
+        assert main(argv + ['--no-dedup']) == 0
+    assert staged[0] == 18
+    assert staged[2] == 20
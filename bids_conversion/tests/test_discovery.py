@@ -0,0 +1,119 @@
+import pytest
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+from src.converter import DicomConverter
+from src.discovery import SessionJob, bids_label, discover_sessions, normalize_date
+from src.header_index import open_index
+
+def test_discover_directories(generated_dicoms):
+    """Test sub-*/ses-* folders become jobs"""
+    jobs = discover_sessions(generated_dicoms)
+    
+    assert [(j.subject_id, j.session) for j in jobs] == [
+        ('sub-01', 'ses-01'), ('sub-02', 'ses-01')
+    ]
+    assert jobs[0].source_dir == generated_dicoms / "sub-01" / "ses-01"
+    assert jobs[0].files is None
+
+def test_discover_directories_date_filter(generated_dicoms):
+    """Test date filters use the indexed StudyDate"""
+    with open_index(generated_dicoms) as index:
+        study_date = index.distinct('study_date')[0]
+        jobs = discover_sessions(generated_dicoms, index=index, date_from=study_date)
+        assert len(jobs) == 2
+        assert jobs[0].study_dates == (study_date,)
+        assert jobs[0].patient_id == 'ID_01'
+    
+    assert discover_sessions(generated_dicoms, date_to='2000-01-01') == []
+
+def test_discover_headers_flat_archive(generated_dicoms, tmp_path):
+    """Test PatientID/StudyDate grouping when folders are not BIDS-like"""
+    flat = tmp_path / "flat"
+    flat.mkdir()
+    for i, path in enumerate(sorted(generated_dicoms.rglob('*.dcm'))):
+        shutil.copy(path, flat / f"{i:03d}.dcm")
+    
+    jobs = discover_sessions(flat)
+    assert [j.subject_id for j in jobs] == ['sub-ID01', 'sub-ID02']
+    assert jobs[0].session.startswith('ses-')
+    # Both subjects share the folder, so each job lists its own files
+    assert jobs[0].source_dir == flat
+    assert len(jobs[0].files) == 18
+
+def test_discover_headers_skips_missing_patient_id(generated_dicoms, tmp_path, caplog):
+    """Test files without a PatientID are skipped, not merged into one subject"""
+    import pydicom
+    
+    flat = tmp_path / "flat"
+    flat.mkdir()
+    for i, path in enumerate(sorted(generated_dicoms.rglob('*.dcm'))):
+        ds = pydicom.dcmread(path)
+        if ds.PatientID == 'ID_02':
+            del ds.PatientID
+        ds.save_as(flat / f"{i:03d}.dcm")
+    
+    jobs = discover_sessions(flat)
+    assert [j.subject_id for j in jobs] == ['sub-ID01']
+    assert len(jobs[0].files) == 18
+    assert "18 file(s) without a PatientID" in caplog.text
+
+def test_discover_headers_exclusive_folders(generated_dicoms):
+    """Test jobs in their own folders point at that folder"""
+    jobs = discover_sessions(generated_dicoms, method='headers')
+    assert jobs[1].source_dir == generated_dicoms / "sub-02" / "ses-01"
+    assert jobs[1].files is None
+
+def test_discover_sessions_below_paths(generated_dicoms, tmp_path):
+    """Test rediscovering only the sessions of some paths matches a full discovery"""
+    scan = generated_dicoms / "sub-02" / "ses-01" / "scan_03"
+    full = discover_sessions(generated_dicoms)
+    assert discover_sessions(generated_dicoms, paths=[scan]) == full[1:]
+    assert discover_sessions(generated_dicoms, paths=["sub-01"]) == full[:1]
+    assert discover_sessions(generated_dicoms, paths=["sub-03"]) == []
+
+    flat = tmp_path / "flat"
+    flat.mkdir()
+    for i, path in enumerate(sorted(generated_dicoms.rglob('*.dcm'))):
+        shutil.copy(path, flat / f"{i:03d}.dcm")
+    with open_index(flat) as index:
+        full = discover_sessions(flat, index=index)
+        partial = discover_sessions(flat, index=index, paths=[flat / "020.dcm"])
+    assert partial == full[1:]
+    assert len(partial[0].files) == 18
+
+def test_discovery_helpers():
+    """Test label and date normalization"""
+    assert bids_label('ID_01/a') == 'ID01a'
+    assert bids_label(None) == bids_label('') == 'unknown'
+    assert normalize_date('2024-01-31') == '20240131'
+    with pytest.raises(ValueError):
+        normalize_date('31/01/2024')
+    with pytest.raises(ValueError):
+        discover_sessions('.', method='magic')
+
+def test_converter_uses_subject_folder(config_file, dicom_directory, tmp_path):
+    """Test dcm2bids only scans the subject's own folder"""
+    converter = DicomConverter(config_file, dicom_directory, tmp_path / "out")
+    
+    with patch('src.converter.run_command') as mock_run:
+        converter.convert_subjects(discover_sessions(dicom_directory))
+    cmd = mock_run.call_args[0][0]
+    assert cmd[cmd.index('-d') + 1] == str(dicom_directory / "sub-01" / "ses-01")
+    assert cmd[cmd.index('-s') + 1] == 'ses-01'
+
+def test_converter_stages_shared_files(config_file, dicom_directory, tmp_path):
+    """Test jobs with a file list get a staging folder of just those files"""
+    converter = DicomConverter(config_file, dicom_directory, tmp_path / "out")
+    sample = dicom_directory / "sub-01" / "ses-01" / "sample.dcm"
+    staged = []
+    
+    def run(cmd, **kwargs):
+        source = cmd[cmd.index('-d') + 1]
+        staged.extend(p.name for p in sorted(Path(source).iterdir()))
+    
+    job = SessionJob('sub-ID01', None, dicom_directory, files=[str(sample)])
+    with patch('src.converter.run_command', side_effect=run):
+        report = converter.convert_subjects([job])
+    assert report.results[0].success
+    assert staged == ['000000_sample.dcm']
@@ -0,0 +1,59 @@
+import pytest
+import json
+from src.dry_run import dry_run
+from src.header_index import open_index
+from src.test_dicom_converter import BidsConfigValidator
+
+def test_dry_run_reports_every_series(generated_dicoms):
+    """Test per-series matching, label counts and projected outputs"""
+    report = dry_run('config/config.json', generated_dicoms)
+    
+    # 2 subjects x 6 scans, all matched by the default config
+    assert len(report.series) == 12
+    assert report.ok
+    assert report.series[0]['files'] == 3
+    assert report.label_counts['anat/acq-sag_T1w'] == 2
+    assert sum(report.label_counts.values()) == 12
+    assert report.projected_files == 24
+    assert report.summary().startswith("12 series: 12 matched")
+
+def write_config(tmp_path, config):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(config))
+    return config_path
+
+def test_dry_run_anchors_regular_expressions(generated_dicoms, tmp_path):
+    """Test "re" patterns match at the start of the description, as in dcm2bids"""
+    config_path = write_config(tmp_path, {"searchMethod": "re", "descriptions": [
+        {"dataType": "anat", "criteria": {"SeriesDescription": "T1"}, "modalityLabel": "T1w"},
+        {"dataType": "anat", "criteria": {"SeriesDescription": "SAG"}, "modalityLabel": "sag"},
+    ]})
+    
+    report = dry_run(config_path, generated_dicoms)
+    assert not report.ok
+    # 'SAG' does not match 'T1_SAG' or 'T2_SAG', which dcm2bids would skip
+    assert report.ambiguous == []
+    assert {s['series_desc'] for s in report.unmatched} == {
+        'T2_SAG', 'T2_AX', 'PD_SAG', 'PD_AX'
+    }
+    assert report.label_counts == {'anat/T1w': 4}
+
+def test_dry_run_flags_unmatched_and_ambiguous(generated_dicoms, tmp_path):
+    """Test series matching zero or several wildcard descriptions are reported"""
+    # Without searchMethod, dcm2bids matches shell-style wildcards
+    config_path = write_config(tmp_path, {"descriptions": [
+        {"dataType": "anat", "criteria": {"SeriesDescription": "T1*"}, "modalityLabel": "T1w"},
+        {"dataType": "anat", "criteria": {"SeriesDescription": "*SAG"}, "modalityLabel": "sag"},
+        {"dataType": "anat", "criteria": {"SeriesDescription": "T2"}, "modalityLabel": "T2w"},
+    ]})
+    
+    with open_index(generated_dicoms) as index:
+        report = BidsConfigValidator(config_path).dry_run(generated_dicoms, index=index)
+    
+    assert not report.ok
+    assert {s['series_desc'] for s in report.ambiguous} == {'T1_SAG'}
+    assert {s['series_desc'] for s in report.unmatched} == {'T2_AX', 'PD_AX'}
+    assert report.label_counts == {'anat/T1w': 2, 'anat/sag': 4}
+    
+    df = report.to_dataframe()
+    assert set(df.loc[df.series_desc == 'T1_SAG', 'match_count']) == {2}
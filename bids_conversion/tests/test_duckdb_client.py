@@ -0,0 +1,73 @@
+import pytest
+import asyncio
+import shutil
+from src.export import MetadataExporter, dashboard_queries
+from src.header_index import open_index
+
+duckdb = pytest.importorskip("duckdb")
+pytest.importorskip("moto")
+pytest.importorskip("pyarrow")
+
+from src.duckdb_client import DuckDBQueryClient
+
+@pytest.fixture
+def exported(generated_dicoms, tmp_path, s3):
+    """The metadata export of generated_dicoms, copied locally like `aws s3 sync`"""
+    root = tmp_path / "processed_data"
+    with open_index(generated_dicoms) as index:
+        MetadataExporter(s3, "test-bucket", spool_dir=tmp_path).export_index(index)
+    for obj in s3.list_objects_v2(Bucket="test-bucket")["Contents"]:
+        path = tmp_path / obj["Key"]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        s3.download_file("test-bucket", obj["Key"], str(path))
+    return root
+
+def test_dashboard_queries(exported):
+    """Test the Athena dashboard queries run unchanged over the local export"""
+    queries = dashboard_queries()
+    with DuckDBQueryClient(exported) as client:
+        scan_counts = client.query(queries['scan_counts'])
+        assert sorted(scan_counts['subject_id'].unique()) == ['ID_01', 'ID_02']
+        assert scan_counts['scan_count'].sum() == 36
+
+        sessions = client.query(queries['sessions'])
+        assert list(sessions['series_count']) == [6, 6]
+        assert sessions['study_date'].map(type).eq(str).all()
+
+        modalities = client.query(queries['modalities'])
+        assert modalities.to_dict('records') == [
+            {'modality': 'MR', 'file_count': 36, 'series_count': 12}
+        ]
+
+def test_query_cache(exported):
+    """Test results are cached per query until the TTL expires"""
+    now = [0.0]
+    query = dashboard_queries()['scan_counts']
+    with DuckDBQueryClient(exported, cache_ttl=60, clock=lambda: now[0]) as client:
+        first = client.query(query)
+        # Cached results are copies, and survive a removed partition
+        first.loc[0, 'scan_count'] = -1
+        for path in (exported / "scan_counts").glob("subject_id=ID_02/*/*.parquet"):
+            path.unlink()
+        assert client.query(query)['scan_count'].sum() == 36
+
+        now[0] = 61.0
+        assert client.query(query)['scan_count'].sum() == 18
+        results = asyncio.run(client.query_async(query, use_cache=False))
+        assert list(results['subject_id'].unique()) == ['ID_01']
+
+def test_empty_root(exported, tmp_path):
+    """Test queries before the first export return empty, typed results"""
+    root = tmp_path / "not_exported_yet"
+    root.mkdir()
+    queries = dashboard_queries()
+    with DuckDBQueryClient(root, cache_ttl=0) as client:
+        scan_counts = client.query(queries['scan_counts'])
+        assert scan_counts.empty
+        assert list(scan_counts.columns) == ['subject_id', 'series_desc', 'scan_count']
+        assert client.query(queries['modalities']).empty
+
+        # Partitions exported later show up without reconnecting
+        shutil.copytree(exported / "scan_counts", root / "scan_counts")
+        assert client.query(queries['scan_counts'])['scan_count'].sum() == 36
+        assert client.query(queries['modalities']).empty
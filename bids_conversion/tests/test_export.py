@@ -0,0 +1,169 @@
+import pytest
+import io
+import json
+import os
+from src.export import (
+    STATE_KEY, MetadataExporter, add_partition_statements, athena_ddl,
+    drop_partition_statements, parse_partition_path, partition_path
+)
+from src.header_index import open_index
+
+pytest.importorskip("moto")
+pq = pytest.importorskip("pyarrow.parquet")
+
+def read_parquet(s3, key):
+    body = s3.get_object(Bucket="test-bucket", Key=key)["Body"].read()
+    return pq.read_table(io.BytesIO(body))
+
+def test_partition_path():
+    """Test partition values are Hive-style and escaped"""
+    assert partition_path(('ID_01', '20240101')) == 'subject_id=ID_01/study_date=20240101'
+    assert partition_path(('a/b', None)) == (
+        'subject_id=a%2Fb/study_date=__HIVE_DEFAULT_PARTITION__'
+    )
+    assert parse_partition_path(partition_path(('a/b', None))) == ('a/b', None)
+
+def test_export_partitions_and_row_groups(s3, tmp_path):
+    """Test records are split per partition into bounded row groups"""
+    records = [
+        {'patient_id': subject, 'study_date': '20240101', 'series_description': 'T1_SAG',
+         'series_number': '1', 'series_instance_uid': None, 'modality': 'MR',
+         'file_path': f'/data/{subject}/{i}.dcm', 'size': 100 + i}
+        for subject in ('ID_01', 'ID_02') for i in range(25)
+    ]
+    exporter = MetadataExporter(
+        s3, "test-bucket", prefix="meta", row_group_size=10, spool_dir=tmp_path
+    )
+    stats = exporter.export(records)
+    
+    assert stats['rows'] == 50
+    assert stats['files'] == 6
+    assert stats['partitions'] == [('ID_01', '20240101'), ('ID_02', '20240101')]
+    data_key = 'meta/dicom_metadata/subject_id=ID_01/study_date=20240101/part-00000.parquet'
+    counts_key = 'meta/scan_counts/subject_id=ID_01/study_date=20240101/part-00000.parquet'
+    assert data_key in stats['keys'] and counts_key in stats['keys']
+    
+    table = read_parquet(s3, data_key)
+    assert table.num_rows == 25
+    assert pq.ParquetFile(io.BytesIO(
+        s3.get_object(Bucket="test-bucket", Key=data_key)["Body"].read()
+    )).num_row_groups == 3
+    assert table.column('file_size').to_pylist()[:2] == [100, 101]
+    assert table.schema.field('series_number').type == 'int32'
+    
+    counts = read_parquet(s3, counts_key).to_pylist()
+    assert counts == [
+        {'series_desc': 'T1_SAG', 'scan_count': 25, 'series_count': 1,
+         'total_bytes': sum(range(100, 125))}
+    ]
+    modality_key = 'meta/modality_counts/subject_id=ID_01/study_date=20240101/part-00000.parquet'
+    assert read_parquet(s3, modality_key).to_pylist() == [
+        {'modality': 'MR', 'file_count': 25, 'series_count': 1}
+    ]
+    # Spool files are removed once uploaded
+    assert list(tmp_path.iterdir()) == []
+
+def test_export_uses_multipart(s3, tmp_path):
+    """Test large partitions are uploaded in several parts"""
+    records = [
+        {'patient_id': 'ID_01', 'study_date': '20240101', 'series_description': 'T1_SAG',
+         'series_number': '1', 'series_instance_uid': None, 'modality': 'MR',
+         'file_path': os.urandom(48).hex(), 'size': i}
+        for i in range(80000)
+    ]
+    exporter = MetadataExporter(s3, "test-bucket", part_size=5 * 1024 * 1024, spool_dir=tmp_path)
+    stats = exporter.export(records)
+    
+    assert stats['bytes'] > 5 * 1024 * 1024
+    head = s3.head_object(Bucket="test-bucket", Key=exporter.table_key(
+        'dicom_metadata', ('ID_01', '20240101')
+    ))
+    assert head['ETag'].strip('"').endswith('-2')
+
+def test_export_index(s3, generated_dicoms):
+    """Test the header index can be exported directly"""
+    exporter = MetadataExporter(s3, "test-bucket")
+    with open_index(generated_dicoms) as index:
+        stats = exporter.export_index(index)
+        study_dates = index.distinct('study_date')
+    
+    assert stats['rows'] == 36
+    assert len(stats['partitions']) == 2
+    partition = partition_path(('ID_02', study_dates[0]))
+    assert f"processed_data/dicom_metadata/{partition}/part-00000.parquet" in stats['keys']
+
+def test_export_is_incremental(s3, generated_dicoms):
+    """Test re-exports only upload changed partitions and prune removed ones"""
+    exporter = MetadataExporter(s3, "test-bucket")
+    with open_index(generated_dicoms) as index:
+        first = exporter.export_index(index)
+        again = exporter.export_index(index)
+    assert len(first['partitions']) == 2
+    assert again['partitions'] == [] and again['unchanged'] == 2
+    
+    records = [
+        {'patient_id': 'ID_NEW', 'study_date': '20240102', 'series_description': 'T2_AX',
+         'series_number': '2', 'series_instance_uid': '1.2.3', 'modality': 'MR',
+         'file_path': '/x.dcm', 'size': 10},
+    ]
+    stats = exporter.export(records, prune=True)
+    assert stats['partitions'] == [('ID_NEW', '20240102')]
+    assert stats['removed'] == 2
+    assert [p[0] for p in stats['removed_partitions']] == ['ID_01', 'ID_02']
+    listed = s3.list_objects_v2(Bucket="test-bucket", Prefix="processed_data/scan_counts/")
+    assert [o['Key'] for o in listed['Contents']] == [
+        exporter.table_key('scan_counts', ('ID_NEW', '20240102'))
+    ]
+
+def test_older_state_rewrites_partitions(s3, generated_dicoms):
+    """Test state written before a table was added re-uploads every partition"""
+    exporter = MetadataExporter(s3, "test-bucket")
+    with open_index(generated_dicoms) as index:
+        exporter.export_index(index)
+        state = exporter.load_state()
+        s3.put_object(
+            Bucket="test-bucket", Key=f"{exporter.prefix}/{STATE_KEY}",
+            Body=json.dumps({'version': 1, 'partitions': state}).encode()
+        )
+        again = exporter.export_index(index)
+    assert len(again['partitions']) == 2 and again['unchanged'] == 0
+
+def test_export_rejects_ungrouped_records(s3):
+    """Test a partition reappearing after another one is an error"""
+    records = [
+        {'patient_id': subject, 'study_date': '20240101', 'size': 1}
+        for subject in ('A', 'B', 'A')
+    ]
+    with pytest.raises(ValueError):
+        MetadataExporter(s3, "test-bucket").export(records)
+
+def test_athena_statements():
+    """Test the DDL declares every partitioned table"""
+    ddl = athena_ddl("bucket")
+    assert "LOCATION 's3://bucket/processed_data/scan_counts/'" in ddl[2]
+    assert "LOCATION 's3://bucket/processed_data/modality_counts/'" in ddl[3]
+    assert all('PARTITIONED BY (subject_id string, study_date string)' in s for s in ddl[1:])
+    
+    statements = add_partition_statements([("O'Brien", '20240101')], "bucket")
+    assert len(statements) == 3
+    assert "subject_id = 'O''Brien'" in statements[0]
+    assert (
+        "LOCATION 's3://bucket/processed_data/dicom_metadata/"
+        "subject_id=O%27Brien/study_date=20240101/'" in statements[0]
+    )
+    assert add_partition_statements([], "bucket") == []
+
+def test_partition_statements_are_batched():
+    """Test large partition lists are split into bounded statements"""
+    partitions = [(f'ID_{i:03d}', '20240101') for i in range(250)]
+    statements = add_partition_statements(partitions, "bucket", batch_size=100)
+    assert len(statements) == 9
+    assert [s.count('PARTITION (') for s in statements[:3]] == [100, 100, 50]
+    
+    drops = drop_partition_statements(partitions[:3], batch_size=2)
+    assert drops[0] == (
+        "ALTER TABLE dicom_database.dicom_metadata DROP IF EXISTS "
+        "PARTITION (subject_id = 'ID_000', study_date = '20240101'), "
+        "PARTITION (subject_id = 'ID_001', study_date = '20240101')"
+    )
+    assert len(drops) == 6
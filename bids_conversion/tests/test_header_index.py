@@ -0,0 +1,118 @@
+import pytest
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from src.header_index import DicomHeaderIndex, _ordered_map, extract_headers, open_index
+from src.test_dicom_converter import BidsConfigValidator
+
+def test_index_scan(generated_dicoms, tmp_path):
+    """Test the index reads the needed tags from every file"""
+    index = DicomHeaderIndex(generated_dicoms, index_path=tmp_path / "index.sqlite")
+    stats = index.refresh()
+    
+    # 2 subjects x 6 scans x 3 slices
+    assert (stats['files'], stats['read'], stats['removed']) == (36, 36, 0)
+    assert index.distinct('patient_id') == ['ID_01', 'ID_02']
+    assert 'T1_SAG' in index.series_descriptions()
+    
+    records = index.records(series_description='T2_AX')
+    assert len(records) == 6
+    assert records[0]['modality'] == 'MR'
+    assert records[0]['file_path'].endswith('.dcm')
+    # Numeric tags come back typed from INTEGER/REAL columns
+    assert isinstance(records[0]['series_number'], int)
+    assert records[0]['image_rows'] == records[0]['image_columns'] == 16
+    assert records[0]['echo_time'] is None
+    index.close()
+
+def test_index_refresh_is_incremental(generated_dicoms):
+    """Test refreshes only re-read new or changed files"""
+    with open_index(generated_dicoms) as index:
+        assert index.refresh()['read'] == 0
+        
+        victim = sorted(generated_dicoms.glob('**/*.dcm'))[0]
+        victim.unlink()
+        (generated_dicoms / "notes.dcm").write_bytes(b"not dicom")
+        
+        stats = index.refresh()
+        assert (stats['files'], stats['read'], stats['removed']) == (36, 1, 1)
+        # Unreadable files are remembered but never returned
+        assert len(index.records()) == 35
+        assert index.refresh()['read'] == 0
+
+def test_refresh_below_paths(generated_dicoms):
+    """Test a partial refresh only walks, reads and removes below its paths"""
+    with open_index(generated_dicoms) as index:
+        scan = generated_dicoms / "sub-01" / "ses-01" / "scan_01"
+        shutil.copy(scan / "slice_01.dcm", scan / "slice_04.dcm")
+        (scan / "slice_02.dcm").unlink()
+        other = generated_dicoms / "sub-02" / "ses-01" / "scan_01"
+        shutil.copy(other / "slice_01.dcm", other / "slice_04.dcm")
+
+        stats = index.refresh(paths=[scan])
+        assert (stats['read'], stats['removed'], stats['files']) == (1, 1, 3)
+        assert index.count() == 36
+        assert index.count(['sub-01/ses-01/scan_01']) == 3
+        assert index.count(['sub-01/ses-01/scan_0']) == 0
+
+        assert index.refresh()['read'] == 1
+        assert index.count() == 37
+
+def test_index_rejects_unknown_columns(generated_dicoms):
+    """Test filtering on a column the index does not have"""
+    with open_index(generated_dicoms) as index:
+        with pytest.raises(ValueError):
+            index.records(PatientName='x')
+
+def test_analyze_dicom_directory_uses_index(generated_dicoms):
+    """Test the config analysis runs from the header index"""
+    validator = BidsConfigValidator('config/config.json')
+    df = validator.analyze_dicom_directory(generated_dicoms)
+    
+    assert sorted(df['series_desc']) == ['PD_AX', 'PD_SAG', 'T1_AX', 'T1_SAG', 'T2_AX', 'T2_SAG']
+    t1_sag = df[df['series_desc'] == 'T1_SAG']['matches'].iloc[0]
+    assert [m['modality'] for m in t1_sag] == ['acq-sag_T1w']
+
+def test_extract_headers_parallel(generated_dicoms):
+    """Test process-pool extraction matches serial extraction"""
+    paths = sorted(generated_dicoms.glob('**/*.dcm'))
+    
+    serial = list(extract_headers(paths, max_workers=1, chunk_size=5))
+    parallel = list(extract_headers(paths, max_workers=2, chunk_size=5))
+    
+    assert [chunk for chunk, _ in parallel] == [chunk for chunk, _ in serial]
+    assert [cols for _, cols in parallel] == [cols for _, cols in serial]
+    assert sum(len(chunk) for chunk, _ in parallel) == 36
+    assert all(all(cols['readable']) for _, cols in parallel)
+
+def test_parallel_refresh(generated_dicoms, tmp_path):
+    """Test a parallel refresh builds the same index as a serial one"""
+    with DicomHeaderIndex(generated_dicoms, tmp_path / "serial.sqlite") as serial:
+        serial.refresh(max_workers=1)
+        expected = serial.records()
+    
+    with DicomHeaderIndex(generated_dicoms, tmp_path / "parallel.sqlite") as parallel:
+        stats = parallel.refresh(max_workers=2, chunk_size=4)
+        assert stats['read'] == 36
+        assert stats['files_per_second'] > 0
+        assert parallel.records() == expected
+
+def test_ordered_map_bounds_in_flight_tasks():
+    """Test at most window tasks are submitted ahead of the consumer"""
+    lock = threading.Lock()
+    submitted, consumed, ahead = [0], [0], []
+    def task(i):
+        return i * 2
+    class CountingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, *args):
+            with lock:
+                submitted[0] += 1
+                ahead.append(submitted[0] - consumed[0])
+            return super().submit(fn, *args)
+    with CountingExecutor(max_workers=2) as executor:
+        results = []
+        for value in _ordered_map(executor, task, range(50), window=4):
+            consumed[0] += 1
+            results.append(value)
+    assert results == [i * 2 for i in range(50)]
+    assert max(ahead) <= 4
@@ -0,0 +1,102 @@
+import pytest
+import json
+import logging
+from unittest.mock import patch
+from src.converter import DicomConverter
+from src.instrumentation import MAXRSS_SCALE, MetricsRecorder, escape_label, tree_stats
+
+def test_tree_stats_counts_outputs(tmp_path):
+    """Test output sizes and NIfTI/sidecar counts"""
+    (tmp_path / "anat").mkdir()
+    (tmp_path / "anat" / "a.nii.gz").write_bytes(b"x" * 10)
+    (tmp_path / "anat" / "a.json").write_text("{}")
+    (tmp_path / "b.nii").write_bytes(b"y" * 5)
+
+    assert tree_stats(tmp_path) == (17, 2, 1)
+    assert tree_stats(tmp_path / "missing") == (0, 0, 0)
+
+def test_recorder_logs_json_and_writes_prometheus(tmp_path, caplog):
+    """Test a finished measurement is logged as JSON and exported"""
+    output_dir = tmp_path / "sub-01"
+    metrics_path = tmp_path / "metrics" / "bids.prom"
+    recorder = MetricsRecorder(metrics_path)
+
+    measurement = recorder.start('sub-01', 'ses-01', 'native', output_dir)
+    (output_dir / "anat").mkdir(parents=True)
+    (output_dir / "anat" / "sub-01_T1w.nii.gz").write_bytes(b"x" * 100)
+    (output_dir / "anat" / "sub-01_T1w.json").write_text("{}")
+    with caplog.at_level(logging.INFO, logger='src.instrumentation'):
+        metrics = recorder.finish(measurement, success=True, bytes_read=4096)
+
+    assert metrics.bytes_written == 102
+    assert metrics.nifti_count == 1
+    assert metrics.series_count == 1
+    assert metrics.wall_seconds >= 0
+
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line['event'] == 'subject_converted'
+    assert line['subject_id'] == 'sub-01'
+    assert line['bytes_read'] == 4096
+    assert line['success'] is True
+
+    text = metrics_path.read_text()
+    assert '# TYPE bids_conversion_wall_seconds gauge' in text
+    assert ('bids_conversion_bytes_read{subject="sub-01",session="ses-01",'
+            'backend="native"} 4096.0') in text
+    assert 'bids_conversion_success{subject="sub-01"' in text
+    assert not (tmp_path / "metrics" / "bids.prom.tmp").exists()
+
+def test_escape_label():
+    """Test Prometheus label values are escaped"""
+    assert escape_label('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+@patch('src.converter.run_command')
+def test_converter_reports_metrics(mock_run, config_file, dicom_directory, tmp_path):
+    """Test batch results carry per-subject metrics"""
+    metrics_path = tmp_path / "bids.prom"
+    converter = DicomConverter(
+        config_file, dicom_directory, tmp_path / "bids_output", metrics_path=metrics_path
+    )
+
+    report = converter.convert_subjects(['sub-01'], max_workers=1)
+    metrics = report.results[0].metrics
+    assert metrics['success'] is True
+    assert metrics['backend'] == 'dcm2bids'
+    assert metrics['bytes_read'] > 0
+    assert 'subject="sub-01"' in metrics_path.read_text()
+
+@patch('src.converter.run_command')
+def test_converter_records_failed_metrics(mock_run, config_file, dicom_directory, tmp_path):
+    """Test failed conversions are still measured"""
+    mock_run.side_effect = RuntimeError("boom")
+    converter = DicomConverter(config_file, dicom_directory, tmp_path / "bids_output")
+
+    with pytest.raises(RuntimeError):
+        converter.convert_subject('sub-01')
+    assert converter.metrics.latest[('sub-01', None)].success is False
+
+def test_native_conversion_counts_outputs(generated_dicoms, tmp_path):
+    """Test series and NIfTI counts for an in-process conversion"""
+    converter = DicomConverter(
+        'config/config.json', generated_dicoms, tmp_path / "bids_output", backend='native'
+    )
+
+    converter.convert_subject('sub-01', session='ses-01')
+    metrics = converter.metrics.latest[('sub-01', 'ses-01')]
+    assert metrics.nifti_count == 6
+    assert metrics.series_count == 6
+    assert metrics.bytes_written > 0
+    assert metrics.cpu_seconds > 0
+
+def test_recorder_uses_child_usage():
+    """Test child CPU and RSS come from the conversion's own child"""
+    import resource
+    
+    recorder = MetricsRecorder()
+    metrics = recorder.finish(recorder.start('sub-01'), success=True)
+    assert metrics.child_cpu_seconds == 0 and metrics.child_max_rss_bytes == 0
+    
+    usage = resource.struct_rusage((1.5, 0.5, 2048) + (0,) * 13)
+    metrics = recorder.finish(recorder.start('sub-01'), success=True, child_usage=usage)
+    assert metrics.child_cpu_seconds == 2.0
+    assert metrics.child_max_rss_bytes == 2048 * MAXRSS_SCALE
@@ -0,0 +1,160 @@
+import pytest
+import json
+import os
+import subprocess
+from unittest.mock import patch
+from src.converter import DicomConverter
+from src.journal import RunJournal, is_transient
+
+def test_journal_survives_reload(tmp_path):
+    """Test the latest state per key is recovered, ignoring a torn line"""
+    path = tmp_path / RunJournal.FILENAME
+    journal = RunJournal(path)
+    journal.start_run(['sub-01', 'sub-02'])
+    journal.record('sub-01', 'running', attempt=1)
+    journal.record('sub-01', 'done')
+    journal.record('sub-02', 'failed', error='boom')
+    with open(path, 'a') as f:
+        f.write('{"key": "sub-03", "sta')
+    
+    reloaded = RunJournal(path)
+    assert reloaded.completed() == {'sub-01'}
+    assert reloaded.states['sub-02']['error'] == 'boom'
+    assert reloaded.counts() == {'pending': 0, 'running': 0, 'done': 1, 'failed': 1}
+    
+    reloaded.compact()
+    assert len(path.read_text().splitlines()) == 2
+    with pytest.raises(ValueError):
+        reloaded.record('sub-01', 'finished')
+
+def test_is_transient():
+    """Test which errors are retried"""
+    assert is_transient(subprocess.TimeoutExpired('dcm2bids', 5))
+    assert is_transient(subprocess.CalledProcessError(-9, 'dcm2bids'))
+    assert not is_transient(subprocess.CalledProcessError(1, 'dcm2bids'))
+    assert is_transient(OSError(5, 'Input/output error'))
+    assert not is_transient(FileNotFoundError('dcm2bids'))
+    assert not is_transient(ValueError('bad'))
+
+def test_convert_subjects_retries_with_backoff(config_file, dicom_directory, tmp_path):
+    """Test transient failures are retried with exponential backoff"""
+    converter = DicomConverter(
+        config_file, dicom_directory, tmp_path / "out", retries=2, retry_backoff=1.5
+    )
+    delays = []
+    converter.sleep = delays.append
+    
+    errors = [subprocess.CalledProcessError(-9, 'dcm2bids'), OSError(5, 'EIO'), None]
+    def run(cmd, **kwargs):
+        error = errors.pop(0)
+        if error:
+            raise error
+    
+    with patch('src.converter.run_command', side_effect=run):
+        report = converter.convert_subjects(['sub-01'])
+    result = report.results[0]
+    assert result.success and result.attempts == 3 and result.error is None
+    assert delays == [1.5, 3.0]
+    # The run finished, so its done entry is cleared again
+    assert converter.journal.state('sub-01') is None
+
+def test_convert_subjects_does_not_retry_permanent_errors(config_file, dicom_directory, tmp_path):
+    """Test permanent failures are journaled without retrying"""
+    converter = DicomConverter(config_file, dicom_directory, tmp_path / "out", retries=3)
+    converter.sleep = lambda delay: pytest.fail("should not retry")
+    
+    with patch('src.converter.run_command',
+               side_effect=subprocess.CalledProcessError(1, 'dcm2bids')) as mock_run:
+        report = converter.convert_subjects(['sub-01'])
+    assert mock_run.call_count == 1
+    assert report.results[0].attempts == 1
+    assert converter.journal.states['sub-01']['state'] == 'failed'
+    assert 'returned non-zero' in converter.journal.states['sub-01']['error']
+
+def write_output(cmd, **kwargs):
+    target = os.path.join(cmd[cmd.index('-o') + 1], cmd[cmd.index('-p') + 1], 'anat')
+    os.makedirs(target)
+    open(os.path.join(target, 'T1w.nii.gz'), 'w').close()
+
+def test_resume_skips_journaled_subjects(config_file, dicom_directory, tmp_path):
+    """Test a resumed run only converts subjects not yet done"""
+    output_dir = tmp_path / "out"
+    # An interrupted run got as far as finishing sub-01
+    journal = RunJournal(output_dir / RunJournal.FILENAME)
+    journal.start_run(['sub-01', 'sub-02'])
+    journal.record('sub-01', 'done')
+    
+    # A new process reads the journal written by the interrupted one
+    converter = DicomConverter(config_file, dicom_directory, output_dir, incremental=False)
+    with patch('src.converter.run_command') as mock_run:
+        report = converter.convert_subjects(['sub-01', 'sub-02'], resume=True)
+    assert mock_run.call_count == 1
+    assert mock_run.call_args[0][0][mock_run.call_args[0][0].index('-p') + 1] == 'sub-02'
+    assert [r.subject_id for r in report.skipped] == ['sub-01']
+
+def test_finished_runs_do_not_skip_changed_subjects(config_file, dicom_directory, tmp_path):
+    """Test resume defers to the manifest and finished runs clear done entries"""
+    output_dir = tmp_path / "out"
+    converter = DicomConverter(config_file, dicom_directory, output_dir)
+    with patch('src.converter.run_command', side_effect=write_output) as mock_run:
+        converter.convert_subjects(['sub-01'], resume=True)
+        assert mock_run.call_count == 1
+        assert converter.journal.state('sub-01') is None
+        
+        report = converter.convert_subjects(['sub-01'], resume=True)
+        assert mock_run.call_count == 1
+        assert [r.subject_id for r in report.skipped] == ['sub-01']
+        
+        # An interrupted run's done entry does not hide a config change
+        converter.journal.start_run(['sub-01'])
+        converter.journal.record('sub-01', 'done')
+        with open(config_file) as f:
+            config = json.load(f)
+        config['descriptions'][0]['modalityLabel'] = 'T2w'
+        with open(config_file, 'w') as f:
+            json.dump(config, f)
+        report = DicomConverter(config_file, dicom_directory, output_dir).convert_subjects(
+            ['sub-01'], resume=True
+        )
+    assert mock_run.call_count == 2
+    assert report.skipped == [] and report.results[0].success
+
+def test_outputs_are_published_atomically(config_file, dicom_directory, tmp_path):
+    """Test failed conversions leave no partial output and successes replace old output"""
+    output_dir = tmp_path / "out"
+    converter = DicomConverter(config_file, dicom_directory, output_dir, incremental=False)
+    
+    def write(name, fail=False):
+        def run(cmd, **kwargs):
+            target = os.path.join(cmd[cmd.index('-o') + 1], 'sub-01', 'anat')
+            os.makedirs(target)
+            open(os.path.join(target, name), 'w').close()
+            if fail:
+                raise subprocess.CalledProcessError(1, 'dcm2bids')
+        return run
+    
+    with patch('src.converter.run_command', side_effect=write('old.nii.gz')):
+        converter.convert_subject('sub-01')
+    with patch('src.converter.run_command', side_effect=write('half.nii.gz', fail=True)):
+        with pytest.raises(subprocess.CalledProcessError):
+            converter.convert_subject('sub-01')
+    assert [p.name for p in (output_dir / "sub-01" / "anat").iterdir()] == ['old.nii.gz']
+    
+    with patch('src.converter.run_command', side_effect=write('new.nii.gz')):
+        converter.convert_subject('sub-01')
+    assert [p.name for p in (output_dir / "sub-01" / "anat").iterdir()] == ['new.nii.gz']
+    assert list((output_dir / DicomConverter.STAGING_DIR).iterdir()) == []
+
+def test_stale_staging_is_removed(config_file, dicom_directory, tmp_path):
+    """Test staging folders of dead processes on this host are cleaned up"""
+    import socket
+    
+    staging = tmp_path / "out" / DicomConverter.STAGING_DIR
+    dead = staging / f"{socket.gethostname()}-999999999-abcd1234"
+    other_host = staging / "elsewhere-1-abcd1234"
+    dead.mkdir(parents=True)
+    other_host.mkdir()
+    
+    DicomConverter(config_file, dicom_directory, tmp_path / "out")
+    assert not dead.exists()
+    assert other_host.exists()
@@ -0,0 +1,34 @@
+import pytest
+import json
+from src.manifest import ConversionManifest
+
+def test_fingerprint_tracks_config_and_files(config_file, dicom_directory):
+    """Test the fingerprint changes with the config and the raw files"""
+    before = ConversionManifest.fingerprint(dicom_directory, config_file)
+    assert before['file_count'] == 1
+    assert before['total_bytes'] > 0
+    
+    assert ConversionManifest.fingerprint(dicom_directory, config_file) == before
+    
+    config_file.write_text(json.dumps({"searchMethod": "re", "descriptions": []}))
+    changed = ConversionManifest.fingerprint(dicom_directory, config_file)
+    assert changed['config_hash'] != before['config_hash']
+    assert changed['files_digest'] == before['files_digest']
+
+def test_manifest_persistence(tmp_path, config_file, dicom_directory):
+    """Test recorded entries are reloaded and can be invalidated"""
+    path = tmp_path / "out" / ConversionManifest.FILENAME
+    fingerprint = ConversionManifest.fingerprint(dicom_directory, config_file)
+    key = ConversionManifest.key('sub-01', 'ses-01')
+    assert key == 'sub-01/ses-01'
+    
+    manifest = ConversionManifest(path)
+    assert not manifest.is_current(key, fingerprint)
+    manifest.record(key, fingerprint)
+    
+    reloaded = ConversionManifest(path)
+    assert reloaded.is_current(key, fingerprint)
+    assert not reloaded.is_current(key, dict(fingerprint, file_count=2))
+    
+    reloaded.invalidate(key)
+    assert not ConversionManifest(path).is_current(key, fingerprint)
@@ -0,0 +1,72 @@
+import pytest
+import re
+from src.matcher import SeriesMatcher, scoped_pattern
+
+def test_scoped_pattern():
+    """Test global inline flags become scoped groups"""
+    assert scoped_pattern('(?i)T1.*SAG') == '(?i:T1.*SAG)'
+    assert scoped_pattern('T1.*SAG') == '(?:T1.*SAG)'
+
+def test_match_config_descriptions():
+    """Test the repo config maps each scan type to one label"""
+    matcher = SeriesMatcher.from_config_file('config/config.json')
+    assert matcher.prefilter is not None
+    
+    assert [m['modality'] for m in matcher.match('T1_SAG')] == ['acq-sag_T1w']
+    assert [m['modality'] for m in matcher.match('ax pd fast')] == ['acq-axial_PDw']
+    assert matcher.match('localizer') == []
+    assert matcher.match('T1_SAG')[0]['dataType'] == 'anat'
+
+def test_match_agrees_with_re_match(sample_config):
+    """Test the prefiltered matcher gives the same answers as plain re.match"""
+    matcher = SeriesMatcher(sample_config)
+    for desc in ['T1_SAG', 'SAG_T1', 'T2_AX', 'AX_T2', 'T1_AX', 'DWI', '']:
+        expected = [
+            d['modalityLabel'] for d in sample_config['descriptions']
+            if re.match(d['criteria']['SeriesDescription'], desc)
+        ]
+        assert [m['modality'] for m in matcher.match(desc)] == expected
+
+def test_match_reports_ambiguity():
+    """Test a description matching several patterns returns all of them"""
+    config = {"searchMethod": "re", "descriptions": [
+        {"dataType": "anat", "criteria": {"SeriesDescription": "T1"}, "modalityLabel": "T1w"},
+        {"dataType": "anat", "criteria": {"SeriesDescription": "(?i).*sag"}, "modalityLabel": "sag"},
+    ]}
+    matcher = SeriesMatcher(config)
+    assert [m['modality'] for m in matcher.match('T1_SAG')] == ['T1w', 'sag']
+    assert list(matcher.match_many(['T1_SAG', 'T1_SAG', 'X'])) == ['T1_SAG', 'X']
+
+def test_backreferences_disable_prefilter():
+    """Test patterns that cannot be combined still match correctly"""
+    config = {"searchMethod": "re", "descriptions": [
+        {"dataType": "anat", "criteria": {"SeriesDescription": r"(T\d)_\1"}, "modalityLabel": "rep"},
+        {"dataType": "anat", "criteria": {"SeriesDescription": "FLAIR"}, "modalityLabel": "FLAIR"},
+    ]}
+    matcher = SeriesMatcher(config)
+    assert matcher.prefilter is None
+    assert [m['modality'] for m in matcher.match('T1_T1')] == ['rep']
+    assert matcher.match('T1_T2') == []
+
+def test_search_methods():
+    """Test dcm2bids semantics: anchored regexes, wildcards by default"""
+    descriptions = [
+        {"dataType": "anat", "criteria": {"SeriesDescription": "SAG"}, "modalityLabel": "sag"},
+        {"dataType": "anat", "criteria": {"SeriesDescription": "T[12]_*"}, "modalityLabel": "T"},
+    ]
+    regex = SeriesMatcher({"searchMethod": "re", "descriptions": descriptions})
+    assert [m['modality'] for m in regex.match('T2_SAG')] == ['T']
+    assert [m['modality'] for m in regex.match('SAG_T2')] == ['sag']
+    
+    wildcards = SeriesMatcher({"descriptions": descriptions})
+    assert wildcards.search_method == 'fnmatch'
+    assert [m['modality'] for m in wildcards.match('T2_SAG')] == ['T']
+    assert wildcards.match('SAG_T2') == []
+    assert wildcards.match('t2_sag') == []
+    
+    legacy = SeriesMatcher(
+        {"searchMethod": "re", "descriptions": descriptions}, search_method='search'
+    )
+    assert [m['modality'] for m in legacy.match('T2_SAG')] == ['sag', 'T']
+    with pytest.raises(ValueError):
+        SeriesMatcher({"searchMethod": "glob", "descriptions": descriptions})
@@ -0,0 +1,104 @@
+import pytest
+import gzip
+import json
+import numpy as np
+import pydicom
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+from src.converter import DicomConverter
+from src.native_backend import NIFTI_HEADER, NativeBackend, bids_basename, write_nifti
+
+def read_nifti(path):
+    raw = gzip.open(path).read()
+    hdr = np.frombuffer(raw[:348], dtype=NIFTI_HEADER)[0]
+    shape = tuple(hdr['dim'][1:1 + hdr['dim'][0]])
+    data = np.frombuffer(raw[int(hdr['vox_offset']):], dtype='<u2').reshape(shape, order='F')
+    return hdr, data
+
+def write_slice(path, series_uid, z, value, instance):
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.4'
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = FileDataset(path, {}, file_meta=file_meta, preamble=b"\0" * 128)
+    ds.PatientID = "ID_01"
+    ds.StudyDate = "20240101"
+    ds.SeriesDescription = "T1_SAG"
+    ds.SeriesNumber = 3
+    ds.SeriesInstanceUID = series_uid
+    ds.Modality = "MR"
+    ds.InstanceNumber = instance
+    ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    ds.ImagePositionPatient = [0, 0, z]
+    ds.PixelSpacing = [0.5, 0.5]
+    ds.SliceThickness = 2
+    ds.RepetitionTime = 2000
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.Rows, ds.Columns = 4, 6
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit = 16, 16, 15
+    ds.PixelRepresentation = 0
+    ds.PixelData = np.full((4, 6), value, dtype=np.uint16).tobytes()
+    ds.save_as(path, enforce_file_format=True)
+
+def test_bids_basename():
+    """Test run entities are inserted before the suffix"""
+    assert bids_basename('sub-01', 'ses-01', 'acq-sag_T1w') == 'sub-01_ses-01_acq-sag_T1w'
+    assert bids_basename('sub-01', None, 'T1w', run=2) == 'sub-01_run-02_T1w'
+
+def test_write_nifti_roundtrip(tmp_path):
+    """Test the NIfTI writer stores shape, spacing and data"""
+    volume = np.arange(24, dtype=np.uint16).reshape(2, 3, 4)
+    affine = np.diag([0.5, 0.5, 2.0, 1.0])
+    write_nifti(tmp_path / "vol.nii.gz", volume, affine)
+    
+    hdr, data = read_nifti(tmp_path / "vol.nii.gz")
+    assert hdr['magic'] == b'n+1'
+    assert list(hdr['pixdim'][1:4]) == [0.5, 0.5, 2.0]
+    np.testing.assert_array_equal(data, volume)
+
+def test_native_orders_slices_by_position(tmp_path, config_file):
+    """Test slices are stacked by ImagePositionPatient, not file order"""
+    dicom_dir = tmp_path / "raw"
+    series_dir = dicom_dir / "sub-01" / "scan"
+    series_dir.mkdir(parents=True)
+    uid = generate_uid()
+    for name, z, value in [('a.dcm', 4.0, 30), ('b.dcm', 0.0, 10), ('c.dcm', 2.0, 20)]:
+        write_slice(series_dir / name, uid, z, value, instance=int(value))
+    
+    backend = NativeBackend(config_file, dicom_dir, tmp_path / "out")
+    written = backend.convert('sub-01', source_dir=dicom_dir / "sub-01")
+    
+    assert [p.name for p in written] == ['sub-01_acq-sag_T1.nii.gz']
+    hdr, data = read_nifti(written[0])
+    assert data.shape == (6, 4, 3)
+    assert [int(data[0, 0, k]) for k in range(3)] == [10, 20, 30]
+    assert list(hdr['pixdim'][1:4]) == [0.5, 0.5, 2.0]
+    
+    sidecar = json.loads(written[0].with_suffix('').with_suffix('.json').read_text())
+    assert sidecar['SeriesDescription'] == 'T1_SAG'
+    assert sidecar['RepetitionTime'] == 2.0
+
+def test_converter_native_backend(generated_dicoms, tmp_path):
+    """Test DicomConverter can convert in-process without dcm2bids"""
+    output_dir = tmp_path / "bids_output"
+    converter = DicomConverter(
+        'config/config.json', generated_dicoms, output_dir, backend='native'
+    )
+    
+    assert converter.convert_subject('sub-01', session='ses-01')
+    anat = output_dir / "sub-01" / "ses-01" / "anat"
+    assert sorted(p.name for p in anat.glob('*.nii.gz')) == [
+        'sub-01_ses-01_acq-axial_PDw.nii.gz',
+        'sub-01_ses-01_acq-axial_T1w.nii.gz',
+        'sub-01_ses-01_acq-axial_T2w.nii.gz',
+        'sub-01_ses-01_acq-sag_PDw.nii.gz',
+        'sub-01_ses-01_acq-sag_T1w.nii.gz',
+        'sub-01_ses-01_acq-sag_T2w.nii.gz',
+    ]
+    assert not (output_dir / "sub-02").exists()
+
+def test_converter_rejects_unknown_backend(config_file, dicom_directory, tmp_path):
+    """Test backend selection is validated"""
+    with pytest.raises(ValueError):
+        DicomConverter(config_file, dicom_directory, tmp_path / "out", backend='magic')
@@ -0,0 +1,81 @@
+import pytest
+import logging
+import os
+import subprocess
+import sys
+import time
+from src.process import run_command
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+def test_run_command_streams_output(caplog):
+    """Test stdout and stderr are logged line by line"""
+    code = "import sys; print('one'); print('two', file=sys.stderr); print('three')"
+    with caplog.at_level(logging.INFO, logger='src.process'):
+        result = run_command(python(code), name='child')
+    
+    assert result.returncode == 0
+    assert result.stdout.splitlines() == ['one', 'two', 'three']
+    assert [r.getMessage() for r in caplog.records] == [
+        '[child] one', '[child] two', '[child] three'
+    ]
+
+def test_run_command_keeps_bounded_tail():
+    """Test only the last lines are kept for error reports"""
+    code = "import sys\nfor i in range(1000): print(i)\nsys.exit(3)"
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        run_command(python(code), tail_lines=5)
+    
+    assert excinfo.value.returncode == 3
+    assert excinfo.value.output.splitlines() == ['995', '996', '997', '998', '999']
+
+def test_run_command_splits_long_lines():
+    """Test lines without newlines cannot grow without bound"""
+    result = run_command(python("print('x' * 20000, end='')"), tail_lines=10)
+    assert max(len(line) for line in result.stdout.splitlines()) <= 8192
+
+def test_run_command_timeout_kills_process_group():
+    """Test a hung child and its own children are killed at the timeout"""
+    code = (
+        "import subprocess, sys, time\n"
+        "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+        "print('started', flush=True)\n"
+        "time.sleep(60)\n"
+    )
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired) as excinfo:
+        run_command(python(code), timeout=1)
+    
+    assert time.monotonic() - start < 15
+    assert 'started' in excinfo.value.output
+
+def test_run_command_returns_when_grandchild_keeps_pipe_open():
+    """Test a background grandchild holding stdout does not hang the call"""
+    code = (
+        "import subprocess, sys\n"
+        "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+        "print('done', flush=True)\n"
+    )
+    start = time.monotonic()
+    result = run_command(python(code))
+    
+    assert time.monotonic() - start < 15
+    assert result.stdout == 'done'
+
+@pytest.mark.skipif(not hasattr(os, 'wait4'), reason="needs os.wait4")
+def test_run_command_reports_own_rusage():
+    """Test each child's usage is its own, even when run concurrently"""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    busy = python("import time\nend = time.process_time() + 0.5\nwhile time.process_time() < end: pass")
+    idle = python("import time; time.sleep(0.6)")
+    with ThreadPoolExecutor(2) as executor:
+        busy_result, idle_result = executor.map(run_command, [busy, idle])
+    cpu = lambda usage: usage.ru_utime + usage.ru_stime
+    assert cpu(busy_result.rusage) >= 0.5
+    assert cpu(idle_result.rusage) < 0.4
+    
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        run_command(python("import sys; sys.exit(2)"))
+    assert excinfo.value.rusage.ru_maxrss > 0
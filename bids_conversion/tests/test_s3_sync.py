@@ -0,0 +1,93 @@
+import pytest
+import hashlib
+import os
+from src.s3_sync import BidsSync, file_etag
+
+boto3 = pytest.importorskip("boto3")
+pytest.importorskip("moto")
+
+MB = 1024 * 1024
+
+@pytest.fixture
+def bids_tree(tmp_path):
+    root = tmp_path / "bids_output"
+    anat = root / "sub-01" / "ses-01" / "anat"
+    anat.mkdir(parents=True)
+    (anat / "sub-01_ses-01_T1w.json").write_text('{"EchoTime": 0.003}')
+    (anat / "sub-01_ses-01_T1w.nii.gz").write_bytes(os.urandom(6 * MB))
+    (root / "dataset_description.json").write_text('{"Name": "test"}')
+    # Converter bookkeeping is never uploaded
+    (root / ".conversion_journal.jsonl").write_text('{}\n')
+    (root / ".staging").mkdir()
+    (root / ".staging" / "partial.nii.gz").write_bytes(b"partial")
+    return root
+
+def test_file_etag(tmp_path):
+    """Test local ETags match S3's single-part and multipart formats"""
+    small = tmp_path / "small"
+    small.write_bytes(b"abc")
+    assert file_etag(small) == hashlib.md5(b"abc").hexdigest()
+
+    large = tmp_path / "large"
+    data = os.urandom(5 * MB + 10)
+    large.write_bytes(data)
+    parts = [hashlib.md5(data[:5 * MB]).digest(), hashlib.md5(data[5 * MB:]).digest()]
+    assert file_etag(large, part_size=5 * MB) == hashlib.md5(b"".join(parts)).hexdigest() + "-2"
+
+def test_sync_uploads_only_changes(s3, bids_tree):
+    """Test a second sync skips unchanged files, including multipart uploads"""
+    syncer = BidsSync(s3, "test-bucket", prefix="bids", part_size=5 * MB, max_concurrency=4)
+    stats = syncer.sync(bids_tree)
+
+    assert stats['files'] == 3
+    assert stats['uploaded'] == 3
+    assert stats['keys'] == [
+        'bids/dataset_description.json',
+        'bids/sub-01/ses-01/anat/sub-01_ses-01_T1w.json',
+        'bids/sub-01/ses-01/anat/sub-01_ses-01_T1w.nii.gz',
+    ]
+    head = s3.head_object(Bucket="test-bucket", Key=stats['keys'][2])
+    assert head['ETag'].strip('"').endswith('-2')
+
+    stats = syncer.sync(bids_tree)
+    assert stats['uploaded'] == 0
+    assert stats['skip_rate'] == 1.0
+
+    # Same size, different contents: caught by the ETag
+    (bids_tree / "dataset_description.json").write_text('{"Name": "tset"}')
+    stats = syncer.sync(bids_tree)
+    assert stats['keys'] == ['bids/dataset_description.json']
+
+def test_sync_prune(s3, bids_tree):
+    """Test prune deletes objects whose local file was removed"""
+    syncer = BidsSync(s3, "test-bucket", part_size=5 * MB)
+    syncer.sync(bids_tree)
+    (bids_tree / "dataset_description.json").unlink()
+
+    stats = syncer.sync(bids_tree, prune=True)
+    assert stats['removed'] == 1
+    keys = [o['Key'] for o in s3.list_objects_v2(Bucket="test-bucket")['Contents']]
+    assert 'bids/dataset_description.json' not in keys
+
+def test_concurrency_fits_connection_pool(s3):
+    """Test concurrent files times parts per upload stays within the pool"""
+    from botocore.config import Config
+    client = boto3.client("s3", config=Config(max_pool_connections=32))
+    syncer = BidsSync(client, "test-bucket", max_concurrency=8)
+    assert syncer.max_concurrency * syncer.transfer_config().max_request_concurrency <= 32
+    assert syncer.transfer_config().max_request_concurrency == 4
+    assert BidsSync(client, "test-bucket", max_concurrency=64).max_concurrency == 32
+
+def test_prune_reports_failed_deletes(s3, bids_tree):
+    """Test keys S3 refuses to delete are reported, not counted as removed"""
+    syncer = BidsSync(s3, "test-bucket", part_size=5 * MB)
+    syncer.sync(bids_tree)
+    (bids_tree / "dataset_description.json").unlink()
+
+    def refuse(**kwargs):
+        key = kwargs['Delete']['Objects'][0]['Key']
+        return {'Errors': [{'Key': key, 'Code': 'AccessDenied', 'Message': 'Access Denied'}]}
+    s3.delete_objects = refuse
+    stats = syncer.sync(bids_tree, prune=True)
+    assert stats['removed'] == 0
+    assert stats['errors'] == ['bids/dataset_description.json']
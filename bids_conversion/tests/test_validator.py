@@ -41,3 +41,16 @@ def test_check_duplicates(config_file):
     validator = ConfigValidator(config_file)
     duplicates = validator.check_duplicates()
     assert len(duplicates) == 0
+
+def test_check_duplicates_finds_repeated_patterns(tmp_path, sample_config):
+    """Test repeated SeriesDescription patterns are reported by validate()"""
+    sample_config['descriptions'].append(dict(sample_config['descriptions'][0]))
+    config_path = tmp_path / "dup_config.json"
+    with open(config_path, 'w') as f:
+        json.dump(sample_config, f)
+    
+    validator = ConfigValidator(config_path)
+    duplicates = validator.check_duplicates()
+    assert len(duplicates) == 1
+    assert "descriptions 0 and 2" in duplicates[0]
+    assert duplicates[0] in validator.validate()
@@ -0,0 +1,106 @@
+import pytest
+import numpy as np
+import pydicom
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian, RLELossless, generate_uid
+from src.header_index import open_index
+from src.volume import LazyVolume, read_pixel_layout
+
+def write_image(path, pixels, syntax=ExplicitVRLittleEndian, z=0.0, **attrs):
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.4'
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = syntax
+    ds = FileDataset(path, {}, file_meta=file_meta, preamble=b"\0" * 128)
+    ds.SeriesInstanceUID = '1.2.3'
+    ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    ds.ImagePositionPatient = [0, 0, z]
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.Rows, ds.Columns = pixels.shape[-2:]
+    ds.BitsAllocated = ds.BitsStored = pixels.dtype.itemsize * 8
+    ds.HighBit = ds.BitsStored - 1
+    ds.PixelRepresentation = int(pixels.dtype.kind == 'i')
+    if pixels.ndim == 3:
+        ds.NumberOfFrames = pixels.shape[0]
+    for key, value in attrs.items():
+        setattr(ds, key, value)
+    ds.PixelData = pixels.tobytes()
+    ds.save_as(path, enforce_file_format=True)
+    return path
+
+@pytest.mark.parametrize('syntax', [ExplicitVRLittleEndian, ImplicitVRLittleEndian])
+def test_layout_maps_pixel_data(tmp_path, syntax):
+    """Test the memory map matches pydicom's decoded pixels"""
+    pixels = np.arange(-12, 12, dtype=np.int16).reshape(4, 6)
+    path = write_image(tmp_path / "a.dcm", pixels, syntax=syntax)
+    
+    ds, layout = read_pixel_layout(path)
+    assert 'PixelData' not in ds
+    np.testing.assert_array_equal(layout.memmap()[0], pydicom.dcmread(path).pixel_array)
+
+def test_layout_rejects_compressed(tmp_path):
+    """Test encapsulated PixelData is reported as not mappable"""
+    path = write_image(tmp_path / "a.dcm", np.ones((8, 8), dtype=np.uint16))
+    ds = pydicom.dcmread(path)
+    ds.compress(RLELossless)
+    ds.save_as(path)
+    
+    assert read_pixel_layout(path)[1] is None
+    with pytest.raises(ValueError):
+        LazyVolume.from_files([path])
+
+def test_volume_orders_and_indexes_slices(tmp_path):
+    """Test slices are ordered by position and read lazily"""
+    paths = [
+        write_image(tmp_path / f"{i}.dcm", np.full((4, 6), i, dtype=np.uint16), z=float(-i))
+        for i in range(3)
+    ]
+    volume = LazyVolume.from_files(paths)
+    
+    assert volume.shape == (3, 4, 6)
+    assert isinstance(volume.slice(0), np.memmap)
+    assert [int(volume[i, 0, 0]) for i in range(3)] == [2, 1, 0]
+    assert volume[:, 1:3, 0].shape == (3, 2)
+    np.testing.assert_array_equal(volume.to_array()[:, 0, 0], [2, 1, 0])
+
+def test_volume_multiframe(tmp_path):
+    """Test the frames of a multi-frame file become slices"""
+    pixels = np.arange(2 * 4 * 6, dtype=np.uint16).reshape(2, 4, 6)
+    volume = LazyVolume.from_files([write_image(tmp_path / "mf.dcm", pixels)])
+    
+    assert len(volume) == 2
+    np.testing.assert_array_equal(volume.to_array(), pixels)
+
+def test_volume_stats_are_chunked(tmp_path):
+    """Test streaming statistics match NumPy on the full, rescaled volume"""
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 4000, (5, 16, 16), dtype=np.uint16)
+    paths = [
+        write_image(tmp_path / f"{i}.dcm", data[i], z=float(i),
+                    RescaleSlope=2, RescaleIntercept=-1024)
+        for i in range(5)
+    ]
+    volume = LazyVolume.from_files(paths)
+    expected = data.astype(np.float64) * 2 - 1024
+    
+    # One slice per chunk
+    stats = volume.stats(bins=10, chunk_bytes=16 * 16 * 4)
+    assert stats['min'] == expected.min() and stats['max'] == expected.max()
+    assert stats['mean'] == pytest.approx(expected.mean())
+    assert stats['std'] == pytest.approx(expected.std())
+    assert stats['voxels'] == expected.size
+    np.testing.assert_array_equal(
+        stats['histogram'], np.histogram(expected, bins=stats['bin_edges'])[0]
+    )
+
+def test_thumbnail_from_index(generated_dicoms, tmp_path):
+    """Test QC thumbnails of an indexed series"""
+    with open_index(generated_dicoms) as index:
+        series_uid = index.records(series_description='T1_SAG')[0]['series_instance_uid']
+        volume = LazyVolume.from_index(index, series_uid)
+    
+    assert volume.shape == (3, 16, 16)
+    image = volume.thumbnail(size=8, path=tmp_path / "qc" / "t1.png")
+    assert image.shape == (8, 8) and image.dtype == np.uint8
+    assert (tmp_path / "qc" / "t1.png").exists()
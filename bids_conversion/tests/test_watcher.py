@@ -0,0 +1,135 @@
+import pytest
+import shutil
+import threading
+import time
+from unittest.mock import patch
+from src.converter import DicomConverter
+from src.discovery import SessionJob
+from src.watcher import FolderWatcher
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def watched(tmp_path, config_file):
+    raw = tmp_path / "incoming"
+    raw.mkdir()
+    converter = DicomConverter(config_file, raw, tmp_path / "bids_output")
+    clock = FakeClock()
+    watcher = FolderWatcher(
+        converter, settle_seconds=10, poll_interval=0.01, max_workers=1,
+        use_inotify=False, clock=clock
+    )
+    return raw, watcher, clock
+
+@patch('src.converter.run_command')
+def test_converts_once_series_settle(mock_run, watched, generated_dicoms):
+    """Test a session is converted only after its folders stop changing"""
+    raw, watcher, clock = watched
+    watcher.start()
+    try:
+        shutil.copytree(generated_dicoms / "sub-01", raw / "sub-01")
+        watcher.step()
+        assert watcher.stats['queued'] == 0
+        
+        # A late slice restarts the quiet period of its series
+        clock.now = 8
+        shutil.copy(raw / "sub-01/ses-01/scan_01/slice_01.dcm",
+                    raw / "sub-01/ses-01/scan_01/slice_04.dcm")
+        watcher.step()
+        clock.now = 12
+        watcher.step()
+        assert watcher.stats['queued'] == 1
+        watcher.jobs.join()
+        clock.now = 15
+        watcher.step()
+        assert watcher.stats['queued'] == 1
+        clock.now = 18
+        watcher.step()
+        assert watcher.stats['queued'] == 2
+        
+        # Nothing changed since: no more work
+        clock.now = 60
+        watcher.step()
+    finally:
+        watcher.close()
+    
+    assert watcher.stats['queued'] == 2
+    assert watcher.stats['converted'] + watcher.stats['unchanged'] == 2
+    args = mock_run.call_args[0][0]
+    assert args[args.index('-p') + 1] == 'sub-01'
+    assert args[args.index('-s') + 1] == 'ses-01'
+
+def test_skip_existing(watched, generated_dicoms):
+    """Test files present at startup are ignored without catch-up"""
+    raw, watcher, clock = watched
+    shutil.copytree(generated_dicoms / "sub-01", raw / "sub-01")
+    watcher.start(catch_up=False)
+    clock.now = 100
+    watcher.step()
+    watcher.close()
+    assert watcher.stats['queued'] == 0
+
+def test_bounded_queue_applies_backpressure(watched):
+    """Test enqueue blocks while the queue is full and coalesces repeats"""
+    _, watcher, _ = watched
+    watcher.jobs.maxsize = 1
+    assert watcher.enqueue(SessionJob('sub-01', 'ses-01'))
+    # Already queued: marked for a rerun instead of queued twice
+    assert watcher.enqueue(SessionJob('sub-01', 'ses-01'))
+    assert watcher.jobs.qsize() == 1
+    
+    blocked = threading.Thread(target=watcher.enqueue, args=(SessionJob('sub-02', 'ses-01'),))
+    blocked.start()
+    time.sleep(0.1)
+    assert blocked.is_alive()
+    
+    watcher.jobs.get()
+    blocked.join(timeout=5)
+    assert not blocked.is_alive()
+    assert watcher.stats['queued'] == 2
+
+def test_resent_copies_are_deduplicated(watched, generated_dicoms):
+    """Test a folder of resent copies triggers no conversion of duplicates"""
+    raw, watcher, _ = watched
+    shutil.copytree(generated_dicoms / "sub-01", raw / "sub-01")
+    session = raw / "sub-01" / "ses-01"
+    (session / "resend_01").mkdir()
+    for name in ("slice_01.dcm", "slice_02.dcm"):
+        shutil.copy(session / "scan_01" / name, session / "resend_01" / name)
+    try:
+        jobs = watcher.jobs_for([session / "scan_01"])
+        assert len(jobs) == 1 and len(jobs[0].files) == 18
+        assert not any('resend_01' in f for f in jobs[0].files)
+        assert watcher.jobs_for([session / "resend_01"]) == []
+        
+        watcher.dedup = False
+        assert watcher.jobs_for([session / "resend_01"])[0].files is None
+    finally:
+        watcher.index.close()
+
+def test_settled_folders_refresh_only_their_sessions(watched, generated_dicoms):
+    """Test a settled folder does not reindex or rediscover the rest of the tree"""
+    raw, watcher, _ = watched
+    shutil.copytree(generated_dicoms / "sub-01", raw / "sub-01")
+    try:
+        assert len(watcher.jobs_for([raw / "sub-01" / "ses-01" / "scan_01"])) == 1
+        
+        # sub-02 arrives but has not settled yet
+        shutil.copytree(generated_dicoms / "sub-02", raw / "sub-02")
+        shutil.copy(raw / "sub-01/ses-01/scan_02/slice_01.dcm",
+                    raw / "sub-01/ses-01/scan_02/slice_04.dcm")
+        with patch.object(watcher.index, 'refresh', wraps=watcher.index.refresh) as refresh:
+            jobs = watcher.jobs_for([raw / "sub-01" / "ses-01" / "scan_02"])
+        assert refresh.call_args.kwargs['paths'] == [raw / "sub-01" / "ses-01" / "scan_02"]
+        assert [(job.subject_id, job.session) for job in jobs] == [('sub-01', 'ses-01')]
+        assert watcher.index.count() == 19
+        
+        jobs = watcher.jobs_for([raw / "sub-02" / "ses-01" / "scan_01"])
+        assert [job.subject_id for job in jobs] == ['sub-02']
+    finally:
+        watcher.index.close()
@@ -0,0 +1,154 @@
+import pytest
+import threading
+from unittest.mock import patch
+from src.converter import DicomConverter
+from src.discovery import SessionJob, discover_sessions
+from src.manifest import ConversionManifest
+from src.work_queue import QueueWorker, WorkQueue
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+def test_publish_is_idempotent(tmp_path):
+    """Test republishing a job does not queue it twice"""
+    with WorkQueue(tmp_path / "queue.sqlite") as queue:
+        assert queue.publish(['sub-01', ('sub-02', 'ses-01')]) == 2
+        assert queue.publish(['sub-01', SessionJob('sub-03', files=['/a.dcm'])]) == 1
+        assert queue.progress() == {
+            'pending': 3, 'leased': 0, 'done': 0, 'failed': 0, 'total': 3
+        }
+
+def test_publish_requeues_finished_jobs(tmp_path):
+    """Test republishing re-queues done and failed jobs but not leased ones"""
+    with WorkQueue(tmp_path / "queue.sqlite", max_attempts=1) as queue:
+        queue.publish(['sub-01', 'sub-02', 'sub-03'])
+        done, failed, leased = (queue.lease('w') for _ in range(3))
+        queue.complete(done)
+        queue.fail(failed, RuntimeError("boom"))
+        
+        new_files = SessionJob('sub-01', files=['/new.dcm'])
+        assert queue.publish([new_files, 'sub-02', 'sub-03']) == 2
+        assert queue.progress() == {
+            'pending': 2, 'leased': 1, 'done': 0, 'failed': 0, 'total': 3
+        }
+        assert queue.failures() == []
+        
+        again = queue.lease('w')
+        assert again.key == 'sub-01' and again.attempt == 1
+        assert again.job.files == ['/new.dcm']
+        assert queue.lease('w').key == 'sub-02'
+        assert queue.complete(leased)
+
+def test_leases_expire_and_retry(tmp_path):
+    """Test leases, lease expiry, retries and final failure"""
+    clock = FakeClock()
+    queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=60, max_attempts=2, clock=clock)
+    queue.publish([SessionJob('sub-01', 'ses-01', tmp_path, files=['/x.dcm'])])
+    
+    first = queue.lease('a')
+    assert first.job == SessionJob('sub-01', 'ses-01', tmp_path, files=['/x.dcm'])
+    assert first.attempt == 1
+    assert queue.lease('b') is None
+    
+    # Node 'a' disappears; after the lease runs out 'b' takes over
+    clock.now += 61
+    second = queue.lease('b')
+    assert second.attempt == 2
+    assert not queue.complete(first)
+    
+    assert queue.fail(second, RuntimeError("disk full"))
+    assert queue.progress()['failed'] == 1
+    assert queue.failures() == [('sub-01/ses-01', 'disk full')]
+    queue.close()
+
+def test_many_expired_final_attempts(tmp_path):
+    """Test a backlog of dead jobs is failed without recursing per job"""
+    clock = FakeClock()
+    queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=60, max_attempts=1, clock=clock)
+    queue.publish([f'sub-{i:04d}' for i in range(1500)] + ['sub-live'])
+    for _ in range(1500):
+        queue.lease('a')
+    
+    clock.now += 61
+    assert queue.lease('b').job.subject_id == 'sub-live'
+    assert queue.progress()['failed'] == 1500
+    queue.close()
+
+def test_failed_job_is_retried(tmp_path):
+    """Test a failure below max_attempts puts the job back"""
+    queue = WorkQueue(tmp_path / "queue.sqlite", max_attempts=3)
+    queue.publish(['sub-01'])
+    assert queue.fail(queue.lease('a'), 'boom')
+    
+    retry = queue.lease('a')
+    assert retry.attempt == 2
+    assert queue.renew(retry)
+    assert queue.complete(retry)
+    assert queue.progress()['done'] == 1
+    queue.close()
+
+def test_workers_share_queue(generated_dicoms, tmp_path):
+    """Test concurrent workers convert every job exactly once"""
+    output_dir = tmp_path / "bids_output"
+    queue_path = tmp_path / "queue.sqlite"
+    with WorkQueue(queue_path) as queue:
+        queue.publish(discover_sessions(generated_dicoms))
+    
+    processed = []
+    def work(name):
+        # One converter and queue connection per worker, as on separate nodes
+        converter = DicomConverter(
+            'config/config.json', generated_dicoms, output_dir, backend='native'
+        )
+        with WorkQueue(queue_path) as queue:
+            processed.append(QueueWorker(converter, queue, worker_id=name).run())
+    
+    threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sum(processed) == 2
+    assert len(list(output_dir.glob("sub-0*/ses-01/anat/*.nii.gz"))) == 12
+    assert sorted(p.name for p in (output_dir / ".queue_done").iterdir()) == [
+        'sub-01__ses-01.json', 'sub-02__ses-01.json'
+    ]
+    # Both workers' manifest entries survive
+    manifest = ConversionManifest(output_dir / ConversionManifest.FILENAME)
+    assert set(manifest.entries) == {'sub-01/ses-01', 'sub-02/ses-01'}
+
+def test_worker_skips_completed_jobs(config_file, dicom_directory, tmp_path):
+    """Test a redelivered job with a matching marker is not converted again"""
+    converter = DicomConverter(config_file, dicom_directory, tmp_path / "out", incremental=False)
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.publish([('sub-01', 'ses-01')])
+    worker = QueueWorker(converter, queue, worker_id='w')
+    
+    with patch('src.converter.run_command') as mock_run:
+        assert worker.run() == 1
+        assert mock_run.call_count == 1
+        
+        # Simulate a duplicate delivery
+        queue.publish([('sub-02', 'ses-01')])
+        leased = queue.lease('w')
+        leased.key = 'sub-01/ses-01'
+        leased.job = SessionJob('sub-01', 'ses-01')
+        worker.process(leased)
+        assert mock_run.call_count == 1
+    queue.close()
+
+def test_worker_records_failures(config_file, dicom_directory, tmp_path):
+    """Test conversion errors are reported to the queue and retried"""
+    converter = DicomConverter(config_file, dicom_directory, tmp_path / "out")
+    queue = WorkQueue(tmp_path / "queue.sqlite", max_attempts=2)
+    queue.publish(['sub-01'])
+    
+    with patch('src.converter.run_command', side_effect=RuntimeError("dcm2niix crashed")):
+        assert QueueWorker(converter, queue).run() == 2
+    assert queue.failures() == [('sub-01', 'dcm2niix crashed')]
+    queue.close()